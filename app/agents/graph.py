@@ -1,11 +1,13 @@
-from langgraph.graph import StateGraph, END
+from langgraph.constants import END
 from app.agents.state import AgentState
+from app.core.metrics import instrument_node
 from app.agents.nodes import (
     verification_node,
     menu_node,
     wellness_node,
     medical_node,
     appointment_node,
+    parse_menu_option,
 )
 
 
@@ -64,58 +66,93 @@ def route_menu(state: AgentState):
     return END
 
 
-# ==========================================================
-# DEFINICIÓN DEL WORKFLOW
-# ==========================================================
+def needs_llm(state: AgentState, message: str) -> bool:
+    """
+    Predice, sin ejecutar el grafo, si el turno llamará a GPT-4o
+    (para elegir el carril del planificador). Sigue las mismas rutas:
 
-workflow = StateGraph(AgentState)
-
-# Nodos
-workflow.add_node("verification", verification_node)
-workflow.add_node("menu", menu_node)
-workflow.add_node("wellness", wellness_node)
-workflow.add_node("medical", medical_node)
-workflow.add_node("appointment", appointment_node)
-
-# Punto de entrada
-workflow.set_entry_point("verification")
-
-# Después de 'verification' decidimos si:
-# - seguimos verificando
-# - terminamos (just_verified)
-# - vamos al menú
-# - retomamos un flujo ya activo (appointment / wellness / medical)
-workflow.add_conditional_edges(
-    "verification",
-    route_verification,
-    {
-        # Cualquier retorno "verification" termina el turno
-        # (sea porque aún falta código/DNI o porque just_verified=True)
-        "verification": END,
-        "menu": "menu",
-        "appointment": "appointment",
-        "wellness": "wellness",
-        "medical": "medical",
-    },
-)
+    - Sin verificar → verification (sin LLM).
+    - Flujo wellness / medical → siempre LLM.
+    - Flujo appointment en el paso ask_reason → extracción de diagnóstico.
+    - Menú con opción 2 o 3 → salta a wellness / medical en el mismo turno.
+    """
+    if not state or not state.get("is_verified"):
+        return False
+    flow = state.get("flow")
+    if flow in ("wellness", "medical"):
+        return True
+    if flow == "appointment":
+        return state.get("appointment_step") == "ask_reason"
+    return parse_menu_option(message) in ("2", "3")
 
-# Desde el menú:
-# - wellness / medical → se ejecutan en el mismo turno
-# - appointment → se deja marcado el flujo pero NO se ejecuta aquí
-workflow.add_conditional_edges(
-    "menu",
-    route_menu,
-    {
-        "wellness": "wellness",
-        "medical": "medical",
-        END: END,
-    },
-)
 
-# Nodos terminales para este turno
-workflow.add_edge("wellness", END)
-workflow.add_edge("medical", END)
-workflow.add_edge("appointment", END)
+# ==========================================================
+# DEFINICIÓN DEL WORKFLOW
+# ==========================================================
 
-# Grafo compilado
-app_graph = workflow.compile()
+def build_graph():
+    # langgraph.graph es pesado de importar: se carga al compilar, no al importar
+    from langgraph.graph import StateGraph
+
+    workflow = StateGraph(AgentState)
+
+    # Nodos (cada uno con su histograma de latencia en /metrics)
+    workflow.add_node("verification", instrument_node("verification", verification_node))
+    workflow.add_node("menu", instrument_node("menu", menu_node))
+    workflow.add_node("wellness", instrument_node("wellness", wellness_node))
+    workflow.add_node("medical", instrument_node("medical", medical_node))
+    workflow.add_node("appointment", instrument_node("appointment", appointment_node))
+
+    # Punto de entrada
+    workflow.set_entry_point("verification")
+
+    # Después de 'verification' decidimos si:
+    # - seguimos verificando
+    # - terminamos (just_verified)
+    # - vamos al menú
+    # - retomamos un flujo ya activo (appointment / wellness / medical)
+    workflow.add_conditional_edges(
+        "verification",
+        route_verification,
+        {
+            # Cualquier retorno "verification" termina el turno
+            # (sea porque aún falta código/DNI o porque just_verified=True)
+            "verification": END,
+            "menu": "menu",
+            "appointment": "appointment",
+            "wellness": "wellness",
+            "medical": "medical",
+        },
+    )
+
+    # Desde el menú:
+    # - wellness / medical → se ejecutan en el mismo turno
+    # - appointment → se deja marcado el flujo pero NO se ejecuta aquí
+    workflow.add_conditional_edges(
+        "menu",
+        route_menu,
+        {
+            "wellness": "wellness",
+            "medical": "medical",
+            END: END,
+        },
+    )
+
+    # Nodos terminales para este turno
+    workflow.add_edge("wellness", END)
+    workflow.add_edge("medical", END)
+    workflow.add_edge("appointment", END)
+
+    return workflow.compile()
+
+
+# Grafo compilado en el primer uso (o en el warm-up del lifespan)
+# Todos los nodos son corutinas: se debe ejecutar con `await get_app_graph().ainvoke(state)`
+_app_graph = None
+
+
+def get_app_graph():
+    global _app_graph
+    if _app_graph is None:
+        _app_graph = build_graph()
+    return _app_graph
@@ -1,17 +1,27 @@
 # app/agents/nodes.py
 
 import json
-from datetime import datetime, timedelta
-from langchain_core.messages import HumanMessage
-from app.core.llm import llm
+import re
+from langchain_core.messages import HumanMessage, SystemMessage
+from app.config import settings
+from app.core.llm import get_llm, embed_query
 from app.core.business import business_client
+from app.core.availability import availability
 from app.core.knowledge import knowledge_base
+from app.core.embedding_cache import embedding_cache
+from app.core.response_cache import response_cache
+from app.core.context_packer import pack_context, pack_history
+from app.core.usage import usage_tracker
+from app.core.streaming import stream_reply
 from app.agents.state import AgentState
 from app.agents.prompts import (
     TRIAGE_PROMPT,
-    MEDICAL_RAG_PROMPT,
-    DIAGNOSIS_EXTRACTION_PROMPT,
-    WELLNESS_PROMPT,
+    MEDICAL_SYSTEM_PROMPT,
+    MEDICAL_USER_PROMPT,
+    DIAGNOSIS_SYSTEM_PROMPT,
+    DIAGNOSIS_USER_PROMPT,
+    WELLNESS_SYSTEM_PROMPT,
+    WELLNESS_USER_PROMPT,
 )
 
 # ==========================================================
@@ -96,11 +106,28 @@ def normalize_specialty(raw: str | None) -> str:
             return normalized
     return "Medicina General"
 
+
+# Expresiones que indican que la pregunta depende de lo conversado antes
+# ("¿y eso es grave?", "explícame mejor lo anterior"): no se usa la caché.
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(eso|esto|esa|ese|lo anterior|lo que me dijiste|y si|tambi[eé]n|entonces|"
+    r"mejor|m[aá]s detalle|y para|y en|lo mismo)\b"
+)
+
+
+def is_follow_up(message: str) -> bool:
+    return bool(FOLLOW_UP_PATTERN.search(message.lower()))
+
+
+async def embed_question(message: str) -> list[float]:
+    # Pasa por la caché de embeddings: KnowledgeBase.search reutiliza el vector
+    return await embedding_cache.aembed(message, embed_query)
+
 # ==========================================================
 # NODO 1: VERIFICACIÓN (DNI + CÓDIGO)
 # ==========================================================
 
-def verification_node(state: AgentState) -> AgentState:
+async def verification_node(state: AgentState) -> AgentState:
     msg = state["user_message"].strip()
     step = state.get("verification_step", "ask_dni")
     state = {**state, "just_verified": False}
@@ -108,9 +135,9 @@ def verification_node(state: AgentState) -> AgentState:
     # 1) Pedir DNI
     if step == "ask_dni":
         if msg.isdigit() and len(msg) >= 8:
-            exists = business_client.get_patient_by_dni(msg)
+            exists = await business_client.get_patient_by_dni(msg)
             if exists and exists.get("exists"):
-                business_client.send_verification_code(msg)
+                await business_client.send_verification_code(msg)
                 name = exists['patient']['full_name'].split()[0] # Solo primer nombre para ser mas amigable
                 return {
                     **state,
@@ -140,7 +167,7 @@ def verification_node(state: AgentState) -> AgentState:
 
     # 2) Validar código
     elif step == "ask_code":
-        patient = business_client.verify_code(state["dni"], msg)
+        patient = await business_client.verify_code(state["dni"], msg)
         if patient:
             return {
                 **state,
@@ -166,19 +193,22 @@ def verification_node(state: AgentState) -> AgentState:
 # NODO 2: MENÚ PRINCIPAL
 # ==========================================================
 
-def menu_node(state: AgentState) -> AgentState:
-    msg_raw = state["user_message"].strip()
-    msg = msg_raw.lower()
-    option = None
-
+def parse_menu_option(message: str) -> str | None:
+    """Opción del menú principal ("1" | "2" | "3") a partir del texto del usuario."""
+    msg = message.strip().lower()
     if msg in ("1", "2", "3"):
-        option = msg
-    elif "cita" in msg or "agendar" in msg or "registrar" in msg:
-        option = "1"
-    elif "nutric" in msg or "consejo" in msg:
-        option = "2"
-    elif "informacion" in msg or "información" in msg or "tema" in msg:
-        option = "3"
+        return msg
+    if "cita" in msg or "agendar" in msg or "registrar" in msg:
+        return "1"
+    if "nutric" in msg or "consejo" in msg:
+        return "2"
+    if "informacion" in msg or "información" in msg or "tema" in msg:
+        return "3"
+    return None
+
+
+async def menu_node(state: AgentState) -> AgentState:
+    option = parse_menu_option(state["user_message"])
 
     # --- Opción 1: Registrar cita ---
     if option == "1":
@@ -246,11 +276,26 @@ def menu_node(state: AgentState) -> AgentState:
 # NODO 3: WELLNESS (Modificado solo el prompt en prompts.py)
 # ==========================================================
 
-def wellness_node(state: AgentState) -> AgentState:
-    resp = llm.invoke([
-        HumanMessage(content=WELLNESS_PROMPT.format(message=state["user_message"]))
+async def wellness_node(state: AgentState) -> AgentState:
+    user_msg = state["user_message"]
+
+    # El prompt de wellness no usa historial: siempre se puede cachear
+    vector = None
+    if settings.SEMANTIC_CACHE_WELLNESS:
+        vector = await embed_question(user_msg)
+        cached = response_cache.lookup("wellness", vector)
+        if cached:
+            business_client.log_wellness(state.get("patient_data"), user_msg, cached)
+            return {**state, "ai_response": cached}
+
+    resp = await get_llm().ainvoke([
+        SystemMessage(content=WELLNESS_SYSTEM_PROMPT),
+        HumanMessage(content=WELLNESS_USER_PROMPT.format(message=user_msg)),
     ])
-    business_client.log_wellness(state.get("patient_data"), state["user_message"], resp.content)
+    usage_tracker.record("wellness", resp)
+    if vector is not None:
+        response_cache.store("wellness", vector, resp.content)
+    business_client.log_wellness(state.get("patient_data"), user_msg, resp.content)
     return {**state, "ai_response": resp.content}
 
 
@@ -258,26 +303,101 @@ def wellness_node(state: AgentState) -> AgentState:
 # NODO 4: MEDICAL (Modificado solo el prompt en prompts.py)
 # ==========================================================
 
-def medical_node(state: AgentState) -> AgentState:
+async def medical_node(state: AgentState) -> AgentState:
     user_msg = state["user_message"]
-    context = knowledge_base.search(user_msg)
-    history_str = "\n".join(state.get("history", [])[-4:])
 
-    prompt = MEDICAL_RAG_PROMPT.format(
+    # Caché semántica: un acierto evita la búsqueda y la llamada a GPT-4o.
+    # Si la pregunta depende del historial, se responde siempre en vivo.
+    # La caché es compartida entre pacientes: una pregunta independiente se
+    # responde sin historial ni resumen, así la respuesta sirve para cualquiera.
+    vector = None
+    if settings.SEMANTIC_CACHE_MEDICAL and not is_follow_up(user_msg):
+        vector = await embed_question(user_msg)
+        cached = response_cache.lookup("medical", vector)
+        if cached:
+            return {**state, "ai_response": cached}
+
+    # Se recuperan más candidatos de los que caben y el packer elige qué entra
+    # en el presupuesto de tokens (mejor score, oraciones relevantes, sin duplicados)
+    passages = await knowledge_base.search_passages(user_msg, top=settings.RETRIEVAL_CANDIDATES)
+    if passages is None:
+        context = ""
+    elif not passages:
+        context = "No se encontró información específica en los protocolos."
+    else:
+        context = pack_context(user_msg, passages, settings.CONTEXT_TOKEN_BUDGET)
+    standalone = vector is not None
+    history_str = ""
+    if not standalone:
+        history_str = pack_history(state.get("history", []), settings.HISTORY_TOKEN_BUDGET)
+        if state.get("summary"):
+            history_str = f"Resumen de lo conversado antes: {state['summary']}\n{history_str}"
+
+    # Prefijo estático (system) primero y datos variables al final: así el
+    # proveedor puede reutilizar el prefijo en caché entre llamadas
+    prompt = MEDICAL_USER_PROMPT.format(
         context=context,
         history=history_str,
         system_status="No se ha realizado ninguna acción administrativa.",
         question=user_msg,
     )
-    resp = llm.invoke([HumanMessage(content=prompt)])
-    return {**state, "ai_response": resp.content}
+    # Con streaming activo el primer párrafo llega al paciente mientras el
+    # resto se sigue generando (ver app/core/streaming.py)
+    answer, sent = await stream_reply(
+        "medical",
+        [SystemMessage(content=MEDICAL_SYSTEM_PROMPT), HumanMessage(content=prompt)],
+        settings.WHATSAPP_MAX_CHARS,
+    )
+    if standalone:
+        response_cache.store("medical", vector, answer)
+    return {**state, "ai_response": answer, "ai_response_sent": sent}
 
 
 # ==========================================================
 # NODO 5: FLUJO DE CITA
 # ==========================================================
 
-def appointment_node(state: AgentState) -> AgentState:
+NO_SLOTS_TEXT = (
+    "😔 Lo siento, por ahora no hay horarios disponibles para **{specialty}** en los próximos días.\n"
+    "Por favor, intenta más tarde o escribe '1' para elegir otra especialidad."
+)
+
+
+def slot_choices(slots: list) -> str:
+    """'1, 2 o 3' según la cantidad de horarios ofrecidos."""
+    numbers = [str(i + 1) for i in range(len(slots))]
+    return numbers[0] if len(numbers) == 1 else f"{', '.join(numbers[:-1])} o {numbers[-1]}"
+
+
+def slot_taken_response(state: AgentState, data: dict) -> AgentState:
+    """Otro paciente tomó el horario: se ofrecen los turnos libres actuales."""
+    specialty = data.get("specialty")
+    slots = availability.free_slots(specialty, settings.AVAILABILITY_OPTIONS, phone=state.get("whatsapp_number"))
+    if not slots:
+        return {
+            **state,
+            "flow": "menu",
+            "appointment_step": None,
+            "appointment_data": None,
+            "appointment_slots": [],
+            "ai_response": NO_SLOTS_TEXT.format(specialty=specialty),
+        }
+    options_text = "\n".join([f"{idx+1}. {s['label']}" for idx, s in enumerate(slots)])
+    return {
+        **state,
+        "flow": "appointment",
+        "appointment_step": "choose_slot",
+        "appointment_data": data,
+        "appointment_slots": slots,
+        "ai_response": (
+            "Uy, ese horario acaba de ser reservado por otro paciente 😅. Estos siguen disponibles:\n\n"
+            f"{options_text}\n\n"
+            f"¿Cuál prefieres? (Responde con el número {slot_choices(slots)})."
+        ),
+    }
+
+
+async def appointment_node(state: AgentState) -> AgentState:
     step = state.get("appointment_step", "ask_specialty")
     msg_raw = state["user_message"].strip()
     msg = msg_raw.lower()
@@ -344,9 +464,11 @@ def appointment_node(state: AgentState) -> AgentState:
     if step == "ask_reason":
         data["reason"] = msg_raw
         try:
-            diag_resp = llm.invoke([
-                HumanMessage(content=DIAGNOSIS_EXTRACTION_PROMPT.format(text=msg_raw))
+            diag_resp = await get_llm().ainvoke([
+                SystemMessage(content=DIAGNOSIS_SYSTEM_PROMPT),
+                HumanMessage(content=DIAGNOSIS_USER_PROMPT.format(text=msg_raw)),
             ])
+            usage_tracker.record("diagnosis", diag_resp)
             clean = diag_resp.content.replace("```json", "").replace("```", "").strip()
             diag = json.loads(clean)
             data["risk_level"] = diag.get("risk_level", "BAJO")
@@ -361,22 +483,23 @@ def appointment_node(state: AgentState) -> AgentState:
             data["specialty"] = data.get("specialty") or "Medicina General"
 
         specialty = data.get("specialty")
-        base_day = datetime.now() + timedelta(days=1)
-        base_day = base_day.replace(minute=0, second=0, microsecond=0)
-        new_slots = []
-        for hour in [9, 10, 11]:
-            start = base_day.replace(hour=hour)
-            end = start + timedelta(hours=1)
-            # Formato más amigable de fecha
-            label = f"{start.strftime('%d/%m')} de {start.strftime('%H:%M')} a {end.strftime('%H:%M')}"
-            new_slots.append({"label": label, "start": start.strftime('%Y-%m-%d %H:%M:%S')})
+        new_slots = availability.free_slots(specialty, settings.AVAILABILITY_OPTIONS, phone=state.get("whatsapp_number"))
+        if not new_slots:
+            return {
+                **state,
+                "flow": "menu",
+                "appointment_step": None,
+                "appointment_data": None,
+                "appointment_slots": [],
+                "ai_response": NO_SLOTS_TEXT.format(specialty=specialty),
+            }
 
         options_text = "\n".join([f"{idx+1}. {s['label']}" for idx, s in enumerate(new_slots)])
         
         text = (
             f"Gracias por la información. Hemos encontrado estos horarios disponibles para **{specialty}** 🕒:\n\n"
             f"{options_text}\n\n"
-            "¿Cuál prefieres? (Responde con el número 1, 2 o 3)."
+            f"¿Cuál prefieres? (Responde con el número {slot_choices(new_slots)})."
         )
         return {
             **state,
@@ -390,7 +513,7 @@ def appointment_node(state: AgentState) -> AgentState:
     # 5.3 Elegir horario
     if step == "choose_slot":
         idx = None
-        if msg in ("1", "2", "3"):
+        if msg.isdigit():
             idx = int(msg) - 1
         if idx is None or idx < 0 or idx >= len(slots):
             return {
@@ -399,9 +522,12 @@ def appointment_node(state: AgentState) -> AgentState:
                 "appointment_step": "choose_slot",
                 "appointment_data": data,
                 "appointment_slots": slots,
-                "ai_response": "Por favor, elige una de las opciones disponibles escribiendo el número (1, 2 o 3) 🙏.",
+                "ai_response": f"Por favor, elige una de las opciones disponibles escribiendo el número ({slot_choices(slots)}) 🙏.",
             }
         chosen = slots[idx]
+        # Apartar el turno mientras el paciente confirma
+        if not availability.hold(data.get("specialty"), chosen["start"], state.get("whatsapp_number")):
+            return slot_taken_response(state, data)
         data["appointment_time"] = chosen["start"]
         data["slot_label"] = chosen["label"]
         
@@ -429,6 +555,10 @@ def appointment_node(state: AgentState) -> AgentState:
     # 5.4 Confirmar y registrar
     if step == "confirm":
         if msg.startswith("s"): # si / sí / sip
+            # El apartado pudo vencer mientras el paciente respondía
+            phone = state.get("whatsapp_number")
+            if not availability.hold(data.get("specialty"), data.get("appointment_time"), phone):
+                return slot_taken_response(state, data)
             patient = state.get("patient_data") or {}
             payload = {
                 "patient": patient,
@@ -442,8 +572,9 @@ def appointment_node(state: AgentState) -> AgentState:
                 "appointment_time": data.get("appointment_time"),
             }
             try:
-                res = business_client.create_medical_case(payload)
+                res = await business_client.create_medical_case(payload)
                 if res:
+                    availability.book(data.get("specialty"), data.get("appointment_time"), phone)
                     case_id = res.get("case", {}).get("id")
                     text = (
                         "✅ **¡Listo! Tu cita ha sido registrada con éxito.**\n\n"
@@ -464,14 +595,18 @@ def appointment_node(state: AgentState) -> AgentState:
                         "case_id": case_id,
                         "ai_response": text,
                     }
+                # Sin caso creado el turno vuelve a estar libre para otros
+                availability.release(phone)
                 text = "😓 Ups, tuvimos un pequeño problema al conectar con el sistema. Por favor intenta de nuevo en unos minutos."
                 return {**state, "flow": "menu", "appointment_step": None, "ai_response": text}
 
             except Exception as e:
                 print(f"Error: {e}")
+                availability.release(phone)
                 return {**state, "flow": "menu", "appointment_step": None, "ai_response": "😓 Ups, tuvimos un error interno. Intenta más tarde."}
 
         # No confirmar
+        availability.release(state.get("whatsapp_number"))
         text = (
             "Entendido, he cancelado el registro de la cita 👌.\n\n"
             "¿En qué más puedo ayudarte hoy?\n"
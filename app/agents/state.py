@@ -26,6 +26,10 @@ class AgentState(TypedDict, total=False):
     appointment_slots: Optional[List[Dict[str, Any]]]
 
     # Historial y respuesta
-    history: List[str]
+    history: List[str]           # ring buffer de las últimas HISTORY_MAX_LINES líneas
+    summary: Optional[str]       # resumen rodante de lo que salió del historial
+    summary_buffer: List[str]    # líneas pendientes de incorporar al resumen
+    summary_seq: int             # líneas que entraron alguna vez a summary_buffer
     ai_response: str
+    ai_response_sent: bool       # True si la respuesta ya se envió en streaming
     case_id: Optional[int]
@@ -1,43 +1,122 @@
-from fastapi import APIRouter, Request, BackgroundTasks
+import asyncio
+from fastapi import APIRouter, Request
 from fastapi.responses import PlainTextResponse
-from twilio.rest import Client
 from app.config import settings
-from app.agents.graph import app_graph
+from app.agents.graph import get_app_graph, needs_llm
 from app.core.business import business_client
+from app.core.outbound import outbound
+from app.core.session_store import session_store
+from app.core.idempotency import message_dedup
+from app.core.concurrency import KeyedLock, KeyedMailbox
+from app.core.history import append_turn, drop_summarized, summarize
+from app.core.streaming import reply_sink, split_message
+from app.core.scheduler import work_scheduler
 
 # Router principal (usado en /api/webhook)
 router = APIRouter()
 
-client = Client(settings.TWILIO_SID, settings.TWILIO_TOKEN)
+# Respuesta cuando el carril de turnos con LLM está lleno
+BUSY_TEXT = (
+    "Estamos con alta demanda en este momento 🙏. "
+    "Por favor, vuelve a enviar tu mensaje en unos minutos."
+)
 
-memory_store = {}  # En prod usar Redis
+# Un lock por número: los turnos y la escritura del resumen no se pisan
+conversation_locks = KeyedLock()
+# Un turno en vuelo por número: el resto espera aquí, antes de elegir carril
+mailboxes = KeyedMailbox(settings.PHONE_MAILBOX_SIZE)
+
+# Referencias a tareas de fondo (evita que el GC las cancele)
+_background_tasks: set[asyncio.Task] = set()
+# Números con un resumen en curso (uno a la vez por conversación)
+_summarizing: set[str] = set()
 
 
 async def process_message(user_phone: str, body: str, sender: str):
     """Procesa el mensaje en background para no bloquear a Twilio"""
-    
+    try:
+        async with conversation_locks.hold(user_phone):
+            await _run_turn(user_phone, body, sender)
+    finally:
+        # Recién ahora el siguiente mensaje del número pasa a un carril
+        await dispatch_next(user_phone)
+
+
+async def dispatch_next(user_phone: str):
+    """Despacha el siguiente mensaje del buzón del número (o lo deja inactivo)."""
+    item = mailboxes.next(user_phone)
+    if item is not None:
+        await dispatch(user_phone, *item)
+
+
+async def dispatch(user_phone: str, body: str, sender: str):
+    """
+    Manda el turno al carril que corresponde. Los turnos que llaman a GPT-4o
+    van al carril lento, con concurrencia limitada, para que verificación y
+    menú no esperen detrás de ellos. Como hay un solo turno en vuelo por
+    número, el estado leído aquí ya incluye todos los turnos anteriores.
+    """
+    while True:
+        try:
+            state = await session_store.get(user_phone)
+        except Exception as e:
+            print(f"⚠️ No se pudo leer la sesión de {user_phone} para elegir carril: {e}")
+            state = None
+        lane = "slow" if needs_llm(state or {}, body) else "fast"
+        if work_scheduler.submit(lane, process_message, user_phone, body, sender):
+            return
+        print(f"🚦 Carril {lane} lleno: se rechaza el mensaje de {user_phone}")
+        await send_reply(sender, BUSY_TEXT)
+        item = mailboxes.next(user_phone)
+        if item is None:
+            return
+        body, sender = item
+
+
+async def send_reply(sender: str, text: str):
+    """
+    Encola `text` para WhatsApp, dividido en mensajes bajo el límite de
+    Twilio. El envío (con reintentos y límite de tasa) lo hace `outbound`.
+    """
+    for part in split_message(text, settings.WHATSAPP_MAX_CHARS):
+        await outbound.send(sender, part)
+
+
+async def _run_turn(user_phone: str, body: str, sender: str):
     # Recuperar estado
-    state = memory_store.get(user_phone, {
+    state = await session_store.get(user_phone) or {
         "whatsapp_number": user_phone, "user_message": "",
         "is_verified": False, "verification_step": "ask_dni",
         "history": [], "patient_data": None
-    })
+    }
     state["user_message"] = body
+    state["ai_response_sent"] = False
 
     # Log usuario
     if state.get("dni"):
         business_client.log_conversation(state["dni"], "user", body)
 
-    # Ejecutar Agente
+    # Ejecutar Agente (con streaming, los nodos envían la respuesta a medida
+    # que se genera a través de reply_sink)
+    token = None
+    if settings.STREAMING_ENABLED:
+        token = reply_sink.set(lambda text: send_reply(sender, text))
     try:
-        result = app_graph.invoke(state)
+        result = await get_app_graph().ainvoke(state)
         ai_response = result.get("ai_response", "Error interno.")
         
-        # Actualizar memoria
-        result["history"] = result.get("history", []) + [
-            f"User: {body}", f"AI: {ai_response}"
-        ]
-        memory_store[user_phone] = result
+        # Actualizar memoria (historial acotado; lo que sale va al resumen)
+        result = append_turn(
+            result, body, ai_response,
+            max_lines=settings.HISTORY_MAX_LINES,
+            buffer_limit=settings.HISTORY_SUMMARY_BATCH * 2 if settings.HISTORY_SUMMARY_ENABLED else 0,
+        )
+        await session_store.set(user_phone, result)
+        if len(result["summary_buffer"]) >= settings.HISTORY_SUMMARY_BATCH and user_phone not in _summarizing:
+            _summarizing.add(user_phone)
+            task = asyncio.create_task(_refresh_summary(user_phone))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
         
         # Log AI
         if state.get("dni"):
@@ -45,22 +124,51 @@ async def process_message(user_phone: str, body: str, sender: str):
                 state["dni"], "ai", ai_response, result.get("case_id")
             )
             
-        # Enviar Respuesta a WhatsApp
-        client.messages.create(
-            from_=settings.TWILIO_FROM,
-            body=ai_response,
-            to=sender
-        )
+        # Enviar Respuesta a WhatsApp (si no salió ya en streaming)
+        if not result.get("ai_response_sent"):
+            await send_reply(sender, ai_response)
 
     except Exception as e:
         print(f"Error processing: {e}")
+    finally:
+        if token is not None:
+            reply_sink.reset(token)
+
+
+async def _refresh_summary(user_phone: str):
+    """
+    Actualiza el resumen rodante fuera del camino crítico: la llamada al LLM
+    corre sin lock y solo la escritura del estado se serializa con los turnos.
+    """
+    try:
+        state = await session_store.get(user_phone)
+        if not state or not state.get("summary_buffer"):
+            return
+        lines = list(state["summary_buffer"])
+        summarized_seq = state.get("summary_seq") or 0
+        try:
+            summary = await summarize(state.get("summary") or "", lines)
+        except Exception as e:
+            print(f"⚠️ No se pudo actualizar el resumen de {user_phone}: {e}")
+            return
+
+        async with conversation_locks.hold(user_phone):
+            state = await session_store.get(user_phone)
+            if not state:
+                return
+            # Quitar solo las líneas ya resumidas (pudieron llegar más mientras
+            # tanto y el tope del buffer pudo descartar las más antiguas)
+            buffer = drop_summarized(state, summarized_seq)
+            await session_store.set(user_phone, {**state, "summary": summary, "summary_buffer": buffer})
+    finally:
+        _summarizing.discard(user_phone)
 
 
 # --------------------------
 # Ruta oficial (API REST)
 # --------------------------
 @router.post("/webhook")
-async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks):
+async def whatsapp_webhook(request: Request):
     form = await request.form()
     sender = form.get("From")
     body = form.get("Body", "")
@@ -68,10 +176,36 @@ async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks):
     if not sender or not body:
         return PlainTextResponse("No content")
 
+    # Reintento de Twilio (o el mismo mensaje por la otra ruta): ya se procesó
+    message_sid = form.get("MessageSid")
+    if message_sid and not await message_dedup.claim(message_sid):
+        print(f"♻️ Mensaje duplicado ignorado: {message_sid}")
+        return PlainTextResponse("OK")
+
     user_phone = sender.replace("whatsapp:", "")
     
-    # Procesar en Background (Respuesta inmediata a Twilio)
-    background_tasks.add_task(process_message, user_phone, body, sender)
+    # Procesar en Background (Respuesta inmediata a Twilio). Si el número ya
+    # tiene un turno en vuelo, el mensaje espera en su buzón y se despacha
+    # (en orden) cuando ese turno termine.
+    status = None
+    try:
+        status = mailboxes.offer(user_phone, (body, sender))
+        if status == KeyedMailbox.DISPATCH:
+            await dispatch(user_phone, body, sender)
+        elif status == KeyedMailbox.FULL:
+            print(f"🚦 Buzón de {user_phone} lleno: se rechaza el mensaje")
+            await send_reply(sender, BUSY_TEXT)
+    except Exception:
+        # Twilio recibe un error y reintenta: el reintento no es un duplicado
+        if message_sid:
+            await message_dedup.release(message_sid)
+        if status == KeyedMailbox.DISPATCH:
+            # El mensaje no llegó a un carril: el buzón no debe quedar tomado
+            try:
+                await dispatch_next(user_phone)
+            except Exception as e:
+                print(f"⚠️ No se pudo despachar el buzón de {user_phone}: {e}")
+        raise
     
     return PlainTextResponse("OK")
 
@@ -82,6 +216,6 @@ async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks):
 legacy_router = APIRouter()
 
 @legacy_router.post("/webhook")
-async def legacy_webhook(request: Request, background_tasks: BackgroundTasks):
+async def legacy_webhook(request: Request):
     """Versión sin prefix /api, para Twilio"""
-    return await whatsapp_webhook(request, background_tasks)
+    return await whatsapp_webhook(request)
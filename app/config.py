@@ -6,8 +6,67 @@ load_dotenv()
 
 class Settings:
     # Server & Business
+    # Workers uvicorn (uvicorn --workers también lee WEB_CONCURRENCY). Con más
+    # de uno, el estado en memoria es por proceso: los apartados de turnos
+    # (availability) y el orden por teléfono (KeyedLock / KeyedMailbox) solo
+    # valen dentro de cada worker.
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+    WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "15"))
     BUSINESS_URL = os.getenv("BUSINESS_BACKEND_URL")
+    BUSINESS_POOL_SIZE = int(os.getenv("BUSINESS_POOL_SIZE", "20"))
+    BUSINESS_KEEPALIVE = int(os.getenv("BUSINESS_KEEPALIVE", "10"))
+    BUSINESS_TIMEOUT = float(os.getenv("BUSINESS_TIMEOUT", "10"))
+    BUSINESS_MAX_RETRIES = int(os.getenv("BUSINESS_MAX_RETRIES", "2"))
+    BUSINESS_RETRY_BACKOFF = float(os.getenv("BUSINESS_RETRY_BACKOFF", "0.3"))
+    BUSINESS_BREAKER_THRESHOLD = int(os.getenv("BUSINESS_BREAKER_THRESHOLD", "5"))
+    BUSINESS_BREAKER_RESET = float(os.getenv("BUSINESS_BREAKER_RESET", "30"))
+
+    # Caché de perfiles de paciente por DNI (los negativos duran menos)
+    PATIENT_CACHE_TTL = float(os.getenv("PATIENT_CACHE_TTL", "300"))
+    PATIENT_CACHE_NEGATIVE_TTL = float(os.getenv("PATIENT_CACHE_NEGATIVE_TTL", "30"))
+    PATIENT_CACHE_MAX_ENTRIES = int(os.getenv("PATIENT_CACHE_MAX_ENTRIES", "10000"))
+
+    # Disponibilidad de citas (calendario por especialidad del backend de negocio,
+    # contrato en BusinessClient.get_availability). Si no está publicado se usa
+    # el horario de atención, que no ve las citas reales: availability_fallback=1
+    # en /metrics y "availability": "fallback" en /readyz.
+    AVAILABILITY_PATH = os.getenv("AVAILABILITY_PATH", "/appointments/availability")
+    AVAILABILITY_TIMEZONE = os.getenv("AVAILABILITY_TIMEZONE", "America/Lima")  # zona de la clínica
+    AVAILABILITY_DAYS = int(os.getenv("AVAILABILITY_DAYS", "7"))
+    AVAILABILITY_REFRESH = float(os.getenv("AVAILABILITY_REFRESH", "60"))
+    AVAILABILITY_SLOT_MINUTES = int(os.getenv("AVAILABILITY_SLOT_MINUTES", "60"))
+    AVAILABILITY_WORK_HOURS = os.getenv("AVAILABILITY_WORK_HOURS", "09:00-13:00")  # "09:00-13:00,15:00-18:00"
+    AVAILABILITY_WORK_DAYS = os.getenv("AVAILABILITY_WORK_DAYS", "0,1,2,3,4,5")  # 0 = lunes
+    AVAILABILITY_LEAD_MINUTES = int(os.getenv("AVAILABILITY_LEAD_MINUTES", "60"))
+    AVAILABILITY_HOLD_SECONDS = float(os.getenv("AVAILABILITY_HOLD_SECONDS", "300"))
+    AVAILABILITY_OPTIONS = int(os.getenv("AVAILABILITY_OPTIONS", "3"))
+
+    # Cola de logs (conversaciones / wellness)
+    LOG_QUEUE_MAX_SIZE = int(os.getenv("LOG_QUEUE_MAX_SIZE", "1000"))
+    LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "20"))
+    LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "2"))
+
+    # Sesiones: "memory" | "sqlite" | "redis"
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+    SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "86400"))
+    SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+    SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", "sessions.db")
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+    # Deduplicación de webhooks por MessageSid: "memory" | "sqlite" | "redis"
+    # (sqlite usa el mismo archivo que las sesiones)
+    WEBHOOK_DEDUP_BACKEND = os.getenv("WEBHOOK_DEDUP_BACKEND", SESSION_BACKEND)
+    WEBHOOK_DEDUP_TTL = float(os.getenv("WEBHOOK_DEDUP_TTL", "3600"))
+    WEBHOOK_DEDUP_MAX_ENTRIES = int(os.getenv("WEBHOOK_DEDUP_MAX_ENTRIES", "50000"))
     
+    # Proveedor de modelos: "azure" | "record" | "replay" | fábrica "modulo:funcion"
+    # (ver app/core/llm.py y app/core/model_replay.py)
+    MODEL_PROVIDER = os.getenv("MODEL_PROVIDER", "azure")
+    MODEL_RECORD_SOURCE = os.getenv("MODEL_RECORD_SOURCE", "azure")
+    MODEL_STORE_PATH = os.getenv("MODEL_STORE_PATH", "model_store.db")
+    MODEL_REPLAY_LATENCY = os.getenv("MODEL_REPLAY_LATENCY", "none")  # "none" | "recorded" | "lognormal:0.8:0.4"
+    MODEL_REPLAY_SEED = int(os.getenv("MODEL_REPLAY_SEED", "0"))
+
     # Azure Chat
     AZURE_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
     AZURE_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
@@ -16,15 +75,62 @@ class Settings:
     
     # Azure Embeddings (Para Query)
     AZURE_EMBEDDING_DEPLOYMENT = os.getenv("AZURE_EMBEDDING_DEPLOYMENT")
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")  # vacío = solo memoria
+
+    # Caché semántica de respuestas (wellness_node / medical_node)
+    # (wellness es opt-in: agrega un embedding a cada turno de wellness)
+    SEMANTIC_CACHE_WELLNESS = os.getenv("SEMANTIC_CACHE_WELLNESS", "false").lower() == "true"
+    SEMANTIC_CACHE_MEDICAL = os.getenv("SEMANTIC_CACHE_MEDICAL", "true").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+    SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "500"))
     
     # Azure Search
     SEARCH_ENDPOINT = os.getenv("AZURE_SEARCH_SERVICE_ENDPOINT")
     SEARCH_INDEX = os.getenv("AZURE_SEARCH_INDEX_NAME")
     SEARCH_KEY = os.getenv("AZURE_SEARCH_API_KEY")
+
+    # Recuperación: "azure" | "local" | "auto" (Azure con respaldo local)
+    RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "auto")
+    LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "local_index")
+    LOCAL_INDEX_DTYPE = os.getenv("LOCAL_INDEX_DTYPE", "float32")  # "float32" | "int8"
+    LOCAL_INDEX_HNSW = os.getenv("LOCAL_INDEX_HNSW", "false").lower() == "true"
+
+    # Empaquetado de contexto para MEDICAL_USER_PROMPT (en tokens)
+    RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "6"))
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "700"))
+    HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "300"))
+
+    # Historial por sesión: ring buffer + resumen rodante opcional
+    HISTORY_MAX_LINES = int(os.getenv("HISTORY_MAX_LINES", "8"))
+    HISTORY_SUMMARY_ENABLED = os.getenv("HISTORY_SUMMARY_ENABLED", "false").lower() == "true"
+    HISTORY_SUMMARY_BATCH = int(os.getenv("HISTORY_SUMMARY_BATCH", "6"))
+    
+    # Planificador de turnos: carril rápido (sin LLM) y carril lento (con LLM)
+    FAST_LANE_WORKERS = int(os.getenv("FAST_LANE_WORKERS", "32"))
+    FAST_LANE_QUEUE = int(os.getenv("FAST_LANE_QUEUE", "1000"))
+    SLOW_LANE_CONCURRENCY = int(os.getenv("SLOW_LANE_CONCURRENCY", "8"))
+    SLOW_LANE_QUEUE = int(os.getenv("SLOW_LANE_QUEUE", "64"))
+    # Mensajes de un mismo número esperando su turno antes del carril
+    PHONE_MAILBOX_SIZE = int(os.getenv("PHONE_MAILBOX_SIZE", "20"))
     
     # Twilio
     TWILIO_SID = os.getenv("TWILIO_SID")
     TWILIO_TOKEN = os.getenv("TWILIO_TOKEN")
     TWILIO_FROM = os.getenv("TWILIO_WHATSAPP_NUMBER")
+    TWILIO_API_BASE = os.getenv("TWILIO_API_BASE", "https://api.twilio.com")
+
+    # Envío de respuestas (cola + workers + límite de tasa del número emisor)
+    OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", "4"))
+    OUTBOUND_QUEUE_SIZE = int(os.getenv("OUTBOUND_QUEUE_SIZE", "1000"))
+    OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "4"))
+    TWILIO_SEND_RATE = float(os.getenv("TWILIO_SEND_RATE", "10"))  # mensajes por segundo
+    TWILIO_SEND_BURST = int(os.getenv("TWILIO_SEND_BURST", "10"))
+
+    # Respuestas por WhatsApp: límite de caracteres por mensaje y envío
+    # anticipado del primer párrafo mientras el LLM sigue generando
+    WHATSAPP_MAX_CHARS = int(os.getenv("WHATSAPP_MAX_CHARS", "1600"))
+    STREAMING_ENABLED = os.getenv("STREAMING_ENABLED", "false").lower() == "true"
 
 settings = Settings()
\ No newline at end of file
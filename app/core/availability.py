@@ -0,0 +1,333 @@
+# app/core/availability.py
+import asyncio
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable
+from zoneinfo import ZoneInfo
+from app.config import settings
+from app.core.business import business_client
+
+SLOT_FORMAT = "%Y-%m-%d %H:%M:%S"  # formato de appointment_time en /cases/from-ia (hora de la clínica)
+
+
+def _parse_time(value: str, tz: ZoneInfo) -> float:
+    """ISO 8601 → epoch. Sin zona se asume la hora de la clínica."""
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=tz)
+    return dt.timestamp()
+
+
+def _merge(intervals: list[tuple[float, float]]) -> tuple[list[float], list[float]]:
+    """Une intervalos solapados; devuelve inicios y fines ordenados (disjuntos)."""
+    starts, ends = [], []
+    for start, end in sorted(intervals):
+        if ends and start <= ends[-1]:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+def _slot(start: float, end: float, tz: ZoneInfo) -> dict:
+    s, e = datetime.fromtimestamp(start, tz), datetime.fromtimestamp(end, tz)
+    return {
+        "label": f"{s.strftime('%d/%m')} de {s.strftime('%H:%M')} a {e.strftime('%H:%M')}",
+        "start": s.strftime(SLOT_FORMAT),
+        "end": e.strftime(SLOT_FORMAT),
+    }
+
+
+class _Calendar:
+    """
+    Turnos libres de una especialidad: inicios ordenados (para bisect) y, en
+    paralelo, el turno ya formateado para el mensaje y el caso.
+    """
+
+    def __init__(self, starts: list[float], slots: list[dict], source: str):
+        self.starts = starts
+        self.slots = slots
+        self.source = source  # "backend" | "fallback"
+
+    def remove(self, start: float):
+        i = bisect_left(self.starts, start)
+        if i < len(self.starts) and self.starts[i] == start:
+            del self.starts[i]
+            del self.slots[i]
+
+
+class AvailabilityIndex:
+    """
+    Disponibilidad de citas por especialidad.
+
+    - Un task de fondo trae en bloque el calendario de todas las especialidades
+      (`fetch`) cada `refresh_interval` segundos y recalcula los turnos libres:
+      bloques de atención partidos en turnos de `slot_minutes`, sin los que se
+      cruzan con citas ya reservadas.
+    - Consultar turnos libres no hace I/O: es un bisect sobre la lista ordenada
+      de inicios.
+    - Si el backend no publica el calendario (o no trae una especialidad), se
+      usa el horario de atención configurado. Esos turnos NO conocen las citas
+      reales: el modo respaldo se expone como `availability_fallback` en
+      /metrics y en /readyz.
+    - Al elegir un turno se lo aparta (`hold`) por `hold_seconds` a nombre del
+      teléfono, para que otro paciente no lo tome antes de crear el caso. Un
+      teléfono tiene a lo más un turno apartado.
+
+    Todas las horas (horario de atención, etiquetas y appointment_time) están
+    en la zona de la clínica (`timezone`), no en la del servidor.
+
+    Los apartados viven en memoria: con varios workers cada uno ve solo los suyos
+    (ver WEB_CONCURRENCY en app/config.py).
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[date, int], Awaitable[dict | None]],
+        days: int = 7,
+        refresh_interval: float = 60,
+        slot_minutes: int = 60,
+        work_hours: str = "09:00-13:00",
+        work_days: str = "0,1,2,3,4,5",
+        lead_minutes: int = 60,
+        hold_seconds: float = 300,
+        timezone: str = "America/Lima",
+    ):
+        self._fetch = fetch
+        self.tz = ZoneInfo(timezone)
+        self.days = days
+        self.refresh_interval = refresh_interval
+        self.slot_seconds = slot_minutes * 60
+        self.work_hours = [tuple(block.split("-")) for block in work_hours.split(",")]
+        self.work_days = {int(d) for d in work_days.split(",")}
+        self.lead_seconds = lead_minutes * 60
+        self.hold_seconds = hold_seconds
+        self._calendars: dict[str, _Calendar] = {}
+        self._holds: dict[tuple[str, float], tuple[str, float]] = {}  # (especialidad, inicio) -> (teléfono, expira)
+        self._hold_by_phone: dict[str, tuple[str, float]] = {}
+        self._booked: set[tuple[str, float]] = set()  # reservas propias aún no reflejadas por el backend
+        self._task: asyncio.Task | None = None
+        self.last_refresh: float | None = None
+        self.backend_ok = False  # último refresco trajo el calendario del backend
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.queries = 0
+        self.holds_placed = 0
+        self.hold_conflicts = 0
+        self.booked = 0
+
+    # --------------------------
+    # Ciclo de vida
+    # --------------------------
+    def start(self):
+        """Arranca el refresco periódico (debe llamarse con el event loop corriendo)."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+    # --------------------------
+    # Construcción del índice
+    # --------------------------
+    async def refresh(self):
+        """Trae el calendario del backend y reemplaza el índice (si falla, se conserva el anterior)."""
+        self._expire_holds()
+        try:
+            data = await self._fetch(self._today(), self.days)
+        except Exception as e:
+            print(f"❌ Error trayendo disponibilidad: {e}")
+            data = None
+        if data is None:
+            self.refresh_errors += 1
+            if self.backend_ok or self.refresh_errors == 1:
+                print("⚠️ Disponibilidad en modo respaldo: turnos según el horario de atención, sin ver las citas reales")
+            self.backend_ok = False
+            # Sin calendario del backend, los turnos de respaldo se regeneran
+            # para que el horizonte avance con los días
+            self._calendars = {k: c for k, c in self._calendars.items() if c.source == "backend"}
+            return
+
+        calendars = {}
+        for specialty, calendar in (data.get("specialties") or {}).items():
+            try:
+                opening = [(_parse_time(b["start"], self.tz), _parse_time(b["end"], self.tz)) for b in calendar.get("open", [])]
+                booked = [(_parse_time(b["start"], self.tz), _parse_time(b["end"], self.tz)) for b in calendar.get("booked", [])]
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"⚠️ Calendario inválido para {specialty}: {e}")
+                continue
+            calendars[specialty] = self._build(specialty, opening, booked, "backend")
+
+        self._calendars = calendars
+        self.backend_ok = True
+        self.last_refresh = time.time()
+        self.refreshes += 1
+        print(f"📅 Disponibilidad actualizada: {len(calendars)} especialidades")
+
+    def _build(self, specialty: str, opening, booked, source: str) -> _Calendar:
+        """Parte los bloques de atención en turnos y descarta los que se cruzan con una reserva."""
+        booked_starts, booked_ends = _merge(booked)
+        starts, slots = [], []
+        for block_start, block_end in sorted(opening):
+            slot = block_start
+            while slot + self.slot_seconds <= block_end:
+                slot_end = slot + self.slot_seconds
+                # Reserva que empieza antes (o en) el turno y termina después de su inicio,
+                # o la siguiente reserva que empieza antes de que termine el turno
+                i = bisect_right(booked_starts, slot) - 1
+                taken = (i >= 0 and booked_ends[i] > slot) or (
+                    i + 1 < len(booked_starts) and booked_starts[i + 1] < slot_end
+                )
+                if not taken and (specialty, slot) not in self._booked:
+                    starts.append(slot)
+                    slots.append(_slot(slot, slot_end, self.tz))
+                slot = slot_end
+        return _Calendar(starts, slots, source)
+
+    def _fallback(self, specialty: str) -> _Calendar:
+        """Turnos según el horario de atención (AVAILABILITY_WORK_HOURS / _DAYS)."""
+        opening = []
+        today = self._today()
+        for offset in range(self.days + 1):
+            day = today + timedelta(days=offset)
+            if day.weekday() not in self.work_days:
+                continue
+            for start, end in self.work_hours:
+                opening.append((
+                    datetime.combine(day, datetime.strptime(start, "%H:%M").time(), tzinfo=self.tz).timestamp(),
+                    datetime.combine(day, datetime.strptime(end, "%H:%M").time(), tzinfo=self.tz).timestamp(),
+                ))
+        return self._build(specialty, opening, [], "fallback")
+
+    def _today(self) -> date:
+        return datetime.now(self.tz).date()
+
+    def _timestamp(self, start: str | None) -> float | None:
+        """appointment_time (hora de la clínica) → epoch; None si falta o no es válido."""
+        try:
+            return datetime.strptime(start, SLOT_FORMAT).replace(tzinfo=self.tz).timestamp()
+        except (TypeError, ValueError):
+            return None
+
+    def _calendar(self, specialty: str) -> _Calendar:
+        calendar = self._calendars.get(specialty)
+        if calendar is None:
+            calendar = self._calendars[specialty] = self._fallback(specialty)
+        return calendar
+
+    # --------------------------
+    # Consultas y apartados
+    # --------------------------
+    def _held_by_other(self, key: tuple[str, float], phone: str | None, now: float) -> bool:
+        hold = self._holds.get(key)
+        return hold is not None and hold[1] > now and hold[0] != phone
+
+    def free_slots(self, specialty: str, limit: int = 3, phone: str | None = None) -> list[dict]:
+        """Próximos `limit` turnos libres (sin apartados de otros teléfonos)."""
+        self.queries += 1
+        calendar = self._calendar(specialty)
+        now = time.time()
+        slots = []
+        i = bisect_left(calendar.starts, now + self.lead_seconds)
+        while i < len(calendar.starts) and len(slots) < limit:
+            start = calendar.starts[i]
+            if not self._held_by_other((specialty, start), phone, now):
+                slots.append(dict(calendar.slots[i]))
+            i += 1
+        return slots
+
+    def hold(self, specialty: str, start: str, phone: str) -> bool:
+        """
+        Aparta el turno para `phone` (libera su apartado anterior). False si ya
+        no está libre o si `start` falta (sesiones anteriores a este índice).
+        """
+        ts = self._timestamp(start)
+        now = time.time()
+        # Igual que free_slots: un turno ya pasado o dentro de la anticipación mínima no se aparta
+        if ts is None or not specialty or ts < now + self.lead_seconds:
+            self.hold_conflicts += 1
+            return False
+        key = (specialty, ts)
+        calendar = self._calendar(specialty)
+        i = bisect_left(calendar.starts, ts)
+        free = i < len(calendar.starts) and calendar.starts[i] == ts
+        if not free or self._held_by_other(key, phone, now):
+            self.hold_conflicts += 1
+            return False
+
+        self.release(phone)
+        self._holds[key] = (phone, now + self.hold_seconds)
+        self._hold_by_phone[phone] = key
+        self.holds_placed += 1
+        return True
+
+    def release(self, phone: str):
+        key = self._hold_by_phone.pop(phone, None)
+        if key is not None and self._holds.get(key, ("",))[0] == phone:
+            del self._holds[key]
+
+    def book(self, specialty: str, start: str, phone: str):
+        """Marca el turno como reservado (tras crear el caso) hasta que el backend lo refleje."""
+        ts = self._timestamp(start)
+        self.release(phone)
+        if ts is None:
+            return
+        self._booked.add((specialty, ts))
+        self._calendar(specialty).remove(ts)
+        self.booked += 1
+
+    def _expire_holds(self):
+        now = time.time()
+        for key, (phone, expires) in list(self._holds.items()):
+            if expires <= now:
+                del self._holds[key]
+                if self._hold_by_phone.get(phone) == key:
+                    del self._hold_by_phone[phone]
+        self._booked = {(s, ts) for s, ts in self._booked if ts > now}
+
+    @property
+    def fallback(self) -> bool:
+        """True si algún turno ofrecido sale del horario de atención y no del calendario real."""
+        return not self.backend_ok or any(c.source == "fallback" for c in self._calendars.values())
+
+    def stats(self) -> dict:
+        return {
+            "fallback": int(self.fallback),
+            "specialties": len(self._calendars),
+            "backend_calendars": sum(1 for c in self._calendars.values() if c.source == "backend"),
+            "free_slots": sum(len(c.starts) for c in self._calendars.values()),
+            "holds": len(self._holds),
+            "queries": self.queries,
+            "holds_placed": self.holds_placed,
+            "hold_conflicts": self.hold_conflicts,
+            "booked": self.booked,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "last_refresh_age": round(time.time() - self.last_refresh, 1) if self.last_refresh else None,
+        }
+
+
+availability = AvailabilityIndex(
+    business_client.get_availability,
+    days=settings.AVAILABILITY_DAYS,
+    refresh_interval=settings.AVAILABILITY_REFRESH,
+    slot_minutes=settings.AVAILABILITY_SLOT_MINUTES,
+    work_hours=settings.AVAILABILITY_WORK_HOURS,
+    work_days=settings.AVAILABILITY_WORK_DAYS,
+    lead_minutes=settings.AVAILABILITY_LEAD_MINUTES,
+    hold_seconds=settings.AVAILABILITY_HOLD_SECONDS,
+    timezone=settings.AVAILABILITY_TIMEZONE,
+)
@@ -1,5 +1,28 @@
-import requests
+import asyncio
+from datetime import date
+import httpx
 from app.config import settings
+from app.core.resilience import CircuitBreaker, backoff_delay
+from app.core.log_queue import LogQueue
+from app.core.metrics import EXTERNAL_ERRORS, observe
+from app.core.patient_cache import PatientCache
+
+# Timeouts por endpoint (segundos). Lo que no esté aquí usa BUSINESS_TIMEOUT.
+ENDPOINT_TIMEOUTS = {
+    "/patients/by-dni": 5,
+    "/patients/send-code": 10,
+    "/patients/verify-code": 5,
+    "/conversations/log": 5,
+    "/wellness/log": 5,
+    "/cases/from-ia": 10,
+}
+
+# Códigos que justifican reintentar una llamada idempotente
+RETRY_STATUS = {502, 503, 504}
+
+# Fallos en la fase de conexión: la petición nunca llegó al servidor, así que
+# se reintentan incluso los POST (van antes que TimeoutException, su clase base)
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
 
 
 class BusinessClient:
@@ -7,56 +30,228 @@ class BusinessClient:
         # La variable de entorno YA incluye /api al final
         # Ej: https://medisensebackendbs.onrender.com/api
         self.base_url = settings.BUSINESS_URL
+        # Pool de conexiones keep-alive compartido (se crea al primer uso)
+        self._client: httpx.AsyncClient | None = None
+        self.breaker = CircuitBreaker(
+            "business",
+            failure_threshold=settings.BUSINESS_BREAKER_THRESHOLD,
+            reset_timeout=settings.BUSINESS_BREAKER_RESET,
+        )
+        # Los logs no bloquean el turno: se encolan y se envían en lotes
+        self.log_queue = LogQueue(
+            self._post,
+            max_size=settings.LOG_QUEUE_MAX_SIZE,
+            batch_size=settings.LOG_BATCH_SIZE,
+            flush_interval=settings.LOG_FLUSH_INTERVAL,
+        )
+        # Perfiles por DNI: evita repetir by-dni en reintentos y sesiones que vuelven
+        self.patients = PatientCache(
+            ttl=settings.PATIENT_CACHE_TTL,
+            negative_ttl=settings.PATIENT_CACHE_NEGATIVE_TTL,
+            max_entries=settings.PATIENT_CACHE_MAX_ENTRIES,
+        )
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url or "",
+                timeout=settings.BUSINESS_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.BUSINESS_POOL_SIZE,
+                    max_keepalive_connections=settings.BUSINESS_KEEPALIVE,
+                ),
+            )
+        return self._client
+
+    async def warm_up(self):
+        """Abre una conexión keep-alive (TCP + TLS) antes del primer turno; cualquier status sirve."""
+        if self.base_url:
+            await self._get_client().head("/", timeout=5)
+
+    async def aclose(self):
+        """Cierra el cliente HTTP (se llama al apagar la app)."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    @staticmethod
+    def _timeout_for(endpoint: str) -> float:
+        for prefix, timeout in ENDPOINT_TIMEOUTS.items():
+            if endpoint.startswith(prefix):
+                return timeout
+        return settings.BUSINESS_TIMEOUT
+
+    @staticmethod
+    def _route_for(endpoint: str) -> str:
+        """Etiqueta para /metrics sin datos variables (p. ej. sin el DNI)."""
+        for prefix in ENDPOINT_TIMEOUTS:
+            if endpoint.startswith(prefix):
+                return prefix
+        return endpoint
 
-    def _post(self, endpoint: str, data: dict):
+    async def _request(self, method: str, endpoint: str, idempotent: bool = False, **kwargs):
+        """
+        Ejecuta la llamada sobre el pool compartido.
+
+        - Si el circuito está abierto, falla al instante (devuelve None).
+        - Errores y timeouts de conexión (la petición nunca salió) se reintentan siempre.
+        - Timeouts de lectura/escritura y 502/503/504 solo se reintentan si la llamada es idempotente.
+        - Entre intentos se espera un backoff exponencial con jitter.
+        """
+        if not self.breaker.allow():
+            print(f"⛔ Backend de negocio no disponible (circuito abierto): {method} {endpoint}")
+            return None
+
+        client = self._get_client()
+        timeout = self._timeout_for(endpoint)
+        route = self._route_for(endpoint)
+        attempts = settings.BUSINESS_MAX_RETRIES + 1
+        try:
+            for attempt in range(attempts):
+                last = attempt == attempts - 1
+                try:
+                    with observe("business", route):
+                        res = await client.request(method, endpoint, timeout=timeout, **kwargs)
+                except CONNECT_ERRORS as e:
+                    if last:
+                        self.breaker.record_failure()
+                        raise
+                    print(f"🔁 Reintentando {method} {endpoint} tras error de conexión: {e}")
+                except httpx.TimeoutException:
+                    if last or not idempotent:
+                        self.breaker.record_failure()
+                        raise
+                    print(f"🔁 Reintentando {method} {endpoint} tras timeout")
+                except httpx.TransportError:
+                    self.breaker.record_failure()
+                    raise
+                else:
+                    if res.status_code >= 500:
+                        EXTERNAL_ERRORS.inc(service="business", operation=route)
+                    if res.status_code in RETRY_STATUS and idempotent and not last:
+                        print(f"🔁 Reintentando {method} {endpoint} tras {res.status_code}")
+                    elif res.status_code >= 500:
+                        self.breaker.record_failure()
+                        return res
+                    else:
+                        self.breaker.record_success()
+                        return res
+                await asyncio.sleep(backoff_delay(attempt, base=settings.BUSINESS_RETRY_BACKOFF))
+        except BaseException:
+            # Cancelación (apagado, wait_for) o error no previsto: no dejar
+            # tomada la llamada de prueba del circuito
+            self.breaker.abandon()
+            raise
+
+    async def _post(self, endpoint: str, data: dict):
         """
         Helper para POST con logs de debugging.
         """
         try:
-            full_url = f"{self.base_url}{endpoint}"
-            print(f"🚀 POST → {full_url} | payload={data}")
-            res = requests.post(full_url, json=data, timeout=10)
-            print(f"🔙 Respuesta {full_url}: {res.status_code} {res.text}")
+            print(f"🚀 POST → {self.base_url}{endpoint} | payload={data}")
+            res = await self._request("POST", endpoint, json=data)
+            if res is not None:
+                print(f"🔙 Respuesta {endpoint}: {res.status_code} {res.text}")
             return res
         except Exception as e:
             print(f"❌ Error POST {endpoint}: {e}")
             return None
 
-    def get_patient_by_dni(self, dni: str):
+    async def get_patient_by_dni(self, dni: str):
+        cached = self.patients.get(dni)
+        if cached is PatientCache.MISSING:
+            print(f"🗂️ DNI {dni} no registrado (caché)")
+            return {"exists": False}
+        if cached is not None:
+            print(f"🗂️ Paciente {dni} desde caché")
+            return {"exists": True, "patient": cached}
+
         try:
-            url = f"{self.base_url}/patients/by-dni/{dni}"
-            print(f"🔎 GET → {url}")
-            res = requests.get(url, timeout=5)
-            print(f"🔙 Respuesta GET {url}: {res.status_code} {res.text}")
-            return res.json() if res.status_code == 200 else None
+            endpoint = f"/patients/by-dni/{dni}"
+            print(f"🔎 GET → {self.base_url}{endpoint}")
+            res = await self._request("GET", endpoint, idempotent=True)
+            if res is None:
+                return None
+            print(f"🔙 Respuesta GET {endpoint}: {res.status_code} {res.text}")
+            if res.status_code == 404:
+                self.patients.put_missing(dni)
+                return None
+            if res.status_code != 200:
+                return None
+            data = res.json()
+            if data.get("exists") and data.get("patient"):
+                self.patients.put(dni, data["patient"])
+            elif not data.get("exists"):
+                self.patients.put_missing(dni)
+            return data
         except Exception as e:
             print(f"❌ Error GET /patients/by-dni: {e}")
             return None
 
-    def send_verification_code(self, dni: str):
-        self._post("/patients/send-code", {"dni": dni})
+    async def get_availability(self, start: date, days: int):
+        """
+        Calendario de todas las especialidades (bloques de atención y citas reservadas).
 
-    def verify_code(self, dni: str, code: str):
-        res = self._post("/patients/verify-code", {"dni": dni, "code": code})
+        Contrato esperado del backend de negocio (AVAILABILITY_PATH):
+            GET /appointments/availability?from=2025-01-06&days=7
+            200 {"specialties": {"Cardiología": {
+                    "open":   [{"start": "2025-01-06T09:00:00-05:00", "end": "2025-01-06T13:00:00-05:00"}],
+                    "booked": [{"start": "2025-01-06T10:00:00-05:00", "end": "2025-01-06T11:00:00-05:00"}]}}}
+        Horas ISO 8601; sin zona se asume AVAILABILITY_TIMEZONE. Si el backend
+        no lo publica (404, error) devuelve None y AvailabilityIndex pasa a modo
+        respaldo (horario de atención, sin ver las citas reales).
+        """
+        endpoint = settings.AVAILABILITY_PATH
+        try:
+            res = await self._request(
+                "GET", endpoint, idempotent=True, params={"from": start.isoformat(), "days": days}
+            )
+            if res is None:
+                return None
+            if res.status_code != 200:
+                print(f"⚠️ GET {endpoint}: {res.status_code}, se usa el horario de atención")
+                return None
+            return res.json()
+        except Exception as e:
+            print(f"❌ Error GET {endpoint}: {e}")
+            return None
+
+    async def send_verification_code(self, dni: str):
+        await self._post("/patients/send-code", {"dni": dni})
+
+    async def verify_code(self, dni: str, code: str):
+        res = await self._post("/patients/verify-code", {"dni": dni, "code": code})
         if res and res.status_code == 200:
             try:
-                return res.json().get("patient")
+                patient = res.json().get("patient")
             except Exception as e:
                 print(f"❌ Error leyendo JSON verify-code: {e}")
                 return None
+            if patient:
+                self.patients.put(dni, patient)
+            return patient
         return None
 
+    def invalidate_patient(self, dni: str | None = None):
+        """Olvida el perfil cacheado de un DNI (o todos), p. ej. tras actualizarlo en el backend."""
+        self.patients.invalidate(dni)
+
+    @staticmethod
+    def _with_dni(patient):
+        """Copia del paciente con `dni` (el backend de negocio lo espera así), sin tocar el original."""
+        if patient and "document_number" in patient:
+            return {**patient, "dni": patient["document_number"]}
+        return dict(patient) if patient else patient
+
     def log_wellness(self, patient_data, msg: str, ai_resp: str):
-        if patient_data and "document_number" in patient_data:
-            patient_data["dni"] = patient_data["document_number"]
-            
         payload = {
-            "patient": patient_data, 
-            "user_message": msg, 
-            "ai_response": ai_resp, 
+            # Copia: el envío es diferido y el estado de sesión puede cambiar
+            "patient": self._with_dni(patient_data),
+            "user_message": msg,
+            "ai_response": ai_resp,
             "category": "wellness",
         }
-        self._post("/wellness/log", payload)
+        self.log_queue.enqueue("/wellness/log", payload)
 
     def log_conversation(self, dni: str, sender: str, message: str, case_id=None):
         payload = {
@@ -65,21 +260,18 @@ class BusinessClient:
             "message": message,
             "case_id": case_id,
         }
-        self._post("/conversations/log", payload)
+        self.log_queue.enqueue("/conversations/log", payload)
 
-    def create_medical_case(self, data: dict):
+    async def create_medical_case(self, data: dict):
         """
         Llama a /api/cases/from-ia y devuelve el JSON si status 200.
         Añade logs detallados para entender por qué falla.
         """
-        patient = data.get("patient", {})
-        
-        # Traducir document_number → dni para backend de negocio
-        if "document_number" in patient:
-            patient["dni"] = patient["document_number"]
-            data["patient"] = patient
-        
-        res = self._post("/cases/from-ia", data)
+        # Traducir document_number → dni para backend de negocio (sin
+        # modificar el payload ni el patient_data de la sesión)
+        data = {**data, "patient": self._with_dni(data.get("patient", {}))}
+
+        res = await self._post("/cases/from-ia", data)
         if not res:
             print("❌ No hubo respuesta del backend de negocio al crear caso.")
             return None
@@ -0,0 +1,111 @@
+# app/core/concurrency.py
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+class _KeyEntry:
+    __slots__ = ("lock", "depth")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.depth = 0  # mensajes en curso + esperando para esta clave
+
+
+class KeyedLock:
+    """
+    Un asyncio.Lock por clave (número de WhatsApp).
+
+    Los mensajes de una misma conversación se procesan de uno en uno y en orden
+    de llegada (asyncio.Lock despierta a los que esperan en orden FIFO), mientras
+    que conversaciones distintas siguen corriendo en paralelo. Las entradas se
+    eliminan cuando ya nadie las usa, así que la memoria no crece con el número
+    de usuarios.
+
+    Nota: serializa dentro de un mismo proceso. Con varios workers, el balanceador
+    debe enrutar por número (sticky) para mantener el orden entre procesos.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, _KeyEntry] = {}
+        self.max_depth_seen = 0
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _KeyEntry()
+        entry.depth += 1
+        self.max_depth_seen = max(self.max_depth_seen, entry.depth)
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.depth -= 1
+            if entry.depth == 0:
+                del self._entries[key]
+
+    def depth(self, key: str) -> int:
+        entry = self._entries.get(key)
+        return entry.depth if entry else 0
+
+    def depths(self) -> dict[str, int]:
+        """Profundidad de la cola por clave (solo claves activas)."""
+        return {key: entry.depth for key, entry in self._entries.items()}
+
+    def stats(self) -> dict:
+        depths = [entry.depth for entry in self._entries.values()]
+        return {
+            "active_keys": len(depths),
+            "queued": sum(d - 1 for d in depths),
+            "max_depth": max(depths, default=0),
+            "max_depth_seen": self.max_depth_seen,
+        }
+
+
+class KeyedMailbox:
+    """
+    Cola FIFO por clave (número de WhatsApp) con a lo más un mensaje en vuelo.
+
+    El primer mensaje de una clave inactiva se despacha de inmediato; los que
+    llegan mientras ese está en cola o corriendo esperan aquí, y `next` entrega
+    el siguiente recién cuando el anterior terminó. Así el carril de cada
+    turno se decide con el estado que dejaron todos los turnos anteriores, y
+    un mensaje nunca adelanta a otro del mismo número en otro carril.
+    """
+
+    DISPATCH, QUEUED, FULL = "dispatch", "queued", "full"
+
+    def __init__(self, max_pending: int = 20):
+        self.max_pending = max_pending
+        self._boxes: dict[str, deque] = {}
+        self.max_depth_seen = 0
+        self.overflow = 0
+
+    def offer(self, key: str, item) -> str:
+        box = self._boxes.get(key)
+        if box is None:
+            self._boxes[key] = deque()
+            return self.DISPATCH
+        if len(box) >= self.max_pending:
+            self.overflow += 1
+            return self.FULL
+        box.append(item)
+        self.max_depth_seen = max(self.max_depth_seen, len(box))
+        return self.QUEUED
+
+    def next(self, key: str):
+        """Siguiente mensaje de la clave, o None (y la clave queda inactiva)."""
+        box = self._boxes.get(key)
+        if box:
+            return box.popleft()
+        self._boxes.pop(key, None)
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "active_keys": len(self._boxes),
+            "waiting": sum(len(box) for box in self._boxes.values()),
+            "max_depth_seen": self.max_depth_seen,
+            "overflow": self.overflow,
+        }
@@ -0,0 +1,138 @@
+# app/core/context_packer.py
+import re
+from app.core.local_index import tokenize
+
+_encoding = None
+
+# Palabras vacías (ya sin tildes, como las deja `tokenize`): no cuentan para
+# decidir si una oración responde la pregunta
+STOPWORDS = {
+    "de", "la", "el", "los", "las", "un", "una", "unos", "unas", "es", "son", "en", "por",
+    "para", "con", "sin", "que", "se", "su", "sus", "al", "del", "lo", "le", "les", "me",
+    "mi", "te", "tu", "si", "no", "como", "cual", "cuando", "hay", "tengo", "puedo",
+    "debo", "sobre", "muy", "mas", "pero", "este", "esta",
+}
+
+
+def load_tokenizer():
+    """
+    Carga el tokenizer de GPT-4o (tiktoken). Puede descargar el archivo BPE,
+    así que se llama desde el calentamiento en un hilo, nunca en el event loop.
+    """
+    global _encoding
+    if _encoding is not None:
+        return
+    try:
+        import tiktoken
+        _encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"⚠️ tiktoken no disponible ({e}): se estiman los tokens.")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Tokens según el tokenizer de GPT-4o. Mientras no esté cargado (o si
+    tiktoken no está disponible) se aproxima con ~4 caracteres por token.
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def truncate_tokens(text: str, limit: int) -> str:
+    """Primeros `limit` tokens de `text` (cortando en un espacio si se estiman)."""
+    if limit <= 0:
+        return ""
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text)[:limit]).rstrip()
+    cut = text[: limit * 4]
+    if len(cut) < len(text) and " " in cut:
+        cut = cut[: cut.rfind(" ")]
+    return cut.rstrip()
+
+
+def split_sentences(text: str) -> list[str]:
+    parts = re.split(r"(?<=[.!?;])\s+|\n{2,}", text)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def trim_to_question(content: str, question_terms: set[str], max_sentences: int = 6) -> str:
+    """
+    Deja solo las oraciones que comparten términos con la pregunta (en su
+    orden original). Si ninguna coincide, se queda con las primeras.
+    """
+    sentences = list(dict.fromkeys(split_sentences(content)))  # sin oraciones repetidas
+    matching = [s for s in sentences if question_terms & set(tokenize(s))]
+    return " ".join((matching or sentences)[:max_sentences])
+
+
+def pack_context(
+    question: str,
+    passages: list[dict],
+    budget: int,
+    dedup_threshold: float = 0.8,
+) -> str:
+    """
+    Arma el CONTEXTO CLÍNICO dentro de `budget` tokens:
+
+    1. Ordena los fragmentos por `score` (mayor primero).
+    2. Descarta los casi duplicados (Jaccard de palabras >= `dedup_threshold`).
+    3. Recorta cada fragmento a las oraciones relacionadas con la pregunta.
+    4. Agrega fragmentos hasta llenar el presupuesto; el último que no cabe
+       se recorta oración por oración. Si ni la primera oración del contexto
+       cabe, se trunca en vez de devolver un contexto vacío.
+    """
+    question_terms = set(tokenize(question)) - STOPWORDS
+    kept_terms: list[set] = []
+    parts = []
+    used = 0
+
+    for passage in sorted(passages, key=lambda p: p.get("score") or 0.0, reverse=True):
+        terms = set(tokenize(passage["content"]))
+        if any(_jaccard(terms, other) >= dedup_threshold for other in kept_terms):
+            continue
+
+        header = f"--- Fuente: {passage['source']} ---\n"
+        body = trim_to_question(passage["content"], question_terms)
+        cost = count_tokens(header + body)
+        if used + cost > budget:
+            # Recortar oración por oración lo que quede de presupuesto
+            remaining = budget - used - count_tokens(header)
+            fitted = []
+            for sentence in split_sentences(body):
+                sentence_cost = count_tokens(sentence) + 1
+                if sentence_cost > remaining:
+                    break
+                fitted.append(sentence)
+                remaining -= sentence_cost
+            if not fitted and not parts:
+                sentences = split_sentences(body)
+                truncated = truncate_tokens(sentences[0], remaining - 1) if sentences else ""
+                if truncated:
+                    fitted.append(truncated + "…")
+            if fitted:
+                parts.append(header + " ".join(fitted) + "\n")
+            break
+
+        parts.append(header + body + "\n")
+        kept_terms.append(terms)
+        used += cost
+
+    return "\n".join(parts)
+
+
+def pack_history(history: list[str], budget: int, max_lines: int = 4) -> str:
+    """Últimas `max_lines` líneas del historial, las más recientes primero en entrar al presupuesto."""
+    selected = []
+    used = 0
+    for line in reversed(history[-max_lines:]):
+        cost = count_tokens(line)
+        if used + cost > budget:
+            break
+        selected.append(line)
+        used += cost
+    return "\n".join(reversed(selected))
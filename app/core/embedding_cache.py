@@ -0,0 +1,118 @@
+# app/core/embedding_cache.py
+import asyncio
+import re
+import sqlite3
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Awaitable, Callable
+from app.config import settings
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normaliza la pregunta para que variantes triviales compartan embedding:
+    "  Dolor de  Cabeza?" y "dolor de cabeza" → "dolor de cabeza".
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" ¿?¡!.,;:")
+
+
+class EmbeddingCache:
+    """
+    Caché de embeddings de consultas.
+
+    - Nivel 1: LRU en memoria acotado a `max_entries` (vectores float32 compactos).
+    - Nivel 2 (opcional): SQLite en `disk_path`, sobrevive reinicios. Se abre
+      en el primer uso (o en el calentamiento), no al construir.
+    - Lleva estadísticas de aciertos para medir el hit-rate.
+    """
+
+    def __init__(self, max_entries: int = 2048, disk_path: str | None = None):
+        self.max_entries = max_entries
+        self._mem: OrderedDict[str, array] = OrderedDict()
+        self.disk_path = disk_path
+        self._conn: sqlite3.Connection | None = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, vector: array):
+        self._mem[key] = vector
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.disk_path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    async def warm_up(self):
+        if self.disk_path:
+            await asyncio.to_thread(self._get_conn)
+
+    def _disk_get(self, key: str) -> array | None:
+        row = self._get_conn().execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        vector = array("f")
+        vector.frombytes(row[0])
+        return vector
+
+    def _disk_put(self, key: str, vector: array):
+        self._get_conn().execute(
+            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", (key, vector.tobytes())
+        )
+
+    async def aembed(self, text: str, embed_fn: Callable[[str], Awaitable[list[float]]]) -> list[float]:
+        """Devuelve el embedding de `text`, llamando a `embed_fn` solo si no está en caché."""
+        key = normalize_query(text)
+
+        vector = self._mem.get(key)
+        if vector is not None:
+            self._mem.move_to_end(key)
+            self.hits += 1
+            return vector.tolist()
+
+        if self.disk_path:
+            vector = await asyncio.to_thread(self._disk_get, key)
+            if vector is not None:
+                self.disk_hits += 1
+                self._remember(key, vector)
+                return vector.tolist()
+
+        self.misses += 1
+        result = await embed_fn(key)
+        vector = array("f", result)
+        self._remember(key, vector)
+        if self.disk_path:
+            await asyncio.to_thread(self._disk_put, key, vector)
+        return result
+
+    def stats(self) -> dict:
+        total = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._mem),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / total if total else 0.0,
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+embedding_cache = EmbeddingCache(
+    max_entries=settings.EMBEDDING_CACHE_SIZE,
+    disk_path=settings.EMBEDDING_CACHE_PATH or None,
+)
@@ -0,0 +1,55 @@
+# app/core/history.py
+from langchain_core.messages import HumanMessage, SystemMessage
+from app.agents.prompts import HISTORY_SUMMARY_SYSTEM_PROMPT, HISTORY_SUMMARY_USER_PROMPT
+from app.core.llm import get_llm
+from app.core.usage import usage_tracker
+
+
+def append_turn(state: dict, user_msg: str, ai_msg: str, max_lines: int, buffer_limit: int) -> dict:
+    """
+    Agrega el turno al historial como ring buffer de `max_lines` líneas.
+
+    Las líneas que salen del buffer pasan a `summary_buffer` (también acotado
+    a `buffer_limit`) para que el resumen rodante las incorpore después,
+    fuera del camino crítico. Así el tamaño del estado por sesión es constante.
+
+    `summary_seq` cuenta las líneas que entraron alguna vez a `summary_buffer`:
+    permite saber cuáles ya se resumieron aunque el tope haya descartado las
+    más antiguas (ver `drop_summarized`).
+    """
+    history = (state.get("history") or []) + [f"User: {user_msg}", f"AI: {ai_msg}"]
+    evicted = history[:-max_lines] if len(history) > max_lines else []
+    if buffer_limit <= 0:
+        return {**state, "history": history[-max_lines:], "summary_buffer": []}
+    pending = ((state.get("summary_buffer") or []) + evicted)[-buffer_limit:]
+    return {
+        **state,
+        "history": history[-max_lines:],
+        "summary_buffer": pending,
+        "summary_seq": (state.get("summary_seq") or 0) + len(evicted),
+    }
+
+
+def drop_summarized(state: dict, summarized_seq: int) -> list[str]:
+    """
+    Líneas de `summary_buffer` que llegaron después de `summarized_seq` (el
+    `summary_seq` del estado que se resumió): las anteriores ya están en el resumen.
+    """
+    buffer = state.get("summary_buffer") or []
+    newer = (state.get("summary_seq") or 0) - summarized_seq
+    if newer <= 0:
+        return []
+    return buffer[-newer:]
+
+
+async def summarize(previous: str, lines: list[str]) -> str:
+    """Actualiza el resumen rodante con las líneas que salieron del historial."""
+    resp = await get_llm().ainvoke([
+        SystemMessage(content=HISTORY_SUMMARY_SYSTEM_PROMPT),
+        HumanMessage(content=HISTORY_SUMMARY_USER_PROMPT.format(
+            summary=previous or "(sin resumen)",
+            lines="\n".join(lines),
+        )),
+    ])
+    usage_tracker.record("summary", resp)
+    return resp.content.strip()
@@ -0,0 +1,193 @@
+# app/core/idempotency.py
+import asyncio
+import sqlite3
+from abc import ABC, abstractmethod
+import time
+from collections import OrderedDict
+from app.config import settings
+
+
+# ==========================================================
+# INTERFAZ
+# ==========================================================
+
+class MessageDeduplicator(ABC):
+    """
+    Registro de los MessageSid de Twilio ya recibidos. Twilio reintenta el
+    webhook si tarda en responder (y la ruta está montada dos veces): sin
+    esto un reintento ejecuta el grafo de nuevo y puede duplicar la respuesta
+    o el caso médico.
+    """
+
+    @abstractmethod
+    async def claim(self, message_sid: str) -> bool:
+        """Marca el mensaje como recibido. Devuelve False si ya lo estaba."""
+
+    @abstractmethod
+    async def release(self, message_sid: str):
+        """Olvida el mensaje: falló antes de aceptarlo y el reintento de Twilio debe procesarse."""
+
+    async def warm_up(self):
+        """Abre la conexión con el backend antes del primer mensaje (importar no la abre)."""
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+
+# ==========================================================
+# BACKEND EN MEMORIA (acotado + TTL)
+# ==========================================================
+
+class MemoryMessageDeduplicator(MessageDeduplicator):
+    """Solo sirve para un worker. Acotado a `max_entries` (se descartan los más antiguos)."""
+
+    def __init__(self, max_entries: int = 50000, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._seen: OrderedDict = OrderedDict()
+        self.duplicates = 0
+
+    async def claim(self, message_sid: str) -> bool:
+        now = time.monotonic()
+        # Las entradas se insertan en orden: las vencidas están al principio
+        while self._seen and next(iter(self._seen.values())) < now:
+            self._seen.popitem(last=False)
+        if message_sid in self._seen:
+            self.duplicates += 1
+            return False
+        self._seen[message_sid] = now + self.ttl
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+        return True
+
+    async def release(self, message_sid: str):
+        self._seen.pop(message_sid, None)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "size": len(self._seen), "duplicates": self.duplicates}
+
+
+# ==========================================================
+# BACKEND COMPARTIDO: SQLITE (varios workers en la misma máquina)
+# ==========================================================
+
+class SQLiteMessageDeduplicator(MessageDeduplicator):
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str, ttl: float = 3600):
+        self.path = path
+        self.ttl = ttl
+        self._claims = 0
+        self.duplicates = 0
+        self._conn: sqlite3.Connection | None = None
+        self._lock = asyncio.Lock()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS webhook_messages ("
+                " sid TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _claim(self, message_sid: str) -> bool:
+        conn = self._get_conn()
+        now = time.time()
+        self._claims += 1
+        if self._claims % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM webhook_messages WHERE expires_at <= ?", (now,))
+        # Un reintento tras el vencimiento reemplaza la fila vieja
+        cur = conn.execute(
+            "INSERT INTO webhook_messages (sid, expires_at) VALUES (?, ?) "
+            "ON CONFLICT(sid) DO UPDATE SET expires_at = excluded.expires_at "
+            "WHERE webhook_messages.expires_at <= ?",
+            (message_sid, now + self.ttl, now),
+        )
+        return cur.rowcount == 1
+
+    def _release(self, message_sid: str):
+        self._get_conn().execute("DELETE FROM webhook_messages WHERE sid = ?", (message_sid,))
+
+    async def warm_up(self):
+        async with self._lock:
+            await asyncio.to_thread(self._get_conn)
+
+    async def claim(self, message_sid: str) -> bool:
+        async with self._lock:
+            claimed = await asyncio.to_thread(self._claim, message_sid)
+        if not claimed:
+            self.duplicates += 1
+        return claimed
+
+    async def release(self, message_sid: str):
+        async with self._lock:
+            await asyncio.to_thread(self._release, message_sid)
+
+    async def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def stats(self) -> dict:
+        return {"backend": "sqlite", "path": self.path, "duplicates": self.duplicates}
+
+
+# ==========================================================
+# BACKEND COMPARTIDO: REDIS (varias máquinas)
+# ==========================================================
+
+class RedisMessageDeduplicator(MessageDeduplicator):
+    def __init__(self, url: str, ttl: float = 3600, prefix: str = "medisense:msg:"):
+        self.url = url
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.duplicates = 0
+        self._redis = None
+
+    def _get_client(self):
+        if self._redis is None:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError as e:
+                raise RuntimeError("WEBHOOK_DEDUP_BACKEND=redis requiere el paquete 'redis'") from e
+            self._redis = aioredis.from_url(self.url)
+        return self._redis
+
+    async def warm_up(self):
+        await self._get_client().ping()
+
+    async def claim(self, message_sid: str) -> bool:
+        # SET NX EX es atómico: solo un worker gana el mensaje
+        claimed = bool(await self._get_client().set(self.prefix + message_sid, b"1", nx=True, ex=self.ttl))
+        if not claimed:
+            self.duplicates += 1
+        return claimed
+
+    async def release(self, message_sid: str):
+        await self._get_client().delete(self.prefix + message_sid)
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "duplicates": self.duplicates}
+
+
+def build_message_deduplicator() -> MessageDeduplicator:
+    backend = settings.WEBHOOK_DEDUP_BACKEND
+    if backend == "sqlite":
+        return SQLiteMessageDeduplicator(settings.SESSION_SQLITE_PATH, ttl=settings.WEBHOOK_DEDUP_TTL)
+    if backend == "redis":
+        return RedisMessageDeduplicator(settings.REDIS_URL, ttl=settings.WEBHOOK_DEDUP_TTL)
+    return MemoryMessageDeduplicator(max_entries=settings.WEBHOOK_DEDUP_MAX_ENTRIES, ttl=settings.WEBHOOK_DEDUP_TTL)
+
+
+message_dedup = build_message_deduplicator()
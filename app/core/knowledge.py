@@ -1,63 +1,153 @@
 # app/core/knowledge.py
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from azure.search.documents.models import VectorizedQuery
+import asyncio
 from app.config import settings
-from app.core.llm import embeddings_model
+from app.core.llm import embed_query
+from app.core.metrics import observe
+from app.core.embedding_cache import embedding_cache
+from app.core.local_index import LocalVectorIndex
 
 class KnowledgeBase:
+    """
+    El cliente de Azure Search y el índice local se crean en el primer uso
+    (o en `warm_up`), no al importar el módulo. Abrir el índice y buscar en él
+    es trabajo síncrono (disco, numpy): corre en un hilo, fuera del event loop.
+    """
+
     def __init__(self):
-        if settings.SEARCH_ENDPOINT and settings.SEARCH_KEY:
+        self.client = None
+        self.local_index = None
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    def _ensure_loaded(self):
+        """Crea lo que falte; solo queda marcado como cargado si todo salió bien."""
+        if self._loaded:
+            return
+        if self.client is None and settings.SEARCH_ENDPOINT and settings.SEARCH_KEY:
+            from azure.core.credentials import AzureKeyCredential
+            from azure.search.documents.aio import SearchClient
+
             self.client = SearchClient(
                 endpoint=settings.SEARCH_ENDPOINT,
                 index_name=settings.SEARCH_INDEX,
                 credential=AzureKeyCredential(settings.SEARCH_KEY)
             )
-        else:
-            self.client = None
+        elif self.client is None:
             print("⚠️ Azure Search no configurado.")
 
-    def search(self, query: str, top: int = 3) -> str:
+        # Índice local en proceso (opcional): backend rápido o de respaldo
+        self.local_index = LocalVectorIndex.open(
+            settings.LOCAL_INDEX_PATH, use_hnsw=settings.LOCAL_INDEX_HNSW
+        )
+        self._loaded = True
+
+    async def _load(self):
+        """`_ensure_loaded` en un hilo; las búsquedas concurrentes en frío esperan una sola carga."""
+        if self._loaded:
+            return
+        async with self._load_lock:
+            await asyncio.to_thread(self._ensure_loaded)
+
+    async def warm_up(self):
+        """Carga el índice local (en un hilo) y abre la conexión con Azure Search."""
+        await self._load()
+        if self.client:
+            await self.client.get_document_count()
+
+    async def close(self):
+        """Cierra el transporte asíncrono de Azure Search (apagado de la app)."""
+        if self.client:
+            await self.client.close()
+
+    async def search(self, query: str, top: int = 3) -> str:
         """
         Busca en los documentos que tu Azure Function ya indexó.
+        Es asíncrono para no bloquear el event loop mientras esperamos a Azure.
         """
-        if not self.client:
+        passages = await self.search_passages(query, top)
+        if passages is None:
             return ""
 
-        try:
-            # 1. Vectorizar la pregunta del usuario
-            query_vector = embeddings_model.embed_query(query)
-            
-            # 2. Configurar búsqueda vectorial
-            # IMPORTANTE: Revisa en tu índice cómo se llama el campo vectorial.
-            # Por defecto suele ser 'contentVector', 'vector' o 'embedding'.
-            # Aquí asumo 'contentVector'. Ajusta si es necesario.
-            vector_query = VectorizedQuery(
-                vector=query_vector, 
-                k_nearest_neighbors=top, 
-                fields="content_vector" 
-            )
+        # Formatear
+        context_parts = [f"--- Fuente: {p['source']} ---\n{p['content']}\n" for p in passages]
+        return "\n".join(context_parts) if context_parts else "No se encontró información específica en los protocolos."
 
-            # 3. Ejecutar búsqueda Híbrida (Texto + Vector)
-            results = self.client.search(
-                search_text=query,
-                vector_queries=[vector_query],
-                top=top,
-                select=["content", "source", "title"] # Ajusta a los campos que tenga tu índice
-            )
-            
-            # 4. Formatear
-            context_parts = []
-            for r in results:
-                # Fallbacks por si tu indice tiene nombres de campos distintos
-                source = r.get("source") or r.get("title") or "Documento Médico"
-                content = r.get("content") or ""
-                context_parts.append(f"--- Fuente: {source} ---\n{content}\n")
-            
-            return "\n".join(context_parts) if context_parts else "No se encontró información específica en los protocolos."
+    async def search_passages(self, query: str, top: int = 3) -> list[dict] | None:
+        """
+        Devuelve los fragmentos como dicts {source, content, score}, o None si
+        no hay ningún backend disponible.
 
+        RETRIEVAL_BACKEND:
+        - "azure": solo Azure AI Search.
+        - "local": solo el índice local.
+        - "auto":  Azure si está configurado; el índice local si Azure no está
+                   configurado o falla.
+        """
+        try:
+            await self._load()
         except Exception as e:
-            print(f"❌ Error buscando en Azure Search: {e}")
-            return ""
+            # Se reintenta en la próxima búsqueda; mientras tanto se usa lo que sí cargó
+            print(f"❌ Error cargando los backends de búsqueda: {e}")
+        backend = settings.RETRIEVAL_BACKEND
+        use_azure = self.client is not None and backend in ("azure", "auto")
+        use_local = self.local_index is not None and backend in ("local", "auto")
+        if not use_azure and not use_local:
+            return None
+
+        try:
+            # 1. Vectorizar la pregunta del usuario (con caché: preguntas repetidas
+            #    no vuelven a llamar a Azure)
+            query_vector = await embedding_cache.aembed(query, embed_query)
+        except Exception as e:
+            print(f"❌ Error vectorizando la consulta: {e}")
+            if not use_local:
+                return None
+            # Sin embeddings (p. ej. sin red) el índice local aún responde con BM25
+            query_vector = None
+        else:
+            if use_azure:
+                try:
+                    with observe("search", "azure"):
+                        return await self._search_azure(query, query_vector, top)
+                except Exception as e:
+                    print(f"❌ Error buscando en Azure Search: {e}")
+                    if not use_local:
+                        return None
+                    print("↪️ Usando índice local como respaldo.")
+
+        with observe("search", "local"):
+            return await asyncio.to_thread(self.local_index.search, query, query_vector, top=top)
+
+
+    async def _search_azure(self, query: str, query_vector: list[float], top: int) -> list[dict]:
+        from azure.search.documents.models import VectorizedQuery
+
+        # 2. Configurar búsqueda vectorial
+        # IMPORTANTE: Revisa en tu índice cómo se llama el campo vectorial.
+        # Por defecto suele ser 'contentVector', 'vector' o 'embedding'.
+        # Aquí asumo 'contentVector'. Ajusta si es necesario.
+        vector_query = VectorizedQuery(
+            vector=query_vector,
+            k_nearest_neighbors=top,
+            fields="content_vector"
+        )
+
+        # 3. Ejecutar búsqueda Híbrida (Texto + Vector)
+        results = await self.client.search(
+            search_text=query,
+            vector_queries=[vector_query],
+            top=top,
+            select=["content", "source", "title"] # Ajusta a los campos que tenga tu índice
+        )
+
+        passages = []
+        async for r in results:
+            # Fallbacks por si tu indice tiene nombres de campos distintos
+            passages.append({
+                "source": r.get("source") or r.get("title") or "Documento Médico",
+                "content": r.get("content") or "",
+                "score": r.get("@search.score") or 0.0,
+            })
+        return passages
 
 knowledge_base = KnowledgeBase()
\ No newline at end of file
@@ -1,21 +1,117 @@
 # app/core/llm.py
-from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
+import importlib
+import time
+from langchain_core.callbacks import BaseCallbackHandler
 from app.config import settings
+from app.core.metrics import EXTERNAL_SECONDS, EXTERNAL_ERRORS, observe
 
-# 1. Modelo de Chat (GPT-4o)
-llm = AzureChatOpenAI(
-    azure_deployment=settings.AZURE_DEPLOYMENT,
-    openai_api_version=settings.AZURE_API_VERSION,
-    azure_endpoint=settings.AZURE_ENDPOINT,
-    api_key=settings.AZURE_API_KEY,
-    temperature=0.3 # Bajo para precisión médica
-)
-
-# 2. Modelo de Embeddings (Ada-002)
-# Usado para vectorizar la pregunta del usuario antes de buscar en Azure Search
-embeddings_model = AzureOpenAIEmbeddings(
-    azure_deployment=settings.AZURE_EMBEDDING_DEPLOYMENT,
-    openai_api_version=settings.AZURE_API_VERSION,
-    azure_endpoint=settings.AZURE_ENDPOINT,
-    api_key=settings.AZURE_API_KEY,
-)
\ No newline at end of file
+
+class LatencyCallback(BaseCallbackHandler):
+    """Registra la latencia y los errores de cada llamada al modelo de chat."""
+
+    run_inline = True  # sin executor: solo actualiza contadores en memoria
+
+    def __init__(self):
+        self._started: dict = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._started.pop(run_id, None)
+        if start is not None:
+            EXTERNAL_SECONDS.observe(time.perf_counter() - start, service="azure_openai", operation="chat")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+        EXTERNAL_ERRORS.inc(service="azure_openai", operation="chat")
+
+
+def build_azure_models():
+    # langchain_openai (y el SDK de openai) es la importación más pesada de la
+    # app: se hace aquí para no pagarla al importar el módulo
+    from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
+
+    # 1. Modelo de Chat (GPT-4o)
+    chat = AzureChatOpenAI(
+        azure_deployment=settings.AZURE_DEPLOYMENT,
+        openai_api_version=settings.AZURE_API_VERSION,
+        azure_endpoint=settings.AZURE_ENDPOINT,
+        api_key=settings.AZURE_API_KEY,
+        temperature=0.3, # Bajo para precisión médica
+        stream_usage=True, # Conteo de tokens también en modo streaming
+    )
+
+    # 2. Modelo de Embeddings (Ada-002)
+    # Usado para vectorizar la pregunta del usuario antes de buscar en Azure Search
+    embeddings = AzureOpenAIEmbeddings(
+        azure_deployment=settings.AZURE_EMBEDDING_DEPLOYMENT,
+        openai_api_version=settings.AZURE_API_VERSION,
+        azure_endpoint=settings.AZURE_ENDPOINT,
+        api_key=settings.AZURE_API_KEY,
+    )
+    return chat, embeddings
+
+
+def _build_source(provider: str):
+    if provider == "azure":
+        return build_azure_models()
+    module_name, _, attr = provider.partition(":")
+    factory = getattr(importlib.import_module(module_name), attr or "build_models")
+    print(f"🧪 Modelos provistos por {provider}")
+    return factory()
+
+
+def build_models():
+    """
+    Construye (modelo de chat, modelo de embeddings) según MODEL_PROVIDER:
+    - "azure": Azure OpenAI (producción).
+    - "record": los modelos de MODEL_RECORD_SOURCE, grabando cada llamada
+      en MODEL_STORE_PATH.
+    - "replay": respuestas grabadas, sin red (ver app/core/model_replay.py).
+    - "modulo:funcion": una fábrica que devuelve la misma tupla; permite
+      correr el grafo con modelos falsos (p. ej. "bench.fakes:build_models").
+    """
+    provider = settings.MODEL_PROVIDER
+    if provider == "record":
+        from app.core.model_replay import build_recording_models
+        chat, embeddings = build_recording_models(
+            *_build_source(settings.MODEL_RECORD_SOURCE), settings.MODEL_STORE_PATH
+        )
+        print(f"⏺️ Grabando llamadas a modelos en {settings.MODEL_STORE_PATH}")
+    elif provider == "replay":
+        from app.core.model_replay import build_replay_models
+        chat, embeddings = build_replay_models(
+            settings.MODEL_STORE_PATH, settings.MODEL_REPLAY_LATENCY, settings.MODEL_REPLAY_SEED
+        )
+        print(f"⏯️ Reproduciendo modelos desde {settings.MODEL_STORE_PATH}")
+    else:
+        chat, embeddings = _build_source(provider)
+    chat.callbacks = [LatencyCallback()]
+    return chat, embeddings
+
+
+# Los modelos se construyen en el primer uso (o en el warm-up del lifespan),
+# no al importar: el arranque del proceso queda rápido y sin efectos.
+_models = None
+
+
+def get_models():
+    global _models
+    if _models is None:
+        _models = build_models()
+    return _models
+
+
+def get_llm():
+    return get_models()[0]
+
+
+def get_embeddings_model():
+    return get_models()[1]
+
+
+async def embed_query(text: str) -> list[float]:
+    """Embedding de una consulta con su latencia registrada en /metrics."""
+    with observe("azure_openai", "embedding"):
+        return await get_embeddings_model().aembed_query(text)
@@ -0,0 +1,247 @@
+# app/core/local_index.py
+"""
+Índice vectorial local (en proceso) para recuperar fragmentos sin salir a red.
+
+Formato en disco (directorio LOCAL_INDEX_PATH):
+    meta.json      → {"dim": 1536, "dtype": "float32" | "int8", "count": N}
+    vectors.bin    → matriz N x dim (float32, o int8 cuantizado)
+    scales.bin     → N float32 (solo int8: escala por fila)
+    chunks.jsonl   → una línea por fila: {"id", "content", "source"}
+
+Los vectores se abren con np.memmap: el SO pagina solo lo que se usa y
+varios workers comparten las mismas páginas. La búsqueda combina similitud
+coseno (fuerza bruta NumPy, o HNSW si `hnswlib` está instalado) con BM25
+sobre el texto, fusionando ambos rankings con Reciprocal Rank Fusion.
+"""
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+import numpy as np
+
+# Constante estándar de Reciprocal Rank Fusion
+RRF_K = 60
+
+
+def tokenize(text: str) -> list[str]:
+    """Minúsculas, sin tildes, solo palabras de 2+ caracteres."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in re.findall(r"\w+", text) if len(t) > 1]
+
+
+# ==========================================================
+# ESCRITURA (usada por docs/scripts/ingest.py)
+# ==========================================================
+
+class LocalIndexWriter:
+    """
+    Escribe el índice de forma incremental (fila a fila), sin acumular la
+    matriz completa en memoria. `close()` deja el meta.json consistente.
+    """
+
+    def __init__(self, path: str, dtype: str = "float32"):
+        if dtype not in ("float32", "int8"):
+            raise ValueError(f"dtype no soportado: {dtype}")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dtype = dtype
+        self.dim = None
+        self.count = 0
+        self._vectors = open(os.path.join(path, "vectors.bin"), "wb")
+        self._scales = open(os.path.join(path, "scales.bin"), "wb") if dtype == "int8" else None
+        self._chunks = open(os.path.join(path, "chunks.jsonl"), "w", encoding="utf-8")
+
+    def add(self, doc_id: str, content: str, source: str, vector):
+        v = np.asarray(vector, dtype=np.float32)
+        if self.dim is None:
+            self.dim = v.shape[0]
+        elif v.shape[0] != self.dim:
+            raise ValueError(f"Dimensión {v.shape[0]} distinta de {self.dim}")
+
+        norm = np.linalg.norm(v)
+        if norm:
+            v = v / norm
+        if self.dtype == "int8":
+            scale = float(np.abs(v).max()) / 127 or 1.0
+            self._vectors.write(np.round(v / scale).astype(np.int8).tobytes())
+            self._scales.write(np.float32(scale).tobytes())
+        else:
+            self._vectors.write(v.tobytes())
+
+        self._chunks.write(json.dumps({"id": doc_id, "content": content, "source": source}, ensure_ascii=False))
+        self._chunks.write("\n")
+        self.count += 1
+
+    def close(self):
+        self._vectors.close()
+        self._chunks.close()
+        if self._scales:
+            self._scales.close()
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump({"dim": self.dim or 0, "dtype": self.dtype, "count": self.count}, f)
+
+
+# ==========================================================
+# LECTURA / BÚSQUEDA
+# ==========================================================
+
+class LocalVectorIndex:
+    def __init__(self, path: str, use_hnsw: bool = False):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.path = path
+        self.dim = meta["dim"]
+        self.count = meta["count"]
+        self.dtype = meta["dtype"]
+
+        shape = (self.count, self.dim)
+        self.scales = None
+        if self.count == 0:
+            # Una ingesta sin fragmentos deja archivos vacíos y mmap no los acepta
+            self.vectors = np.zeros(shape, dtype=self.dtype)
+            if self.dtype == "int8":
+                self.scales = np.zeros(0, dtype=np.float32)
+        else:
+            self.vectors = np.memmap(os.path.join(path, "vectors.bin"), dtype=self.dtype, mode="r", shape=shape)
+            if self.dtype == "int8":
+                self.scales = np.memmap(os.path.join(path, "scales.bin"), dtype=np.float32, mode="r", shape=(self.count,))
+
+        self.chunks = []
+        with open(os.path.join(path, "chunks.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                self.chunks.append(json.loads(line))
+
+        self._build_bm25()
+        self._hnsw = self._build_hnsw() if use_hnsw else None
+
+    @classmethod
+    def open(cls, path: str | None, use_hnsw: bool = False) -> "LocalVectorIndex | None":
+        """Abre el índice si existe; si no, devuelve None (backend local desactivado)."""
+        if not path or not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+        index = cls(path, use_hnsw=use_hnsw)
+        print(f"📚 Índice local cargado: {index.count} fragmentos ({index.dtype}) desde {path}")
+        return index
+
+    @staticmethod
+    def read_rows(path: str):
+        """
+        Itera (chunk, vector float32) de un índice existente sin construir BM25 ni
+        HNSW. Lo usa la ingesta incremental para conservar filas sin re-embeber.
+        """
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if not meta["count"]:
+            return
+        shape = (meta["count"], meta["dim"])
+        vectors = np.memmap(os.path.join(path, "vectors.bin"), dtype=meta["dtype"], mode="r", shape=shape)
+        scales = None
+        if meta["dtype"] == "int8":
+            scales = np.memmap(os.path.join(path, "scales.bin"), dtype=np.float32, mode="r", shape=(meta["count"],))
+        with open(os.path.join(path, "chunks.jsonl"), encoding="utf-8") as f:
+            for row, line in enumerate(f):
+                vector = vectors[row].astype(np.float32)
+                if scales is not None:
+                    vector *= scales[row]
+                yield json.loads(line), vector
+
+    # ---------- BM25 ----------
+
+    def _build_bm25(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Índice invertido para BM25. Por término se guardan (doc_ids, pesos) como
+        arrays NumPy con la parte de BM25 que no depende de la consulta ya
+        calculada, así una búsqueda es solo idf * pesos sumados por documento.
+        """
+        postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        doc_len = np.zeros(self.count, dtype=np.float32)
+        for doc_id, chunk in enumerate(self.chunks):
+            tokens = tokenize(chunk["content"])
+            doc_len[doc_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings[term].append((doc_id, tf))
+        avg_len = float(doc_len.mean()) if self.count else 0.0
+
+        self._postings: dict[str, tuple[np.ndarray, np.ndarray, float]] = {}
+        for term, entries in postings.items():
+            ids = np.fromiter((d for d, _ in entries), dtype=np.int32, count=len(entries))
+            tf = np.fromiter((t for _, t in entries), dtype=np.float32, count=len(entries))
+            weights = tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len[ids] / avg_len))
+            idf = math.log(1 + (self.count - len(entries) + 0.5) / (len(entries) + 0.5))
+            self._postings[term] = (ids, weights, idf)
+
+    def _bm25_scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            entry = self._postings.get(term)
+            if entry is not None:
+                ids, weights, idf = entry
+                scores[ids] += idf * weights
+        return scores
+
+    # ---------- Vectores ----------
+
+    def _build_hnsw(self):
+        try:
+            import hnswlib
+        except ImportError:
+            print("⚠️ hnswlib no está instalado: se usa búsqueda por fuerza bruta.")
+            return None
+        index = hnswlib.Index(space="ip", dim=self.dim)
+        index.init_index(max_elements=max(self.count, 1), ef_construction=200, M=16)
+        if self.count:
+            index.add_items(self._dense(), np.arange(self.count))
+        index.set_ef(64)
+        return index
+
+    def _dense(self) -> np.ndarray:
+        if self.scales is not None:
+            return self.vectors.astype(np.float32) * self.scales[:, None]
+        return np.asarray(self.vectors)
+
+    def _vector_topk(self, query_vector, k: int) -> list[int]:
+        q = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+        if self._hnsw is not None:
+            labels, _ = self._hnsw.knn_query(q, k=min(k, self.count))
+            return [int(i) for i in labels[0]]
+        if self.scales is not None:
+            sims = (self.vectors @ q) * self.scales
+        else:
+            sims = self.vectors @ q
+        k = min(k, self.count)
+        top = np.argpartition(-sims, k - 1)[:k]
+        return [int(i) for i in top[np.argsort(-sims[top])]]
+
+    # ---------- Híbrido ----------
+
+    def search(self, query: str, query_vector, top: int = 3, candidates: int = 20) -> list[dict]:
+        """
+        Búsqueda híbrida: top `candidates` por vector + top `candidates` por BM25,
+        fusionados con RRF. Devuelve los `top` fragmentos con su `score`.
+        Si `query_vector` es None, se usa solo BM25.
+        """
+        if not self.count:
+            return []
+
+        fused: dict[int, float] = defaultdict(float)
+        if query_vector is not None:
+            for rank, doc_id in enumerate(self._vector_topk(query_vector, candidates)):
+                fused[doc_id] += 1 / (RRF_K + rank + 1)
+
+        bm25 = self._bm25_scores(query)
+        hits = np.flatnonzero(bm25)
+        if hits.size:
+            ranked = hits[np.argsort(-bm25[hits])][:candidates]
+            for rank, doc_id in enumerate(ranked):
+                fused[int(doc_id)] += 1 / (RRF_K + rank + 1)
+
+        best = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top]
+        return [{**self.chunks[doc_id], "score": score} for doc_id, score in best]
@@ -0,0 +1,121 @@
+# app/core/log_queue.py
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable
+
+
+def _conversation_key(payload: dict):
+    """DNI del registro (los de wellness lo traen dentro de `patient`)."""
+    patient = payload.get("patient") or {}
+    return payload.get("dni") or patient.get("dni") or patient.get("document_number")
+
+
+class LogQueue:
+    """
+    Cola en memoria para los logs hacia el backend de negocio
+    (/conversations/log, /wellness/log).
+
+    - `enqueue` no hace I/O: guarda el registro y retorna al instante.
+    - Un task de fondo vacía la cola en lotes cuando se llega a `batch_size`
+      registros o cada `flush_interval` segundos (lo que ocurra primero).
+    - La memoria está acotada a `max_size`: si se llena, se descarta el
+      registro más antiguo y se cuenta en `overflow`.
+    - Los registros que el backend no acepta se cuentan en `dropped`.
+    """
+
+    def __init__(
+        self,
+        sender: Callable[[str, dict], Awaitable],
+        max_size: int = 1000,
+        batch_size: int = 20,
+        flush_interval: float = 2.0,
+    ):
+        self._sender = sender
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._records: deque = deque()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.overflow = 0
+
+    def enqueue(self, endpoint: str, payload: dict):
+        if len(self._records) >= self.max_size:
+            self._records.popleft()
+            self.overflow += 1
+        self._records.append((endpoint, payload))
+        self.enqueued += 1
+        if self._wakeup is not None and len(self._records) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self):
+        """Arranca el task de vaciado (debe llamarse con el event loop corriendo)."""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Detiene el task de fondo y envía todo lo pendiente (apagado de la app)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+        while self._records:
+            await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._records:
+                await self.flush()
+                if len(self._records) < self.batch_size:
+                    break
+
+    async def flush(self):
+        """
+        Envía un lote (hasta `batch_size` registros) sobre el pool HTTP: en
+        paralelo entre conversaciones, pero en orden dentro de cada una (el
+        mensaje del usuario antes que la respuesta de la IA).
+        """
+        batch = []
+        while self._records and len(batch) < self.batch_size:
+            batch.append(self._records.popleft())
+        if not batch:
+            return
+
+        groups: dict[tuple, list] = {}
+        for endpoint, payload in batch:
+            groups.setdefault((endpoint, _conversation_key(payload)), []).append(payload)
+
+        await asyncio.gather(*(self._send_in_order(endpoint, payloads) for (endpoint, _), payloads in groups.items()))
+
+    async def _send_in_order(self, endpoint: str, payloads: list[dict]):
+        for payload in payloads:
+            try:
+                res = await self._sender(endpoint, payload)
+            except Exception:
+                res = None
+            if res is None or res.status_code >= 400:
+                self.dropped += 1
+            else:
+                self.sent += 1
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._records),
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "overflow": self.overflow,
+        }
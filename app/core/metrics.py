@@ -0,0 +1,190 @@
+# app/core/metrics.py
+import bisect
+import functools
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+# Buckets de latencia (segundos): de llamadas locales a respuestas largas de GPT-4o
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ==========================================================
+# TIPOS DE MÉTRICA (formato de texto de Prometheus)
+# ==========================================================
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield self.name, _labels(self.labelnames, key), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict[tuple, list] = {}  # key → [conteos por bucket..., suma, total]
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+        idx = bisect.bisect_left(self.buckets, value)
+        if idx < len(self.buckets):
+            entry[idx] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    def samples(self):
+        for key, entry in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                yield f"{self.name}_bucket", _labels(self.labelnames, key, f'le="{_number(bound)}"'), cumulative
+            yield f"{self.name}_bucket", _labels(self.labelnames, key, 'le="+Inf"'), entry[-1]
+            yield f"{self.name}_sum", _labels(self.labelnames, key), entry[-2]
+            yield f"{self.name}_count", _labels(self.labelnames, key), entry[-1]
+
+
+class MetricsRegistry:
+    """
+    Registro mínimo de métricas con salida en formato Prometheus.
+
+    Además de contadores e histogramas, acepta *collectors*: funciones que
+    devuelven los dicts de `stats()` de cada componente (colas, cachés,
+    planificador...). Sus valores numéricos se exponen como gauges, y un
+    nivel de dicts anidados se convierte en la etiqueta `key`.
+    """
+
+    def __init__(self, prefix: str = "medisense"):
+        self.prefix = prefix
+        self._metrics: list = []
+        self._collectors: dict[str, Callable[[], dict]] = {}
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(f"{self.prefix}_{name}", help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(f"{self.prefix}_{name}", help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, component: str, fn: Callable[[], dict]):
+        self._collectors[component] = fn
+
+    def _collected(self):
+        for component, fn in self._collectors.items():
+            try:
+                stats = fn()
+            except Exception as e:
+                print(f"⚠️ No se pudieron leer las métricas de {component}: {e}")
+                continue
+            for field, value in stats.items():
+                if isinstance(value, dict):
+                    for sub_field, sub_value in value.items():
+                        if isinstance(sub_value, (int, float)) and not isinstance(sub_value, bool):
+                            yield f"{self.prefix}_{component}_{sub_field}", _labels(("key",), (field,)), sub_value
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    yield f"{self.prefix}_{component}_{field}", "", value
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+
+        # Los campos anidados de un componente intercalan métricas distintas:
+        # se agrupan por nombre para que cada familia quede contigua bajo su # TYPE
+        families: dict[str, list[str]] = {}
+        for name, labels, value in self._collected():
+            families.setdefault(name, []).append(f"{name}{labels} {_number(value)}")
+        for name, samples in families.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# ==========================================================
+# MÉTRICAS DEL CAMINO CRÍTICO
+# ==========================================================
+
+NODE_SECONDS = registry.histogram("node_duration_seconds", "Duración de cada nodo del grafo", ("node",))
+NODE_ERRORS = registry.counter("node_errors_total", "Excepciones por nodo del grafo", ("node",))
+EXTERNAL_SECONDS = registry.histogram(
+    "external_call_duration_seconds", "Latencia de llamadas a servicios externos", ("service", "operation"),
+)
+EXTERNAL_ERRORS = registry.counter(
+    "external_call_errors_total", "Errores de llamadas a servicios externos", ("service", "operation"),
+)
+LLM_TOKENS = registry.counter("llm_tokens_total", "Tokens consumidos por nodo", ("node", "kind"))
+
+
+@contextmanager
+def observe(service: str, operation: str):
+    """Mide una llamada externa; si lanza una excepción, cuenta el error y la propaga."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        EXTERNAL_ERRORS.inc(service=service, operation=operation)
+        raise
+    finally:
+        EXTERNAL_SECONDS.observe(time.perf_counter() - start, service=service, operation=operation)
+
+
+def instrument_node(name: str, fn):
+    """Envuelve un nodo async del grafo con su histograma de latencia y contador de errores."""
+
+    @functools.wraps(fn)
+    async def wrapper(state):
+        start = time.perf_counter()
+        try:
+            return await fn(state)
+        except Exception:
+            NODE_ERRORS.inc(node=name)
+            raise
+        finally:
+            NODE_SECONDS.observe(time.perf_counter() - start, node=name)
+
+    return wrapper
@@ -0,0 +1,264 @@
+# app/core/model_replay.py
+"""
+Grabación y reproducción de llamadas a los modelos (chat y embeddings).
+
+- MODEL_PROVIDER=record: envuelve los modelos reales (MODEL_RECORD_SOURCE) y
+  guarda cada par prompt → respuesta y texto → vector en MODEL_STORE_PATH.
+- MODEL_PROVIDER=replay: responde solo desde ese archivo, sin red y de forma
+  determinista. Un prompt que no fue grabado es un error explícito.
+
+La latencia en replay se controla con MODEL_REPLAY_LATENCY:
+    "none"                      → sin espera
+    "recorded"                  → la latencia medida al grabar
+    "lognormal:<mediana>:<sigma>" → muestreada con semilla MODEL_REPLAY_SEED
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+from typing import Any
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+def message_key(messages) -> str:
+    """Hash estable de la conversación enviada al modelo (tipo + contenido de cada mensaje)."""
+    canonical = json.dumps([[m.type, m.content] for m in messages], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# ==========================================================
+# ALMACÉN (SQLite, respuestas comprimidas y vectores float32)
+# ==========================================================
+
+class ModelStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat (key TEXT PRIMARY KEY, response BLOB NOT NULL, latency REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, latency REAL NOT NULL)"
+        )
+
+    def get_chat(self, key: str) -> tuple[dict, float] | None:
+        with self._lock:
+            row = self._conn.execute("SELECT response, latency FROM chat WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]).decode("utf-8")), row[1]
+
+    def put_chat(self, key: str, response: dict, latency: float):
+        data = zlib.compress(json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO chat (key, response, latency) VALUES (?, ?, ?)", (key, data, latency))
+
+    def get_vector(self, key: str) -> tuple[list[float], float] | None:
+        with self._lock:
+            row = self._conn.execute("SELECT vector, latency FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return array("f", row[0]).tolist(), row[1]
+
+    def put_vector(self, key: str, vector: list[float], latency: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, latency) VALUES (?, ?, ?)",
+                (key, array("f", vector).tobytes(), latency),
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+class LatencyModel:
+    """Decide cuánto esperar antes de devolver una respuesta reproducida."""
+
+    def __init__(self, spec: str = "none", seed: int = 0):
+        self.mode, *params = spec.split(":")
+        self.params = [float(p) for p in params]
+        self._rng = random.Random(seed)
+
+    def delay(self, recorded: float) -> float:
+        if self.mode == "recorded":
+            return recorded
+        if self.mode == "lognormal":
+            median, sigma = self.params
+            return self._rng.lognormvariate(math.log(median), sigma)
+        return 0.0
+
+
+class MissingRecording(KeyError):
+    pass
+
+
+# ==========================================================
+# CHAT
+# ==========================================================
+
+def _to_record(message) -> dict:
+    return {"content": message.content, "usage": dict(message.usage_metadata or {})}
+
+
+class RecordingChatModel(BaseChatModel):
+    """Delega en el modelo real y guarda cada respuesta."""
+
+    inner: Any
+    store: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording-chat"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        start = time.perf_counter()
+        message = self.inner.invoke(messages, stop=stop, **kwargs)
+        self.store.put_chat(message_key(messages), _to_record(message), time.perf_counter() - start)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        start = time.perf_counter()
+        message = await self.inner.ainvoke(messages, stop=stop, **kwargs)
+        self.store.put_chat(message_key(messages), _to_record(message), time.perf_counter() - start)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        start = time.perf_counter()
+        full = None
+        async for chunk in self.inner.astream(messages, stop=stop, **kwargs):
+            full = chunk if full is None else full + chunk
+            if run_manager and chunk.content:
+                await run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+        if full is not None:
+            self.store.put_chat(message_key(messages), _to_record(full), time.perf_counter() - start)
+
+
+class ReplayChatModel(BaseChatModel):
+    """Responde desde el almacén; `ainvoke` y `astream` devuelven el mismo texto."""
+
+    store: Any
+    latency: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay-chat"
+
+    def _lookup(self, messages) -> tuple[dict, float]:
+        key = message_key(messages)
+        found = self.store.get_chat(key)
+        if found is None:
+            raise MissingRecording(f"No hay respuesta grabada para el prompt {key[:12]} (grabar con MODEL_PROVIDER=record)")
+        response, recorded = found
+        return response, self.latency.delay(recorded)
+
+    @staticmethod
+    def _message(response: dict) -> AIMessage:
+        return AIMessage(content=response["content"], usage_metadata=response["usage"] or None)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        response, delay = self._lookup(messages)
+        time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=self._message(response))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        response, delay = self._lookup(messages)
+        await asyncio.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=self._message(response))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        # La espera se reparte entre las palabras para imitar el streaming real
+        response, delay = self._lookup(messages)
+        words = response["content"].split(" ")
+        step = delay / max(1, len(words))
+        for i, word in enumerate(words):
+            text = word if i == len(words) - 1 else word + " "
+            await asyncio.sleep(step)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+        if response["usage"]:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=response["usage"]))
+
+
+# ==========================================================
+# EMBEDDINGS
+# ==========================================================
+
+class RecordingEmbeddings(Embeddings):
+    def __init__(self, inner: Embeddings, store: ModelStore):
+        self.inner = inner
+        self.store = store
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        start = time.perf_counter()
+        vectors = self.inner.embed_documents(texts)
+        latency = (time.perf_counter() - start) / max(1, len(texts))
+        for text, vector in zip(texts, vectors):
+            self.store.put_vector(text_key(text), vector, latency)
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        start = time.perf_counter()
+        vector = self.inner.embed_query(text)
+        self.store.put_vector(text_key(text), vector, time.perf_counter() - start)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        start = time.perf_counter()
+        vector = await self.inner.aembed_query(text)
+        self.store.put_vector(text_key(text), vector, time.perf_counter() - start)
+        return vector
+
+
+class ReplayEmbeddings(Embeddings):
+    def __init__(self, store: ModelStore, latency: LatencyModel):
+        self.store = store
+        self.latency = latency
+
+    def _lookup(self, text: str) -> tuple[list[float], float]:
+        found = self.store.get_vector(text_key(text))
+        if found is None:
+            raise MissingRecording(f"No hay embedding grabado para {text[:40]!r} (grabar con MODEL_PROVIDER=record)")
+        vector, recorded = found
+        return vector, self.latency.delay(recorded)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._lookup(text)[0] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        vector, delay = self._lookup(text)
+        time.sleep(delay)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        vector, delay = self._lookup(text)
+        await asyncio.sleep(delay)
+        return vector
+
+
+def build_recording_models(chat, embeddings, path: str):
+    store = ModelStore(path)
+    return RecordingChatModel(inner=chat, store=store), RecordingEmbeddings(embeddings, store)
+
+
+def build_replay_models(path: str, latency_spec: str = "none", seed: int = 0):
+    store = ModelStore(path)
+    latency = LatencyModel(latency_spec, seed)
+    return ReplayChatModel(store=store, latency=latency), ReplayEmbeddings(store, latency)
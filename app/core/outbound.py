@@ -0,0 +1,207 @@
+# app/core/outbound.py
+import asyncio
+import time
+import zlib
+import httpx
+from app.config import settings
+from app.core.resilience import backoff_delay
+from app.core.metrics import EXTERNAL_ERRORS, observe
+
+# Reenviar un POST que Twilio pudo haber aceptado duplica el WhatsApp: solo
+# se reintenta si la petición no llegó a salir (fase de conexión) o si Twilio
+# la rechazó explícitamente por límite (429)
+RETRY_STATUS = {429}
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class TokenBucket:
+    """Limitador token bucket: `rate` envíos por segundo con ráfagas de hasta `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class OutboundDispatcher:
+    """
+    Envío de mensajes de WhatsApp por la API REST de Twilio, fuera del turno.
+
+    - `send` solo encola: el turno no espera la llamada HTTP.
+    - Cada destinatario cae siempre en la misma cola/worker (hash del número),
+      así sus mensajes salen en orden aunque haya varios workers en paralelo.
+    - Las colas están acotadas: si se llenan, `send` espera (backpressure).
+    - Un token bucket compartido respeta el throughput del número emisor.
+    - Solo se reintentan los errores de conexión y el 429 (con backoff,
+      respetando Retry-After). Un timeout de lectura o un 5xx puede ocurrir
+      con el mensaje ya aceptado: reenviarlo lo duplicaría, así que se cuenta
+      en `failed` igual que los 4xx.
+
+    `api_base` es configurable para apuntar a un Twilio falso en pruebas locales.
+    """
+
+    def __init__(
+        self,
+        account_sid: str | None,
+        auth_token: str | None,
+        from_: str | None,
+        api_base: str = "https://api.twilio.com",
+        workers: int = 4,
+        max_queue: int = 1000,
+        rate: float = 10.0,
+        burst: int = 10,
+        max_retries: int = 4,
+        timeout: float = 10.0,
+    ):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_ = from_
+        self.api_base = api_base.rstrip("/")
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate, burst)
+        self._client: httpx.AsyncClient | None = None
+        self._queues: list[asyncio.Queue] = []
+        self._tasks: list[asyncio.Task] = []
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.throttled = 0
+        self.queue_full = 0
+        self._latency_total = 0.0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.api_base,
+                auth=(self.account_sid or "", self.auth_token or ""),
+                timeout=self.timeout,
+            )
+        return self._client
+
+    async def warm_up(self):
+        """Abre la conexión con la API de Twilio antes del primer envío."""
+        if self.account_sid:
+            await self._get_client().get(f"/2010-04-01/Accounts/{self.account_sid}.json", timeout=5)
+
+    def start(self):
+        """Arranca los workers (debe llamarse con el event loop corriendo)."""
+        if self._tasks:
+            return
+        per_worker = max(1, self.max_queue // self.workers)
+        self._queues = [asyncio.Queue(maxsize=per_worker) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._worker(q)) for q in self._queues]
+
+    async def close(self, timeout: float = 10.0):
+        """Espera a que se vacíen las colas (hasta `timeout`) y detiene los workers."""
+        if self._tasks:
+            try:
+                await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues)), timeout)
+            except asyncio.TimeoutError:
+                print(f"⚠️ Se apagó con {self.pending()} mensajes sin enviar.")
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks, self._queues = [], []
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def send(self, to: str, body: str):
+        """Encola un mensaje para `to` (formato whatsapp:+51...)."""
+        self.start()
+        queue = self._queues[zlib.crc32(to.encode("utf-8")) % len(self._queues)]
+        item = (to, body, time.monotonic())
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.queue_full += 1
+            await queue.put(item)
+        self.enqueued += 1
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            to, body, queued_at = await queue.get()
+            try:
+                await self._deliver(to, body)
+                self._latency_total += time.monotonic() - queued_at
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Error enviando WhatsApp a {to}: {e}")
+            finally:
+                queue.task_done()
+
+    async def _deliver(self, to: str, body: str):
+        endpoint = f"/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        data = {"From": self.from_, "To": to, "Body": body}
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            retry_after = None
+            try:
+                with observe("twilio", "send"):
+                    resp = await self._get_client().post(endpoint, data=data)
+            except RETRY_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                print(f"🔁 Reintentando envío a {to} ({type(e).__name__})")
+            else:
+                if resp.status_code < 400:
+                    self.sent += 1
+                    return
+                EXTERNAL_ERRORS.inc(service="twilio", operation="send")
+                if resp.status_code not in RETRY_STATUS or attempt >= self.max_retries:
+                    raise RuntimeError(f"Twilio respondió {resp.status_code}: {resp.text[:200]}")
+                if resp.status_code == 429:
+                    self.throttled += 1
+                retry_after = resp.headers.get("Retry-After")
+            self.retried += 1
+            delay = backoff_delay(attempt)
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            await asyncio.sleep(delay)
+
+    def pending(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self) -> dict:
+        delivered = self.sent + self.failed
+        return {
+            "pending": self.pending(),
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "throttled": self.throttled,
+            "queue_full": self.queue_full,
+            "avg_delivery_seconds": self._latency_total / self.sent if self.sent else 0.0,
+            "delivered_ratio": self.sent / delivered if delivered else 1.0,
+        }
+
+
+outbound = OutboundDispatcher(
+    settings.TWILIO_SID,
+    settings.TWILIO_TOKEN,
+    settings.TWILIO_FROM,
+    api_base=settings.TWILIO_API_BASE,
+    workers=settings.OUTBOUND_WORKERS,
+    max_queue=settings.OUTBOUND_QUEUE_SIZE,
+    rate=settings.TWILIO_SEND_RATE,
+    burst=settings.TWILIO_SEND_BURST,
+    max_retries=settings.OUTBOUND_MAX_RETRIES,
+)
@@ -0,0 +1,75 @@
+# app/core/patient_cache.py
+import copy
+import time
+from collections import OrderedDict
+
+
+class PatientCache:
+    """
+    Perfiles de paciente por DNI, en memoria con TTL.
+
+    Lo llenan tanto /patients/by-dni como /patients/verify-code, así que los
+    reintentos de DNI y las sesiones que vuelven no repiten la consulta al
+    backend. Un DNI inexistente se guarda como negativo con un TTL corto.
+
+    Cada entrada es una copia privada y `get` devuelve otra copia: quien la
+    recibe puede guardarla en la sesión o modificarla sin alterar la caché.
+    """
+
+    MISSING = object()  # resultado de `get` para un negativo cacheado
+
+    def __init__(self, ttl: float = 300, negative_ttl: float = 30, max_entries: int = 10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()  # dni -> (expira, perfil | None)
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, dni: str):
+        """Perfil (copia), `MISSING` si el DNI no existe, o None si no hay dato vigente."""
+        entry = self._entries.get(dni)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[dni]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(dni)
+        if entry[1] is None:
+            self.negative_hits += 1
+            return self.MISSING
+        self.hits += 1
+        return copy.deepcopy(entry[1])
+
+    def put(self, dni: str, profile: dict):
+        self._set(dni, copy.deepcopy(profile), self.ttl)
+
+    def put_missing(self, dni: str):
+        self._set(dni, None, self.negative_ttl)
+
+    def _set(self, dni: str, profile, ttl: float):
+        self._entries[dni] = (time.monotonic() + ttl, profile)
+        self._entries.move_to_end(dni)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, dni: str | None = None):
+        """Descarta un DNI (o toda la caché si no se indica)."""
+        if dni is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(dni, None)
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round((self.hits + self.negative_hits) / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,69 @@
+# app/core/resilience.py
+import random
+import time
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker simple (closed → open → half_open → closed).
+
+    - closed: las llamadas pasan; se cuentan fallos consecutivos.
+    - open: tras `failure_threshold` fallos seguidos se rechaza todo durante
+      `reset_timeout` segundos (fail fast en vez de esperar los timeouts).
+    - half_open: pasado ese tiempo se deja pasar UNA llamada de prueba;
+      si sale bien se cierra, si falla se vuelve a abrir.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = "half_open"
+            self._probe_in_flight = False
+        # half_open: solo una llamada de prueba a la vez
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                print(f"⛔ Circuito '{self.name}' abierto tras {self.failures} fallos.")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def abandon(self):
+        """
+        La llamada terminó sin resultado (cancelada o con un error inesperado).
+        Si era la prueba del half_open cuenta como fallo; si no, se liberaría
+        la prueba nunca y el circuito rechazaría todo para siempre.
+        """
+        if self.state == "half_open" and self._probe_in_flight:
+            self.record_failure()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures}
+
+
+def backoff_delay(attempt: int, base: float = 0.3, cap: float = 5.0) -> float:
+    """Backoff exponencial con 'full jitter': uniforme en [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,90 @@
+# app/core/response_cache.py
+import time
+import numpy as np
+from app.config import settings
+
+
+class _Bucket:
+    """Respuestas cacheadas de un nodo: matriz de vectores normalizados en anillo."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.vectors: np.ndarray | None = None  # se dimensiona con el primer vector
+        self.created = np.zeros(capacity, dtype=np.float64)
+        self.answers: list[str | None] = [None] * capacity
+        self.count = 0
+        self.next = 0
+
+    def add(self, vector: np.ndarray, answer: str, now: float):
+        if self.vectors is None:
+            self.vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+        self.vectors[self.next] = vector
+        self.created[self.next] = now
+        self.answers[self.next] = answer
+        self.next = (self.next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+
+class SemanticCache:
+    """
+    Caché semántica de respuestas del LLM.
+
+    La clave es el embedding de la pregunta: si una pregunta nueva tiene
+    similitud coseno >= `threshold` con una ya respondida hace menos de `ttl`
+    segundos (en el mismo nodo), se reutiliza esa respuesta y se evita tanto
+    la búsqueda como la llamada a GPT-4o.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600, max_entries: int = 500):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._buckets: dict[str, _Bucket] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def lookup(self, namespace: str, vector) -> str | None:
+        bucket = self._buckets.get(namespace)
+        if bucket is None or bucket.count == 0:
+            self.misses += 1
+            return None
+
+        q = self._normalize(vector)
+        sims = bucket.vectors[: bucket.count] @ q
+        # Entradas vencidas no cuentan
+        expired = bucket.created[: bucket.count] < time.time() - self.ttl
+        sims[expired] = -1.0
+        best = int(np.argmax(sims))
+        if sims[best] >= self.threshold:
+            self.hits += 1
+            return bucket.answers[best]
+        self.misses += 1
+        return None
+
+    def store(self, namespace: str, vector, answer: str):
+        bucket = self._buckets.get(namespace)
+        if bucket is None:
+            bucket = self._buckets[namespace] = _Bucket(self.max_entries)
+        bucket.add(self._normalize(vector), answer, time.time())
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": sum(b.count for b in self._buckets.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+response_cache = SemanticCache(
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    ttl=settings.SEMANTIC_CACHE_TTL,
+    max_entries=settings.SEMANTIC_CACHE_SIZE,
+)
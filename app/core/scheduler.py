@@ -0,0 +1,117 @@
+# app/core/scheduler.py
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable
+from app.config import settings
+
+
+class Lane:
+    """Cola acotada + `workers` tasks que la consumen (máximo de trabajos en paralelo)."""
+
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.queue: asyncio.Queue | None = None
+        self.tasks: list[asyncio.Task] = []
+        self.running = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_depth_seen = 0
+        self._waits: deque = deque(maxlen=500)  # últimas esperas en cola (segundos)
+        self._wait_total = 0.0
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "depth": self.queue.qsize() if self.queue else 0,
+            "max_depth_seen": self.max_depth_seen,
+            "running": self.running,
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_seconds": self._wait_total / (self.completed + self.failed) if self.completed + self.failed else 0.0,
+            "p95_wait_seconds": waits[int(len(waits) * 0.95) - 1] if waits else 0.0,
+            "max_wait_seconds": waits[-1] if waits else 0.0,
+        }
+
+
+class WorkScheduler:
+    """
+    Planificador de trabajo en segundo plano por carriles (lanes).
+
+    Cada carril tiene su propia cola acotada y su propio número de workers,
+    así los turnos baratos no esperan detrás de los caros. `submit` nunca
+    bloquea: si la cola del carril está llena devuelve False y quien llama
+    decide cómo rechazar el trabajo (control de admisión).
+    """
+
+    def __init__(self, lanes: dict[str, tuple[int, int]]):
+        self.lanes = {name: Lane(name, workers, max_queue) for name, (workers, max_queue) in lanes.items()}
+
+    def start(self):
+        """Arranca los workers (debe llamarse con el event loop corriendo)."""
+        for lane in self.lanes.values():
+            if lane.queue is None:
+                lane.queue = asyncio.Queue(maxsize=lane.max_queue)
+                lane.tasks = [asyncio.create_task(self._worker(lane)) for _ in range(lane.workers)]
+
+    def submit(self, lane_name: str, fn: Callable[..., Awaitable], *args) -> bool:
+        self.start()
+        lane = self.lanes[lane_name]
+        try:
+            lane.queue.put_nowait((fn, args, time.monotonic()))
+        except asyncio.QueueFull:
+            lane.rejected += 1
+            return False
+        lane.submitted += 1
+        lane.max_depth_seen = max(lane.max_depth_seen, lane.queue.qsize())
+        return True
+
+    async def _worker(self, lane: Lane):
+        while True:
+            fn, args, queued_at = await lane.queue.get()
+            wait = time.monotonic() - queued_at
+            lane._waits.append(wait)
+            lane._wait_total += wait
+            lane.running += 1
+            try:
+                await fn(*args)
+                lane.completed += 1
+            except Exception as e:
+                lane.failed += 1
+                print(f"❌ Error en carril {lane.name}: {e}")
+            finally:
+                lane.running -= 1
+                lane.queue.task_done()
+
+    async def close(self, timeout: float = 30.0):
+        """Espera a que terminen los trabajos encolados (hasta `timeout`) y detiene los workers."""
+        active = [lane for lane in self.lanes.values() if lane.queue is not None]
+        if not active:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(lane.queue.join() for lane in active)), timeout)
+        except asyncio.TimeoutError:
+            print("⚠️ Se apagó con trabajos pendientes en el planificador.")
+        for lane in active:
+            for task in lane.tasks:
+                task.cancel()
+            await asyncio.gather(*lane.tasks, return_exceptions=True)
+            lane.queue, lane.tasks = None, []
+
+    def stats(self) -> dict:
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+
+# Carril "fast": turnos deterministas (verificación, menú, pasos de cita).
+# Carril "slow": turnos que llaman a GPT-4o, con concurrencia limitada.
+work_scheduler = WorkScheduler({
+    "fast": (settings.FAST_LANE_WORKERS, settings.FAST_LANE_QUEUE),
+    "slow": (settings.SLOW_LANE_CONCURRENCY, settings.SLOW_LANE_QUEUE),
+})
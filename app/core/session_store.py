@@ -0,0 +1,237 @@
+# app/core/session_store.py
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import sqlite3
+import time
+import zlib
+from collections import OrderedDict
+from app.config import settings
+
+
+# ==========================================================
+# SERIALIZACIÓN COMPACTA DE AgentState
+# ==========================================================
+
+def serialize_state(state: dict) -> bytes:
+    """JSON sin espacios + zlib. AgentState solo contiene tipos JSON."""
+    raw = json.dumps(state, ensure_ascii=False, separators=(",", ":"))
+    return zlib.compress(raw.encode("utf-8"))
+
+
+def deserialize_state(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+# ==========================================================
+# INTERFAZ
+# ==========================================================
+
+class SessionStore(ABC):
+    """
+    Almacén de sesiones por número de WhatsApp.
+    Todas las operaciones son asíncronas para no bloquear el event loop.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> dict | None:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, state: dict):
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    async def warm_up(self):
+        """Abre la conexión con el backend antes del primer turno (importar no la abre)."""
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+
+# ==========================================================
+# BACKEND EN MEMORIA (LRU + TTL)
+# ==========================================================
+
+class MemorySessionStore(SessionStore):
+    """
+    LRU acotado a `max_entries` con expiración por inactividad (`ttl` segundos).
+    Solo sirve para un worker: el estado se pierde al reiniciar.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self.evicted = 0
+        self.expired = 0
+
+    async def get(self, key: str) -> dict | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, state = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.expired += 1
+            return None
+        self._data.move_to_end(key)
+        return state
+
+    async def set(self, key: str, state: dict):
+        self._data[key] = (time.monotonic() + self.ttl, state)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evicted += 1
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "size": len(self._data), "evicted": self.evicted, "expired": self.expired}
+
+
+# ==========================================================
+# BACKEND PERSISTENTE: SQLITE
+# ==========================================================
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sesiones en un archivo SQLite (modo WAL): sobrevive reinicios y se puede
+    compartir entre varios workers uvicorn de la misma máquina.
+    Las consultas se ejecutan en un hilo para no bloquear el event loop; el
+    archivo se abre en el primer uso (o en el calentamiento), no al construir.
+    """
+
+    # Cada cuántas escrituras se purgan las sesiones vencidas
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str, ttl: float = 86400):
+        self.path = path
+        self.ttl = ttl
+        self._writes = 0
+        self._conn: sqlite3.Connection | None = None
+        self._lock = asyncio.Lock()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " key TEXT PRIMARY KEY, data BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _get(self, key: str):
+        row = self._get_conn().execute(
+            "SELECT data FROM sessions WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return deserialize_state(row[0]) if row else None
+
+    def _set(self, key: str, data: bytes):
+        conn = self._get_conn()
+        conn.execute(
+            "INSERT INTO sessions (key, data, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+            (key, data, time.time() + self.ttl),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+
+    def _delete(self, key: str):
+        self._get_conn().execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+    async def warm_up(self):
+        async with self._lock:
+            await asyncio.to_thread(self._get_conn)
+
+    async def get(self, key: str) -> dict | None:
+        async with self._lock:
+            return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, state: dict):
+        data = serialize_state(state)
+        async with self._lock:
+            await asyncio.to_thread(self._set, key, data)
+
+    async def delete(self, key: str):
+        async with self._lock:
+            await asyncio.to_thread(self._delete, key)
+
+    async def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def stats(self) -> dict:
+        return {"backend": "sqlite", "path": self.path, "writes": self._writes}
+
+
+# ==========================================================
+# BACKEND PERSISTENTE: REDIS (o cualquier servidor compatible)
+# ==========================================================
+
+class RedisSessionStore(SessionStore):
+    """
+    Sesiones en Redis con expiración nativa (SET ... EX). Funciona con cualquier
+    servidor que hable el protocolo de Redis (Valkey, KeyDB, un Redis local...).
+    """
+
+    def __init__(self, url: str, ttl: float = 86400, prefix: str = "medisense:session:"):
+        self.url = url
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self._redis = None
+
+    def _get_client(self):
+        if self._redis is None:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError as e:
+                raise RuntimeError("SESSION_BACKEND=redis requiere el paquete 'redis'") from e
+            self._redis = aioredis.from_url(self.url)
+        return self._redis
+
+    async def warm_up(self):
+        await self._get_client().ping()
+
+    async def get(self, key: str) -> dict | None:
+        data = await self._get_client().get(self.prefix + key)
+        return deserialize_state(data) if data else None
+
+    async def set(self, key: str, state: dict):
+        await self._get_client().set(self.prefix + key, serialize_state(state), ex=self.ttl)
+
+    async def delete(self, key: str):
+        await self._get_client().delete(self.prefix + key)
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+
+def build_session_store() -> SessionStore:
+    backend = settings.SESSION_BACKEND
+    if backend == "sqlite":
+        return SQLiteSessionStore(settings.SESSION_SQLITE_PATH, ttl=settings.SESSION_TTL_SECONDS)
+    if backend == "redis":
+        return RedisSessionStore(settings.REDIS_URL, ttl=settings.SESSION_TTL_SECONDS)
+    return MemorySessionStore(max_entries=settings.SESSION_MAX_ENTRIES, ttl=settings.SESSION_TTL_SECONDS)
+
+
+session_store = build_session_store()
@@ -0,0 +1,99 @@
+# app/core/streaming.py
+import re
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Optional
+from app.core.llm import get_llm
+from app.core.usage import usage_tracker
+
+# Destino de las respuestas parciales del turno en curso. Lo fija
+# process_message antes de ejecutar el grafo; si no hay destino (tests,
+# scripts), los nodos responden de una sola vez como antes.
+reply_sink: ContextVar[Optional[Callable[[str], Awaitable[None]]]] = ContextVar("reply_sink", default=None)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+def split_message(text: str, limit: int) -> list[str]:
+    """
+    Divide un texto en mensajes de a lo más `limit` caracteres, cortando por
+    párrafos y luego por oraciones. Una oración que por sí sola supera el
+    límite se corta por espacios (o a la fuerza si no hay).
+    """
+    text = text.strip()
+    if len(text) <= limit:
+        return [text] if text else []
+
+    pieces = []
+    for paragraph in re.split(r"\n{2,}", text):
+        for sentence in _SENTENCE_END.split(paragraph.strip()):
+            while len(sentence) > limit:
+                cut = sentence.rfind(" ", 0, limit)
+                cut = cut if cut > 0 else limit
+                pieces.append(sentence[:cut])
+                sentence = sentence[cut:].lstrip()
+            if sentence:
+                pieces.append(sentence)
+        pieces.append("\n\n")  # marca de fin de párrafo
+
+    messages, current = [], ""
+    for piece in pieces:
+        if piece == "\n\n":
+            current = current.rstrip() + "\n\n" if current else current
+            continue
+        joiner = "" if not current or current.endswith("\n\n") else " "
+        if len(current.rstrip()) + len(joiner) + len(piece) > limit:
+            messages.append(current.strip())
+            current, joiner = "", ""
+        current += joiner + piece
+    if current.strip():
+        messages.append(current.strip())
+    return messages
+
+
+async def stream_reply(node: str, messages: list, limit: int) -> tuple[str, bool]:
+    """
+    Ejecuta el LLM en modo streaming y envía por `reply_sink`:
+      1. El primer párrafo completo apenas está listo.
+      2. El resto, en orden, como mensajes de hasta `limit` caracteres
+         cortados por oraciones.
+
+    Devuelve (texto completo, si ya se envió). Sin `reply_sink` se usa
+    `ainvoke` y el envío queda a cargo de quien ejecuta el grafo.
+    """
+    sink = reply_sink.get()
+    if sink is None:
+        resp = await get_llm().ainvoke(messages)
+        usage_tracker.record(node, resp)
+        return resp.content, False
+
+    full = None
+    pending = ""
+    first_sent = False
+    async for chunk in get_llm().astream(messages):
+        full = chunk if full is None else full + chunk
+        pending += chunk.content or ""
+
+        if not first_sent:
+            head, sep, tail = pending.partition("\n\n")
+            if sep and head.strip():
+                for part in split_message(head, limit):
+                    await sink(part)
+                first_sent, pending = True, tail
+            continue
+
+        # Vaciar hasta la última oración completa; lo que sigue se guarda
+        # tal cual porque la oración puede seguir llegando.
+        if len(pending) > limit:
+            boundaries = list(_SENTENCE_END.finditer(pending))
+            if boundaries:
+                cut = boundaries[-1]
+                for part in split_message(pending[:cut.start()], limit):
+                    await sink(part)
+                pending = pending[cut.end():]
+
+    for part in split_message(pending, limit):
+        await sink(part)
+
+    if full is not None:
+        usage_tracker.record(node, full)
+    return (full.content if full is not None else ""), True
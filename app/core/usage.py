@@ -0,0 +1,42 @@
+# app/core/usage.py
+from collections import defaultdict
+from app.core.metrics import LLM_TOKENS
+
+
+class UsageTracker:
+    """
+    Acumula el consumo de tokens por nodo a partir de `usage_metadata` de
+    LangChain, incluidos los tokens de entrada servidos desde la caché de
+    prompts del proveedor (`input_token_details.cache_read`).
+    """
+
+    def __init__(self):
+        self._totals = defaultdict(lambda: {"calls": 0, "input": 0, "cached": 0, "output": 0, "total": 0})
+
+    def record(self, node: str, response) -> dict:
+        usage = getattr(response, "usage_metadata", None) or {}
+        cached = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+        entry = self._totals[node]
+        entry["calls"] += 1
+        entry["input"] += usage.get("input_tokens", 0)
+        entry["cached"] += cached
+        entry["output"] += usage.get("output_tokens", 0)
+        entry["total"] += usage.get("total_tokens", 0)
+        LLM_TOKENS.inc(usage.get("input_tokens", 0), node=node, kind="input")
+        LLM_TOKENS.inc(cached, node=node, kind="cached")
+        LLM_TOKENS.inc(usage.get("output_tokens", 0), node=node, kind="output")
+        if usage:
+            print(
+                f"🧮 {node}: {usage.get('input_tokens', 0)} in ({cached} en caché) / "
+                f"{usage.get('output_tokens', 0)} out"
+            )
+        return usage
+
+    def stats(self) -> dict:
+        stats = {}
+        for node, entry in self._totals.items():
+            stats[node] = {**entry, "cache_ratio": entry["cached"] / entry["input"] if entry["input"] else 0.0}
+        return stats
+
+
+usage_tracker = UsageTracker()
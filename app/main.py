@@ -1,8 +1,113 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.webhook import router, legacy_router
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.config import settings
+from app.agents.graph import get_app_graph
+from app.api.webhook import router, legacy_router, conversation_locks, mailboxes
+from app.core.business import business_client
+from app.core.knowledge import knowledge_base
+from app.core.session_store import session_store
+from app.core.idempotency import message_dedup
+from app.core.embedding_cache import embedding_cache
+from app.core.outbound import outbound
+from app.core.scheduler import work_scheduler
+from app.core.response_cache import response_cache
+from app.core.usage import usage_tracker
+from app.core.metrics import registry
+from app.core.llm import get_models
+from app.core.context_packer import load_tokenizer
+from app.core.availability import availability
 
-app = FastAPI(title="MediSense AI Backend")
+
+# Estado de cada componente (sus stats()) expuesto como gauges en /metrics
+registry.register_collector("business_breaker", business_client.breaker.stats)
+registry.register_collector("patient_cache", business_client.patients.stats)
+registry.register_collector("availability", availability.stats)
+registry.register_collector("log_queue", business_client.log_queue.stats)
+registry.register_collector("outbound", outbound.stats)
+registry.register_collector("scheduler", work_scheduler.stats)
+registry.register_collector("sessions", session_store.stats)
+registry.register_collector("webhook_dedup", message_dedup.stats)
+registry.register_collector("conversation_locks", conversation_locks.stats)
+registry.register_collector("phone_mailboxes", mailboxes.stats)
+registry.register_collector("embedding_cache", embedding_cache.stats)
+registry.register_collector("response_cache", response_cache.stats)
+registry.register_collector("llm_usage", usage_tracker.stats)
+
+
+# ==========================================================
+# CALENTAMIENTO Y READINESS
+# ==========================================================
+# Importar la app no construye clientes ni abre conexiones: los modelos, el
+# grafo, el índice local y las conexiones keep-alive se preparan aquí, en
+# segundo plano, y /readyz responde 503 hasta que termine.
+
+readiness = {"ready": False, "shutting_down": False, "warmup_seconds": None, "errors": {}}
+
+
+async def warm_up():
+    start = time.perf_counter()
+    steps = {
+        "models": asyncio.to_thread(get_models),
+        "graph": asyncio.to_thread(get_app_graph),
+        "tokenizer": asyncio.to_thread(load_tokenizer),
+        "knowledge": knowledge_base.warm_up(),
+        "business": business_client.warm_up(),
+        "twilio": outbound.warm_up(),
+        "sessions": session_store.warm_up(),
+        "webhook_dedup": message_dedup.warm_up(),
+        "embedding_cache": embedding_cache.warm_up(),
+    }
+    results = await asyncio.gather(
+        *(asyncio.wait_for(step, settings.WARMUP_TIMEOUT) for step in steps.values()),
+        return_exceptions=True,
+    )
+    for name, result in zip(steps, results):
+        if isinstance(result, BaseException):
+            readiness["errors"][name] = repr(result)
+            print(f"⚠️ Warm-up '{name}' falló: {result!r}")
+
+    # Sin modelos o sin grafo no se puede atender; las conexiones de red son
+    # solo una optimización y se abrirán en el primer uso.
+    readiness["ready"] = "models" not in readiness["errors"] and "graph" not in readiness["errors"]
+    readiness["warmup_seconds"] = round(time.perf_counter() - start, 3)
+    print(f"🔥 Warm-up terminado en {readiness['warmup_seconds']}s (ready={readiness['ready']})")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.WEB_CONCURRENCY > 1:
+        print(
+            f"⚠️ {settings.WEB_CONCURRENCY} workers: los apartados de turnos y el orden por "
+            "teléfono viven en memoria de cada worker (ver WEB_CONCURRENCY en app/config.py)"
+        )
+    business_client.log_queue.start()
+    outbound.start()
+    work_scheduler.start()
+    availability.start()
+    warmup_task = asyncio.create_task(warm_up())
+    yield
+    readiness["ready"] = False
+    readiness["shutting_down"] = True
+    if not warmup_task.done():
+        warmup_task.cancel()
+    # Apagado: terminar los turnos en curso, enviar los logs pendientes y
+    # cerrar los clientes HTTP compartidos
+    await work_scheduler.close()
+    await availability.close()
+    await business_client.log_queue.close()
+    await business_client.aclose()
+    await knowledge_base.close()
+    await outbound.close()
+    await session_store.close()
+    await message_dedup.close()
+    embedding_cache.close()
+
+
+app = FastAPI(title="MediSense AI Backend", lifespan=lifespan)
 
 # CORS Config
 origins = ["*"]  # Ajustar en producción
@@ -25,6 +130,24 @@ app.include_router(legacy_router)
 def home():
     return {"status": "AI Backend Online (RAG Mode)"}
 
+@app.get("/healthz")
+def healthz():
+    """Liveness: el proceso responde (no depende de servicios externos)."""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 503 hasta que el calentamiento termina y durante el apagado."""
+    status_code = 200 if readiness["ready"] else 503
+    # El modo respaldo de disponibilidad no impide atender, pero debe verse
+    body = {**readiness, "availability": "fallback" if availability.fallback else "backend"}
+    return JSONResponse(body, status_code=status_code)
+
+@app.get("/metrics")
+def metrics():
+    """Métricas en formato de texto de Prometheus."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, workers=settings.WEB_CONCURRENCY)
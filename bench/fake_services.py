@@ -0,0 +1,102 @@
+# bench/fake_services.py
+"""
+Backend de negocio (Render) y API de Twilio falsos, en una sola app FastAPI.
+
+- /api/...                                   → endpoints que usa BusinessClient
+                                               (incluye el calendario de citas)
+- /2010-04-01/Accounts/{sid}/Messages.json   → envío de WhatsApp (OutboundDispatcher)
+
+Cada mensaje saliente se entrega a `on_message(to, body)` para que el
+harness mida la latencia de extremo a extremo.
+"""
+import asyncio
+import itertools
+import random
+from datetime import date, datetime, time, timedelta
+from typing import Callable
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.agents.nodes import APPOINTMENT_SPECIALTIES
+
+
+def build_fake_services(on_message: Callable[[str, str], None], backend_latency: float = 0.05) -> FastAPI:
+    app = FastAPI(title="MediSense fake services")
+    case_ids = itertools.count(1)
+    message_ids = itertools.count(1)
+
+    async def wait():
+        if backend_latency:
+            await asyncio.sleep(backend_latency * random.uniform(0.5, 1.5))
+
+    def patient(dni: str) -> dict:
+        return {
+            "id": int(dni) % 100000,
+            "full_name": "Paciente Benchmark",
+            "document_number": dni,
+            "email": f"{dni}@bench.local",
+        }
+
+    # --------------------------
+    # Backend de negocio
+    # --------------------------
+    @app.get("/api/patients/by-dni/{dni}")
+    async def by_dni(dni: str):
+        await wait()
+        return {"exists": True, "patient": patient(dni)}
+
+    @app.post("/api/patients/send-code")
+    async def send_code():
+        await wait()
+        return {"ok": True}
+
+    @app.post("/api/patients/verify-code")
+    async def verify_code(request: Request):
+        await wait()
+        data = await request.json()
+        return {"ok": True, "patient": patient(data["dni"])}
+
+    @app.post("/api/conversations/log")
+    @app.post("/api/wellness/log")
+    async def log():
+        await wait()
+        return {"ok": True}
+
+    @app.get("/api/appointments/availability")
+    async def availability(days: int = 7):
+        # Lunes a sábado de 09:00 a 17:00; una de cada tres horas ya reservada
+        await wait()
+        start = date.today()
+        specialties = {}
+        for name in APPOINTMENT_SPECIALTIES.values():
+            opening, booked = [], []
+            for offset in range(days + 1):
+                day = start + timedelta(days=offset)
+                if day.weekday() == 6:
+                    continue
+                opening.append({
+                    "start": datetime.combine(day, time(9)).isoformat(),
+                    "end": datetime.combine(day, time(17)).isoformat(),
+                })
+                for hour in range(9 + offset % 3, 17, 3):
+                    booked.append({
+                        "start": datetime.combine(day, time(hour)).isoformat(),
+                        "end": datetime.combine(day, time(hour + 1)).isoformat(),
+                    })
+            specialties[name] = {"open": opening, "booked": booked}
+        return {"specialties": specialties}
+
+    @app.post("/api/cases/from-ia")
+    async def create_case():
+        await wait()
+        return {"case": {"id": next(case_ids)}}
+
+    # --------------------------
+    # Twilio
+    # --------------------------
+    @app.post("/2010-04-01/Accounts/{sid}/Messages.json")
+    async def send_message(sid: str, request: Request):
+        form = await request.form()
+        on_message(form["To"], form["Body"])
+        return JSONResponse({"sid": f"SM{next(message_ids):032d}", "status": "queued"}, status_code=201)
+
+    return app
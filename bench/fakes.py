@@ -0,0 +1,149 @@
+# bench/fakes.py
+"""
+Modelos falsos para benchmarks: mismo contrato que AzureChatOpenAI /
+AzureOpenAIEmbeddings, con latencia configurable y sin red.
+
+Se activan con MODEL_PROVIDER=bench.fakes:build_models. Variables:
+    BENCH_LLM_LATENCY    segundos por respuesta de chat (default 0.8)
+    BENCH_LLM_JITTER     variación relativa +/- (default 0.3)
+    BENCH_EMBED_LATENCY  segundos por embedding (default 0.05)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from typing import Any
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from app.core.local_index import tokenize
+
+EMBEDDING_DIM = 256
+
+MEDICAL_ANSWER = (
+    "Lamento que te sientas así, entiendo tu preocupación. "
+    "Por lo que describes, lo más probable es un cuadro leve que suele mejorar con medidas generales.\n\n"
+    "Te recomiendo descansar, mantenerte bien hidratado y evitar esfuerzos intensos durante los próximos días. "
+    "Si los síntomas empeoran, aparece fiebre alta o dolor intenso, acude a un centro de salud. "
+    "Recuerda que esta información no reemplaza una consulta médica presencial."
+)
+
+WELLNESS_ANSWER = (
+    "🍏 ¡Excelente objetivo! Empieza por agregar una porción de verduras en cada comida "
+    "y toma al menos 2 litros de agua al día 💧. ¡Pequeños cambios suman mucho! 💪"
+)
+
+DIAGNOSIS_ANSWER = {
+    "risk_level": "BAJO",
+    "possible_diagnosis": "Posible cefalea tensional",
+    "justification": "Dolor difuso sin signos de alarma",
+    "recommended_treatment": "Reposo, hidratación y analgésico simple",
+    "specialty": "Medicina General",
+}
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeChatModel(BaseChatModel):
+    """Responde según el tipo de prompt (diagnóstico JSON, wellness, médico) tras una espera."""
+
+    latency: float = 0.8
+    jitter: float = 0.3
+
+    @property
+    def _llm_type(self) -> str:
+        return "bench-fake-chat"
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    @staticmethod
+    def _answer(messages) -> str:
+        system = " ".join(m.content for m in messages if isinstance(m, SystemMessage))
+        if "JSON" in system:
+            return json.dumps(DIAGNOSIS_ANSWER, ensure_ascii=False)
+        if "Coach de Bienestar" in system:
+            return WELLNESS_ANSWER
+        if "Resume la conversación" in system:  # HISTORY_SUMMARY_SYSTEM_PROMPT
+            return "El paciente consultó por síntomas leves y recibió recomendaciones generales."
+        return MEDICAL_ANSWER
+
+    @staticmethod
+    def _usage(messages, answer: str) -> dict:
+        prompt = sum(_estimate_tokens(m.content) for m in messages)
+        output = _estimate_tokens(answer)
+        return {"input_tokens": prompt, "output_tokens": output, "total_tokens": prompt + output}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._delay())
+        answer = self._answer(messages)
+        message = AIMessage(content=answer, usage_metadata=self._usage(messages, answer))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        answer = self._answer(messages)
+        message = AIMessage(content=answer, usage_metadata=self._usage(messages, answer))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        # Primer token tras ~30% de la latencia; el resto repartido en el 70% restante
+        total = self._delay()
+        answer = self._answer(messages)
+        words = answer.split(" ")
+        await asyncio.sleep(total * 0.3)
+        step = total * 0.7 / max(1, len(words))
+        for i, word in enumerate(words):
+            text = word if i == len(words) - 1 else word + " "
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+            await asyncio.sleep(step)
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, answer)))
+
+
+class FakeEmbeddings(Embeddings):
+    """Bolsa de palabras con hashing a EMBEDDING_DIM dimensiones (determinista)."""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+
+    @staticmethod
+    def _vector(text: str) -> list[float]:
+        vec = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+        for token in tokenize(text):
+            h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little")
+            vec[h % EMBEDDING_DIM] += 1.0 if h & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        await asyncio.sleep(self.latency)
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        await asyncio.sleep(self.latency)
+        return self._vector(text)
+
+
+def build_models():
+    chat = FakeChatModel(
+        latency=float(os.getenv("BENCH_LLM_LATENCY", "0.8")),
+        jitter=float(os.getenv("BENCH_LLM_JITTER", "0.3")),
+    )
+    embeddings = FakeEmbeddings(latency=float(os.getenv("BENCH_EMBED_LATENCY", "0.05")))
+    return chat, embeddings
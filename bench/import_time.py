@@ -0,0 +1,74 @@
+# bench/import_time.py
+"""
+Presupuesto de tiempo de importación de la app.
+
+Importa `app.main` en un proceso limpio con `python -X importtime` y falla
+(exit 1) si tarda más que --budget segundos. Importar no debe construir
+clientes ni abrir conexiones: eso ocurre en el calentamiento del lifespan.
+
+Uso:
+    python -m bench.import_time --budget 1.5
+
+El mismo presupuesto se verifica como prueba en tests/test_import_time.py.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module: str, env: dict | None = None) -> list[tuple[int, int, str]]:
+    """Devuelve (self_us, cumulative_us, módulo) de cada import."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"❌ No se pudo importar {module}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    return rows
+
+
+def total_seconds(rows: list[tuple[int, int, str]], module: str) -> float:
+    return next(cum for _, cum, name in reversed(rows) if name == module) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica el tiempo de importación de la app")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget", type=float, default=1.5, help="segundos permitidos")
+    parser.add_argument("--top", type=int, default=10, help="módulos más lentos a listar")
+    args = parser.parse_args()
+
+    rows = measure(args.module)
+    total = total_seconds(rows, args.module)
+
+    print(f"⏱️ import {args.module}: {total:.3f}s (presupuesto {args.budget:.3f}s)")
+    print("   Módulos de primer nivel más lentos (acumulado):")
+    top_level = {}
+    for _, cumulative, name in rows:
+        root = name.split(".")[0]
+        top_level[root] = max(top_level.get(root, 0), cumulative)
+    for root, cumulative in sorted(top_level.items(), key=lambda kv: kv[1], reverse=True)[: args.top]:
+        print(f"   {cumulative / 1e6:8.3f}s  {root}")
+
+    if total > args.budget:
+        print("❌ Presupuesto de importación excedido")
+        raise SystemExit(1)
+    print("✅ Dentro del presupuesto")
+
+
+if __name__ == "__main__":
+    main()
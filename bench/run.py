@@ -0,0 +1,341 @@
+# bench/run.py
+"""
+Benchmark de carga de punta a punta contra servicios locales falsos.
+
+Levanta `app.main:app` en un proceso uvicorn aparte, apuntado a:
+  - modelos de chat/embeddings falsos (bench/fakes.py, latencia configurable),
+  - un índice local sintético (RETRIEVAL_BACKEND=local),
+  - un backend de negocio y una API de Twilio falsos (bench/fake_services.py).
+
+Luego reproduce conversaciones de WhatsApp con guion (verificación → menú →
+cita / consulta médica / bienestar) contra /api/webhook con distintos niveles
+de concurrencia. Una respuesta cuenta cuando llega al Twilio falso.
+
+Uso (desde la raíz del repo):
+    python -m bench.run --concurrency 1,10,50 --conversations 50
+    python -m bench.run --llm-latency 1.5 --output bench_results.json
+    python -m bench.run --model-provider replay --model-store model_store.db
+
+Para que replay encuentre todos los prompts, grabar y reproducir con los mismos
+parámetros y --no-cache: con la caché semántica activa, qué conversación llega
+primero al LLM depende del orden de llegada.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+import httpx
+import uvicorn
+from bench.fake_services import build_fake_services
+from bench.fakes import FakeEmbeddings
+from app.core.local_index import LocalIndexWriter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ==========================================================
+# CONVERSACIONES CON GUION
+# ==========================================================
+
+MEDICAL_QUESTIONS = [
+    "Tengo dolor de cabeza desde ayer, ¿qué puedo hacer?",
+    "¿Cuáles son los síntomas de la diabetes?",
+    "Me salió una mancha roja en la piel que pica",
+    "¿Es normal tener fiebre después de una vacuna?",
+    "Tengo tos seca hace una semana",
+    "¿Cómo puedo bajar la presión alta?",
+]
+WELLNESS_GOALS = [
+    "Quiero comer más sano",
+    "Quiero dormir mejor",
+    "Quiero bajar de peso",
+    "Quiero tener más energía en el día",
+]
+REASONS = [
+    "Me duele la cabeza y tengo náuseas desde ayer",
+    "Tengo dolor en la rodilla al caminar",
+    "Tengo manchas en la piel desde hace un mes",
+]
+
+
+def conversation_script(kind: str, dni: str) -> list[str]:
+    start = ["hola", dni, "123456"]
+    if kind == "appointment":
+        return start + ["1", "1", random.choice(REASONS), "1", "si"]
+    if kind == "medical":
+        return start + ["3", random.choice(MEDICAL_QUESTIONS), "¿y eso es grave?"]
+    return start + ["2", random.choice(WELLNESS_GOALS)]
+
+
+CONVERSATION_MIX = ["appointment", "medical", "medical", "wellness"]
+
+# ==========================================================
+# ÍNDICE SINTÉTICO PARA RETRIEVAL_BACKEND=local
+# ==========================================================
+
+TOPICS = ["cefalea", "diabetes", "hipertensión", "dermatitis", "tos", "fiebre", "nutrición", "sueño"]
+
+
+def build_index(path: str, passages: int):
+    embeddings = FakeEmbeddings(latency=0)
+    writer = LocalIndexWriter(path)
+    for i in range(passages):
+        topic = TOPICS[i % len(TOPICS)]
+        content = (
+            f"Protocolo de atención para {topic}. Ante síntomas leves se recomienda reposo e hidratación. "
+            f"Si hay dolor intenso, fiebre persistente o signos de alarma, derivar a evaluación presencial. "
+            f"Sección {i}: control y seguimiento del paciente con {topic}."
+        )
+        writer.add(f"bench-{i}", content, f"protocolo_{topic}.pdf", embeddings.embed_query(content))
+    writer.close()
+
+
+# ==========================================================
+# ARRANQUE DE PROCESOS
+# ==========================================================
+
+class Inbox:
+    """Respuestas recibidas por el Twilio falso, por destinatario."""
+
+    def __init__(self):
+        self.queues: dict[str, asyncio.Queue] = defaultdict(asyncio.Queue)
+        self.total = 0
+
+    def deliver(self, to: str, body: str):
+        self.total += 1
+        self.queues[to].put_nowait((time.perf_counter(), body))
+
+
+async def start_fake_services(inbox: Inbox, port: int, backend_latency: float):
+    config = uvicorn.Config(
+        build_fake_services(inbox.deliver, backend_latency), host="127.0.0.1", port=port, log_level="warning",
+    )
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+def start_app(args, fake_base: str, index_path: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "MODEL_PROVIDER": args.model_provider,
+        "MODEL_RECORD_SOURCE": os.getenv("MODEL_RECORD_SOURCE", "bench.fakes:build_models"),
+        "MODEL_STORE_PATH": args.model_store,
+        "MODEL_REPLAY_LATENCY": args.replay_latency,
+        "BENCH_LLM_LATENCY": str(args.llm_latency),
+        "BENCH_EMBED_LATENCY": str(args.embed_latency),
+        "BUSINESS_BACKEND_URL": f"{fake_base}/api",
+        "TWILIO_API_BASE": fake_base,
+        "TWILIO_SID": "ACbench",
+        "TWILIO_TOKEN": "bench",
+        "TWILIO_WHATSAPP_NUMBER": "whatsapp:+10000000000",
+        "TWILIO_SEND_RATE": str(args.send_rate),
+        "TWILIO_SEND_BURST": str(int(args.send_rate)),
+        "AZURE_SEARCH_SERVICE_ENDPOINT": "",
+        "AZURE_SEARCH_API_KEY": "",
+        "RETRIEVAL_BACKEND": "local",
+        "LOCAL_INDEX_PATH": index_path,
+        "SESSION_BACKEND": "memory",
+    }
+    cache = "false" if args.no_cache else "true"
+    env["SEMANTIC_CACHE_WELLNESS"] = env["SEMANTIC_CACHE_MEDICAL"] = cache
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(args.app_port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL if args.quiet else None,
+    )
+
+
+async def wait_until_up(client: httpx.AsyncClient, url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(url)).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"La app no respondió en {url}")
+
+
+# ==========================================================
+# MÉTRICAS POR NODO (/metrics)
+# ==========================================================
+
+_SAMPLE = re.compile(r'^medisense_(node_duration_seconds|external_call_duration_seconds)_(sum|count)\{(.*)\} (\S+)$')
+
+
+async def scrape(client: httpx.AsyncClient, url: str) -> dict:
+    totals = defaultdict(lambda: [0.0, 0])
+    for line in (await client.get(url)).text.splitlines():
+        match = _SAMPLE.match(line)
+        if not match:
+            continue
+        _, field, labels, value = match.groups()
+        name = ".".join(v for _, v in re.findall(r'(\w+)="([^"]*)"', labels))
+        totals[name][0 if field == "sum" else 1] += float(value)
+    return totals
+
+
+def breakdown(before: dict, after: dict) -> dict:
+    result = {}
+    for name, (total, count) in after.items():
+        prev_total, prev_count = before.get(name, (0.0, 0))
+        calls = int(count - prev_count)
+        if calls:
+            result[name] = {"calls": calls, "avg_ms": round((total - prev_total) / calls * 1000, 2)}
+    return dict(sorted(result.items()))
+
+
+# ==========================================================
+# EJECUCIÓN
+# ==========================================================
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+async def run_conversation(client, app_url, inbox: Inbox, phone: str, script: list[str], sids, results, timeout):
+    to = f"whatsapp:{phone}"
+    queue = inbox.queues[to]
+    for body in script:
+        while not queue.empty():  # mensajes tardíos del turno anterior
+            queue.get_nowait()
+        sent_at = time.perf_counter()
+        await client.post(app_url, data={"From": to, "Body": body, "MessageSid": f"SM{next(sids)}"})
+        try:
+            received_at, reply = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            results["timeouts"] += 1
+            return
+        results["latencies"].append(received_at - sent_at)
+        if "alta demanda" in reply:
+            results["shed"] += 1
+    results["conversations"] += 1
+
+
+async def run_level(args, client, inbox: Inbox, level: int, sids) -> dict:
+    app_url = f"http://127.0.0.1:{args.app_port}/api/webhook"
+    metrics_url = f"http://127.0.0.1:{args.app_port}/metrics"
+    results = {"latencies": [], "timeouts": 0, "shed": 0, "conversations": 0}
+    semaphore = asyncio.Semaphore(level)
+
+    async def one(i: int):
+        async with semaphore:
+            phone = f"+519{level:03d}{i:05d}"
+            kind = CONVERSATION_MIX[i % len(CONVERSATION_MIX)]
+            script = conversation_script(kind, str(40000000 + level * 100000 + i))
+            await run_conversation(client, app_url, inbox, phone, script, sids, results, args.turn_timeout)
+
+    before = await scrape(client, metrics_url)
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.conversations)))
+    elapsed = time.perf_counter() - started
+    after = await scrape(client, metrics_url)
+
+    latencies = results["latencies"]
+    return {
+        "concurrency": level,
+        "conversations": results["conversations"],
+        "turns": len(latencies),
+        "elapsed_s": round(elapsed, 2),
+        "turns_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "conversations_per_s": round(results["conversations"] / elapsed, 3) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "shed": results["shed"],
+        "timeouts": results["timeouts"],
+        "breakdown": breakdown(before, after),
+    }
+
+
+def print_level(result: dict):
+    print(
+        f"\n📊 Concurrencia {result['concurrency']}: {result['turns']} turnos en {result['elapsed_s']} s "
+        f"→ {result['turns_per_s']} turnos/s, {result['conversations_per_s']} conversaciones/s"
+    )
+    print(f"   p50={result['p50_ms']} ms  p95={result['p95_ms']} ms  p99={result['p99_ms']} ms  "
+          f"rechazados={result['shed']}  timeouts={result['timeouts']}")
+    for name, entry in result["breakdown"].items():
+        print(f"   {name:<45} {entry['calls']:>6} llamadas  {entry['avg_ms']:>9} ms prom.")
+
+
+async def main(args):
+    random.seed(args.seed)
+    inbox = Inbox()
+    fake_server, fake_task = await start_fake_services(inbox, args.fake_port, args.backend_latency)
+    fake_base = f"http://127.0.0.1:{args.fake_port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = os.path.join(tmp, "index")
+        build_index(index_path, args.passages)
+        proc = start_app(args, fake_base, index_path)
+        try:
+            limits = httpx.Limits(max_connections=max(args.levels) * 2)
+            async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+                await wait_until_up(client, f"http://127.0.0.1:{args.app_port}/readyz")
+                sids = itertools.count(1)
+                results = []
+                for level in args.levels:
+                    result = await run_level(args, client, inbox, level, sids)
+                    print_level(result)
+                    results.append(result)
+        finally:
+            # Esperar en un hilo: el Twilio/backend falso corre en este event loop
+            # y la app todavía envía sus logs pendientes al apagarse
+            proc.terminate()
+            await asyncio.to_thread(proc.wait, 30)
+            fake_server.should_exit = True
+            await fake_task
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "config": {k: v for k, v in vars(args).items() if k != "levels"} | {"levels": args.levels},
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Resultados guardados en {args.output}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de carga de MediSense con servicios falsos")
+    parser.add_argument("--concurrency", default="1,10,50", help="Niveles de concurrencia separados por coma")
+    parser.add_argument("--conversations", type=int, default=40, help="Conversaciones por nivel")
+    parser.add_argument(
+        "--model-provider", default="bench.fakes:build_models",
+        help="MODEL_PROVIDER de la app: modelos falsos, 'record' o 'replay' (ver app/core/model_replay.py)",
+    )
+    parser.add_argument("--model-store", default="model_store.db", help="MODEL_STORE_PATH para record/replay")
+    parser.add_argument("--replay-latency", default="recorded", help="MODEL_REPLAY_LATENCY en modo replay")
+    parser.add_argument("--llm-latency", type=float, default=0.8)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--backend-latency", type=float, default=0.05)
+    parser.add_argument("--send-rate", type=float, default=1000, help="TWILIO_SEND_RATE de la app")
+    parser.add_argument("--passages", type=int, default=400, help="Fragmentos del índice sintético")
+    parser.add_argument("--no-cache", action="store_true", help="Desactiva la caché semántica")
+    parser.add_argument("--turn-timeout", type=float, default=60)
+    parser.add_argument("--app-port", type=int, default=8100)
+    parser.add_argument("--fake-port", type=int, default=8101)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Archivo JSON para comparar entre versiones")
+    parser.add_argument("--quiet", action="store_true", help="Oculta los logs de la app")
+    args = parser.parse_args()
+    args.levels = [int(x) for x in args.concurrency.split(",") if x.strip()]
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,108 @@
+# docs/scripts/dedup.py
+import hashlib
+import re
+import unicodedata
+from collections import defaultdict
+import numpy as np
+
+# Primo de Mersenne 2^61 - 1 para las permutaciones de MinHash
+_PRIME = (1 << 61) - 1
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sin puntuación y con espacios colapsados (para comparar fragmentos)."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class ChunkDeduplicator:
+    """
+    Descarta fragmentos repetidos antes de embeberlos.
+
+    - Exacto: hash del texto normalizado (encabezados, pies de página y
+      descargos legales idénticos entre PDFs).
+    - Aproximado (opcional, `near_threshold`): MinHash sobre shingles de
+      `shingle_size` palabras + LSH por bandas; un fragmento se descarta si su
+      similitud de Jaccard estimada con uno ya aceptado es >= `near_threshold`.
+
+    El modo exacto puede sembrarse con los hashes de fragmentos ya indexados
+    y el archivo dueño de cada uno (`seed`) para detectar duplicados entre
+    corridas incrementales; el modo aproximado solo compara fragmentos dentro
+    de la misma corrida.
+    """
+
+    def __init__(self, near_threshold: float | None = None, num_perm: int = 64, bands: int = 16, shingle_size: int = 5):
+        self.near_threshold = near_threshold
+        self.shingle_size = shingle_size
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(42)
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+        self._seen: dict[str, str] = {}  # hash normalizado → origen del primero
+        self._signatures: list[np.ndarray] = []
+        self._sig_sources: list[str] = []
+        self._buckets: dict[tuple, list[int]] = defaultdict(list)
+        self.report: dict[str, dict] = defaultdict(lambda: {"total": 0, "exact": 0, "near": 0, "duplicate_of": set()})
+
+    def seed(self, owners: dict[str, str]):
+        """`owners`: hash normalizado → archivo que tiene ese fragmento en el índice."""
+        for h, source in owners.items():
+            self._seen.setdefault(h, source)
+
+    def _signature(self, normalized: str) -> np.ndarray | None:
+        words = normalized.split()
+        if len(words) < self.shingle_size:
+            return None
+        shingles = {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=7).digest(), "little") for s in shingles),
+            dtype=np.uint64, count=len(shingles),
+        )
+        # (a * x + b) mod p con aritmética de 64 bits: x < 2^56 y a < 2^61 pueden
+        # desbordar, pero el desbordamiento es determinista y sigue siendo un buen hash.
+        permuted = (hashes[:, None] * self._a[None, :] + self._b[None, :]) % np.uint64(_PRIME)
+        return permuted.min(axis=0)
+
+    def check(self, text: str, source: str) -> tuple[str | None, str, str | None]:
+        """
+        Devuelve (tipo, hash, dueño): tipo es None si el fragmento es nuevo (y
+        queda registrado), o "exact" / "near" si es duplicado; dueño es el
+        archivo cuyo fragmento se conserva en el índice en su lugar.
+        """
+        entry = self.report[source]
+        entry["total"] += 1
+        normalized = normalize_text(text)
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+        if digest in self._seen:
+            entry["exact"] += 1
+            entry["duplicate_of"].add(self._seen[digest])
+            return "exact", digest, self._seen[digest]
+
+        if self.near_threshold is not None:
+            signature = self._signature(normalized)
+            if signature is not None:
+                keys = [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+                candidates = {idx for key in keys for idx in self._buckets.get(key, ())}
+                for idx in candidates:
+                    if float(np.mean(self._signatures[idx] == signature)) >= self.near_threshold:
+                        entry["near"] += 1
+                        entry["duplicate_of"].add(self._sig_sources[idx])
+                        return "near", digest, self._sig_sources[idx]
+                for key in keys:
+                    self._buckets[key].append(len(self._signatures))
+                self._signatures.append(signature)
+                self._sig_sources.append(source)
+
+        self._seen[digest] = source
+        return None, digest, None
+
+    def summary(self) -> dict:
+        """Reporte por archivo, serializable a JSON."""
+        return {
+            source: {**entry, "duplicate_of": sorted(entry["duplicate_of"])}
+            for source, entry in self.report.items()
+        }
@@ -1,9 +1,17 @@
+import argparse
+import glob
+import json
 import os
+import shutil
 import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
 # Hack para importar app.config desde scripts/
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
+from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import AzureOpenAIEmbeddings
 from azure.search.documents.indexes import SearchIndexClient
@@ -14,29 +22,270 @@ from azure.search.documents.indexes.models import (
 from azure.search.documents import SearchClient
 from azure.core.credentials import AzureKeyCredential
 from app.config import settings
-import uuid
+from app.core.local_index import LocalIndexWriter, LocalVectorIndex
+from app.core.resilience import backoff_delay
+from manifest import IngestManifest, chunk_ids
+from dedup import ChunkDeduplicator
+import openai
 
-def run_ingest():
+# Documentos por llamada a upload_documents
+UPLOAD_BATCH = 50
+# Lotes de subida pendientes como máximo (acota la memoria de la etapa de subida)
+MAX_PENDING_UPLOADS = 4
+
+
+def load_and_split(path: str) -> list[tuple[str, dict]]:
+    """
+    Se ejecuta en un proceso del pool: parsea el PDF página a página y pasa
+    cada página por el splitter. Devuelve (texto, metadata) por fragmento.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    chunks = []
+    for page in PyPDFLoader(path).lazy_load():
+        for chunk in splitter.split_documents([page]):
+            chunks.append((chunk.page_content, chunk.metadata))
+    return chunks
+
+
+def parse_files(files: list[dict], workers: int):
+    """
+    Etapa 1: parsea los PDFs en un pool de procesos (escala con los núcleos).
+    Como máximo `workers * 2` archivos en vuelo: la memoria no depende del
+    tamaño del corpus. Genera (info, fragmentos) en orden de llegada.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        queue = deque()
+        for info in files:
+            queue.append((info, pool.submit(load_and_split, info["path"])))
+            if len(queue) >= workers * 2:
+                done_info, future = queue.popleft()
+                yield done_info, future.result()
+        while queue:
+            done_info, future = queue.popleft()
+            yield done_info, future.result()
+
+
+def run_ingest(
+    target: str = "azure",
+    embed_batch: int = 64,
+    concurrency: int = 4,
+    full: bool = False,
+    workers: int | None = None,
+    dedup_mode: str = "exact",
+    near_threshold: float = 0.9,
+):
     print("🚀 Iniciando Ingesta de Documentos...")
     
-    # 1. Cargar PDFs
+    # 1. Detectar PDFs nuevos / modificados / eliminados (manifiesto por destino)
     path = "docs"
     if not os.path.exists(path): os.makedirs(path)
-    loader = DirectoryLoader(path, glob="*.pdf", loader_cls=PyPDFLoader)
-    docs = loader.load()
-    if not docs:
+    pdfs = sorted(glob.glob(os.path.join(path, "*.pdf")))
+    manifest_path = os.path.join(path, f".ingest_manifest.{target}.json")
+    manifest = IngestManifest(manifest_path) if full else IngestManifest.load(manifest_path)
+    if full:
+        # Ingesta completa: se borra todo lo que indexó la corrida anterior
+        previous_ids = IngestManifest.load(manifest_path).all_chunk_ids()
+    else:
+        previous_ids = set()
+
+    changed = manifest.changed_files(pdfs)
+    removed = manifest.removed_files(pdfs)
+    # Archivos sin cambios cuyos duplicados omitidos pertenecían a uno que
+    # cambia o se elimina: se reprocesan para conservar ese contenido
+    dependents = manifest.dependents([info["path"] for info in changed] + removed, pdfs)
+    if not pdfs and not removed:
         print("❌ No hay PDFs en la carpeta 'docs/'.")
         return
+    print(f"🗂️ {len(pdfs)} PDFs: {len(changed)} nuevos/modificados, {len(removed)} eliminados.")
+    if dependents:
+        print(f"🔗 {len(dependents)} PDFs sin cambios se reprocesan por duplicados compartidos.")
+        changed = changed + dependents
+    if not changed and not removed and not previous_ids:
+        manifest.save()
+        print("✅ Índice al día: no hay cambios.")
+        return
 
-    # 2. Split
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    chunks = splitter.split_documents(docs)
-    print(f"📦 Procesando {len(chunks)} fragmentos...")
+    # 2. Destinos: Azure AI Search y/o índice local (app/core/local_index.py).
+    #    El índice local se reescribe en un directorio temporal y se reemplaza al final.
+    search_client = setup_azure_index() if target in ("azure", "both") else None
+    local_writer = None
+    if target in ("local", "both"):
+        local_writer = LocalIndexWriter(settings.LOCAL_INDEX_PATH + ".tmp", dtype=settings.LOCAL_INDEX_DTYPE)
+
+    stale_ids = set(previous_ids)
+    written_ids = set()
+
+    # Deduplicación: los hashes de los archivos que no cambian cuentan como ya vistos
+    dedup = None
+    if dedup_mode != "off":
+        dedup = ChunkDeduplicator(near_threshold=near_threshold if dedup_mode == "near" else None)
+        dedup.seed(manifest.content_owners(exclude=[info["path"] for info in changed] + removed))
+
+    def pending_chunks():
+        """
+        Etapa 2: por cada PDF parseado, calcula ids y deja pasar solo los
+        fragmentos que el índice todavía no tiene. Es un generador: los
+        fragmentos fluyen al embedder sin acumularse en memoria.
+        """
+        for info, chunks in parse_files(changed, workers or os.cpu_count() or 1):
+            ids = chunk_ids(info["path"], [text for text, _ in chunks])
+            old_ids = set(manifest.chunk_ids(info["path"]))
+            kept_ids, kept_hashes, owners = [], [], set()
+            for cid, (text, metadata) in zip(ids, chunks):
+                if dedup:
+                    duplicate, digest, owner = dedup.check(text, info["path"])
+                    if duplicate:
+                        if owner != info["path"]:
+                            owners.add(owner)
+                        continue
+                    kept_hashes.append(digest)
+                kept_ids.append(cid)
+                if cid not in old_ids:
+                    yield cid, text, metadata
+            stale_ids.update(old_ids - set(kept_ids))
+            manifest.update(info, kept_ids, kept_hashes, depends_on=owners)
+
+    # 3. Embed & Upload (en paralelo: lotes de embeddings concurrentes y
+    #    subida a Azure solapada con el embedding de los siguientes lotes)
+    embeddings = AzureOpenAIEmbeddings(
+        azure_deployment=settings.AZURE_EMBEDDING_DEPLOYMENT,
+        openai_api_version=settings.AZURE_API_VERSION,
+        azure_endpoint=settings.AZURE_ENDPOINT,
+        api_key=settings.AZURE_API_KEY,
+        chunk_size=embed_batch,
+        max_retries=0,  # los reintentos (429) los gestiona embed_with_backoff
+    )
+
+    start = time.perf_counter()
+    done = 0
+    batch = []
+    uploads = deque()
+    with ThreadPoolExecutor(max_workers=concurrency) as embed_pool, \
+            ThreadPoolExecutor(max_workers=1) as upload_pool:
+        for group, vectors in embed_in_batches(embed_pool, embeddings, pending_chunks(), embed_batch, concurrency):
+            for (cid, text, metadata), vector in zip(group, vectors):
+                doc = {
+                    "id": cid,
+                    "content": text,
+                    "source": metadata.get("source", "unknown"),
+                    "content_vector": vector
+                }
+                written_ids.add(cid)
+                if local_writer:
+                    local_writer.add(doc["id"], doc["content"], doc["source"], vector)
+                if search_client:
+                    batch.append(doc)
+                    if len(batch) >= UPLOAD_BATCH:
+                        uploads.append(upload_pool.submit(search_client.upload_documents, batch))
+                        batch = []
+                        # Cola acotada: si la subida va atrasada, el embedding espera
+                        while len(uploads) > MAX_PENDING_UPLOADS:
+                            uploads.popleft().result()
+
+            done += len(group)
+            elapsed = time.perf_counter() - start
+            print(f"⚡ {done} fragmentos ({done / elapsed:.1f} chunks/s)", flush=True)
+
+        if batch:
+            uploads.append(upload_pool.submit(search_client.upload_documents, batch))
+        while uploads:
+            uploads.popleft().result()  # propaga errores de subida
+
+    # 4. Archivos eliminados y fragmentos obsoletos
+    for removed_path in removed:
+        stale_ids.update(manifest.chunk_ids(removed_path))
+        manifest.remove(removed_path)
+    live_ids = manifest.all_chunk_ids()
+    stale_ids -= live_ids
+
+    if search_client and stale_ids:
+        stale = sorted(stale_ids)
+        for i in range(0, len(stale), UPLOAD_BATCH * 20):
+            search_client.delete_documents(documents=[{"id": cid} for cid in stale[i:i + UPLOAD_BATCH * 20]])
+        print(f"🧹 {len(stale)} fragmentos obsoletos eliminados de Azure Search.")
+
+    if local_writer:
+        # Conservar las filas vigentes del índice anterior sin re-embeberlas
+        for row, vector in LocalVectorIndex.read_rows(settings.LOCAL_INDEX_PATH):
+            if row["id"] in live_ids and row["id"] not in written_ids:
+                local_writer.add(row["id"], row["content"], row["source"], vector)
+        local_writer.close()
+        replace_dir(local_writer.path, settings.LOCAL_INDEX_PATH)
+        print(f"💾 Índice local escrito en '{settings.LOCAL_INDEX_PATH}' ({local_writer.count} fragmentos).")
 
-    # 3. Setup Azure Search
+    if dedup:
+        write_dedup_report(dedup, os.path.join(path, f".ingest_dedup_report.{target}.json"))
+
+    # El manifiesto se guarda solo si todo salió bien
+    manifest.save()
+    elapsed = time.perf_counter() - start
+    print(f"✅ Ingesta Completada: {done} fragmentos nuevos en {elapsed:.1f}s ({done / max(elapsed, 1e-9):.1f} chunks/s).")
+
+
+def write_dedup_report(dedup: ChunkDeduplicator, report_path: str):
+    summary = dedup.summary()
+    skipped = 0
+    for source, entry in summary.items():
+        duplicates = entry["exact"] + entry["near"]
+        skipped += duplicates
+        if duplicates:
+            print(
+                f"♻️ {source}: {duplicates}/{entry['total']} fragmentos duplicados "
+                f"({entry['exact']} exactos, {entry['near']} aproximados)"
+            )
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(f"♻️ {skipped} fragmentos duplicados omitidos. Reporte: {report_path}")
+
+
+def replace_dir(src: str, dst: str):
+    """Reemplaza `dst` por `src` (el índice viejo se borra después del cambio)."""
+    old = dst + ".old"
+    if os.path.exists(dst):
+        os.replace(dst, old)
+    os.replace(src, dst)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def embed_in_batches(pool, embeddings, items, batch_size: int, concurrency: int):
+    """
+    Genera ([(id, texto, metadata)], vectores) por lote, en orden. Consume
+    `items` de forma perezosa y mantiene como máximo `concurrency` llamadas
+    a embed_documents en vuelo a la vez.
+    """
+    items = iter(items)
+    pending = deque()
+    while True:
+        group = list(islice(items, batch_size))
+        if not group:
+            break
+        texts = [text for _, text, _ in group]
+        pending.append((group, pool.submit(embed_with_backoff, embeddings, texts)))
+        if len(pending) >= concurrency:
+            group_done, future = pending.popleft()
+            yield group_done, future.result()
+    while pending:
+        group_done, future = pending.popleft()
+        yield group_done, future.result()
+
+
+def embed_with_backoff(embeddings, texts: list[str], max_retries: int = 6) -> list[list[float]]:
+    """embed_documents con reintentos y backoff exponencial (jitter) ante 429 / errores transitorios."""
+    for attempt in range(max_retries + 1):
+        try:
+            return embeddings.embed_documents(texts)
+        except (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError) as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt, base=1.0, cap=60.0)
+            print(f"⏳ {type(e).__name__}: reintentando lote de {len(texts)} en {delay:.1f}s")
+            time.sleep(delay)
+
+
+def setup_azure_index() -> SearchClient:
     cred = AzureKeyCredential(settings.SEARCH_KEY)
     index_client = SearchIndexClient(settings.SEARCH_ENDPOINT, cred)
-    
+
     # Definir índice
     fields = [
         SimpleField(name="id", type=SearchFieldDataType.String, key=True),
@@ -52,32 +301,31 @@ def run_ingest():
     index = SearchIndex(name=settings.SEARCH_INDEX, fields=fields, vector_search=vector_search)
     index_client.create_or_update_index(index)
 
-    # 4. Embed & Upload
-    embeddings = AzureOpenAIEmbeddings(
-        azure_deployment=settings.AZURE_EMBEDDING_DEPLOYMENT,
-        openai_api_version=settings.AZURE_API_VERSION,
-        azure_endpoint=settings.AZURE_ENDPOINT,
-        api_key=settings.AZURE_API_KEY
-    )
-    
-    search_client = SearchClient(settings.SEARCH_ENDPOINT, settings.SEARCH_INDEX, cred)
-    
-    batch = []
-    for chunk in chunks:
-        vector = embeddings.embed_query(chunk.page_content)
-        batch.append({
-            "id": str(uuid.uuid4()),
-            "content": chunk.page_content,
-            "source": chunk.metadata.get("source", "unknown"),
-            "content_vector": vector
-        })
-        if len(batch) >= 50:
-            search_client.upload_documents(batch)
-            batch = []
-            print(".", end="", flush=True)
-            
-    if batch: search_client.upload_documents(batch)
-    print("\n✅ Ingesta Completada.")
+    return SearchClient(settings.SEARCH_ENDPOINT, settings.SEARCH_INDEX, cred)
+
 
 if __name__ == "__main__":
-    run_ingest()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ingesta de PDFs de docs/ al índice de búsqueda.")
+    parser.add_argument(
+        "--target", choices=["azure", "local", "both"], default="azure",
+        help="Dónde escribir los fragmentos: Azure AI Search, el índice local (LOCAL_INDEX_PATH) o ambos.",
+    )
+    parser.add_argument("--embed-batch", type=int, default=64, help="Textos por llamada a embed_documents.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Llamadas de embedding simultáneas.")
+    parser.add_argument("--full", action="store_true", help="Ignora el manifiesto y re-ingiere todo.")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos para parsear PDFs (por defecto, n.º de núcleos).")
+    parser.add_argument(
+        "--dedup", choices=["off", "exact", "near"], default="exact",
+        help="Omitir fragmentos duplicados: solo idénticos (exact) o también casi idénticos (near, MinHash).",
+    )
+    parser.add_argument("--near-threshold", type=float, default=0.9, help="Jaccard mínimo para considerar casi duplicado.")
+    args = parser.parse_args()
+    run_ingest(
+        target=args.target,
+        embed_batch=args.embed_batch,
+        concurrency=args.concurrency,
+        full=args.full,
+        workers=args.workers,
+        dedup_mode=args.dedup,
+        near_threshold=args.near_threshold,
+    )
@@ -0,0 +1,130 @@
+# docs/scripts/manifest.py
+import hashlib
+import json
+import os
+from collections import Counter
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_ids(source: str, texts: list[str]) -> list[str]:
+    """
+    Ids deterministas por contenido: hash(origen + hash del texto + n.º de
+    aparición de ese mismo texto en el archivo). Un fragmento que no cambia
+    conserva su id aunque se edite otra parte del PDF.
+    """
+    seen = Counter()
+    ids = []
+    for text in texts:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        occurrence = seen[digest]
+        seen[digest] += 1
+        ids.append(hashlib.sha256(f"{source}\0{digest}\0{occurrence}".encode("utf-8")).hexdigest()[:40])
+    return ids
+
+
+class IngestManifest:
+    """
+    Registro local de lo ya ingerido:
+        {"files": {ruta: {"sha256", "mtime", "size", "chunk_ids": [...], "hashes": [...],
+                          "depends_on": [...]}}}
+
+    `hashes` son los hashes del texto normalizado de cada fragmento indexado
+    (ver dedup.py); sirven para detectar duplicados contra lo ya ingerido.
+    `depends_on` son los archivos dueños de los fragmentos que este archivo
+    omitió por duplicados: si uno de ellos cambia o se elimina, este archivo
+    debe reprocesarse para que ese contenido no desaparezca del índice.
+
+    Permite que una re-ingesta procese solo archivos nuevos o modificados y
+    borre del índice los fragmentos de archivos eliminados o cambiados.
+    """
+
+    def __init__(self, path: str, files: dict | None = None):
+        self.path = path
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, path: str) -> "IngestManifest":
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                return cls(path, json.load(f).get("files", {}))
+        return cls(path)
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f)
+        os.replace(tmp, self.path)
+
+    def changed_files(self, paths: list[str]) -> list[dict]:
+        """
+        Devuelve los archivos nuevos o modificados con su info (sha256, mtime, size).
+        Si mtime y tamaño coinciden no se vuelve a leer el archivo; si solo cambió
+        el mtime pero el hash es igual, se actualiza el manifiesto y se omite.
+        """
+        changed = []
+        for path in paths:
+            stat = os.stat(path)
+            entry = self.files.get(path)
+            if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                continue
+            sha = file_sha256(path)
+            if entry and entry["sha256"] == sha:
+                entry["mtime"], entry["size"] = stat.st_mtime, stat.st_size
+                continue
+            changed.append({"path": path, "sha256": sha, "mtime": stat.st_mtime, "size": stat.st_size})
+        return changed
+
+    def removed_files(self, paths: list[str]) -> list[str]:
+        current = set(paths)
+        return [path for path in self.files if path not in current]
+
+    def chunk_ids(self, path: str) -> list[str]:
+        entry = self.files.get(path)
+        return entry["chunk_ids"] if entry else []
+
+    def all_chunk_ids(self) -> set[str]:
+        return {cid for entry in self.files.values() for cid in entry["chunk_ids"]}
+
+    def content_owners(self, exclude=()) -> dict[str, str]:
+        """Hash normalizado → archivo que lo tiene indexado (sin los archivos excluidos)."""
+        excluded = set(exclude)
+        return {
+            h: path for path, entry in self.files.items() if path not in excluded for h in entry.get("hashes", [])
+        }
+
+    def dependents(self, paths, current: list[str]) -> list[dict]:
+        """
+        Archivos vigentes sin cambios que omitieron duplicados de alguno de
+        `paths`, directa o indirectamente. Se devuelven con la misma info que
+        `changed_files` para reprocesarlos.
+        """
+        affected = set(paths)
+        found = []
+        pending = True
+        while pending:
+            pending = False
+            for path in current:
+                entry = self.files.get(path)
+                if path in affected or not entry:
+                    continue
+                if affected & set(entry.get("depends_on", [])):
+                    affected.add(path)
+                    found.append({"path": path, "sha256": entry["sha256"], "mtime": entry["mtime"], "size": entry["size"]})
+                    pending = True
+        return found
+
+    def update(self, info: dict, ids: list[str], hashes: list[str] | None = None, depends_on=()):
+        self.files[info["path"]] = {
+            "sha256": info["sha256"], "mtime": info["mtime"], "size": info["size"],
+            "chunk_ids": ids, "hashes": hashes or [], "depends_on": sorted(set(depends_on)),
+        }
+
+    def remove(self, path: str):
+        self.files.pop(path, None)
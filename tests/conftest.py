@@ -0,0 +1,21 @@
+# tests/conftest.py
+"""
+Configuración común de las pruebas: la app se importa con los modelos falsos
+de bench/fakes.py y sin servicios externos (ni Azure, ni Twilio, ni backend).
+"""
+import os
+
+os.environ.update({
+    "MODEL_PROVIDER": "bench.fakes:build_models",
+    "BENCH_LLM_LATENCY": "0",
+    "BENCH_LLM_JITTER": "0",
+    "BENCH_EMBED_LATENCY": "0",
+    "BUSINESS_BACKEND_URL": "http://127.0.0.1:9/api",
+    "TWILIO_SID": "ACtest",
+    "TWILIO_TOKEN": "test",
+    "TWILIO_WHATSAPP_NUMBER": "whatsapp:+10000000000",
+    "AZURE_SEARCH_SERVICE_ENDPOINT": "",
+    "AZURE_SEARCH_API_KEY": "",
+    "SESSION_BACKEND": "memory",
+    "WEBHOOK_DEDUP_BACKEND": "memory",
+})
@@ -0,0 +1,105 @@
+# tests/test_availability.py
+import asyncio
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from app.core.availability import SLOT_FORMAT, AvailabilityIndex
+
+LIMA = ZoneInfo("America/Lima")
+
+
+def _day(offset: int = 2) -> datetime:
+    """Un día futuro a medianoche en la hora de la clínica."""
+    day = datetime.now(LIMA).date() + timedelta(days=offset)
+    return datetime.combine(day, datetime.min.time(), tzinfo=LIMA)
+
+
+def _index(calendar: dict | None, **kwargs) -> AvailabilityIndex:
+    async def fetch(start, days):
+        return calendar
+
+    index = AvailabilityIndex(fetch, timezone="America/Lima", **kwargs)
+    asyncio.run(index.refresh())
+    return index
+
+
+def _calendar(day: datetime, booked_hours=(), utc_offset: bool = True) -> dict:
+    fmt = (lambda dt: dt.isoformat()) if utc_offset else (lambda dt: dt.replace(tzinfo=None).isoformat())
+    return {"specialties": {"Cardiología": {
+        "open": [{"start": fmt(day.replace(hour=9)), "end": fmt(day.replace(hour=12))}],
+        "booked": [{"start": fmt(day.replace(hour=h)), "end": fmt(day.replace(hour=h + 1))} for h in booked_hours],
+    }}}
+
+
+def test_slots_skip_bookings_and_use_clinic_time():
+    day = _day()
+    index = _index(_calendar(day, booked_hours=[10]))
+    slots = index.free_slots("Cardiología", limit=5)
+    assert [s["start"] for s in slots] == [
+        day.replace(hour=9).strftime(SLOT_FORMAT),
+        day.replace(hour=11).strftime(SLOT_FORMAT),
+    ]
+    assert slots[0]["label"].endswith("de 09:00 a 10:00")
+    assert index.stats()["fallback"] == 0
+
+
+def test_naive_backend_times_are_clinic_time():
+    day = _day()
+    index = _index(_calendar(day, utc_offset=False))
+    assert index.free_slots("Cardiología", limit=1)[0]["start"] == day.replace(hour=9).strftime(SLOT_FORMAT)
+
+
+def test_hold_blocks_other_phones_until_released():
+    day = _day()
+    index = _index(_calendar(day))
+    start = day.replace(hour=9).strftime(SLOT_FORMAT)
+
+    assert index.hold("Cardiología", start, "+51900000001")
+    assert not index.hold("Cardiología", start, "+51900000002")
+    assert start not in [s["start"] for s in index.free_slots("Cardiología", phone="+51900000002")]
+    assert start in [s["start"] for s in index.free_slots("Cardiología", phone="+51900000001")]
+
+    index.release("+51900000001")
+    assert index.hold("Cardiología", start, "+51900000002")
+
+
+def test_hold_expires():
+    day = _day()
+    index = _index(_calendar(day), hold_seconds=0)
+    start = day.replace(hour=9).strftime(SLOT_FORMAT)
+    assert index.hold("Cardiología", start, "+51900000001")
+    time.sleep(0.01)
+    assert index.hold("Cardiología", start, "+51900000002")
+    index._expire_holds()
+    assert index.stats()["holds"] == 0
+
+
+def test_book_removes_slot_until_backend_reflects_it():
+    day = _day()
+    calendar = _calendar(day)
+    index = _index(calendar)
+    start = day.replace(hour=9).strftime(SLOT_FORMAT)
+    assert index.hold("Cardiología", start, "+51900000001")
+    index.book("Cardiología", start, "+51900000001")
+
+    assert start not in [s["start"] for s in index.free_slots("Cardiología")]
+    assert index.stats()["holds"] == 0
+    # Un refresco que aún no trae la reserva no la vuelve a ofrecer
+    asyncio.run(index.refresh())
+    assert start not in [s["start"] for s in index.free_slots("Cardiología")]
+
+
+def test_hold_rejects_missing_past_and_too_soon_slots():
+    index = _index(None, lead_minutes=60)
+    now = datetime.now(LIMA)
+    assert not index.hold("Cardiología", None, "+51900000001")
+    assert not index.hold("Cardiología", "mañana a las 9", "+51900000001")
+    for when in (now - timedelta(hours=1), now + timedelta(minutes=30)):
+        assert not index.hold("Cardiología", when.strftime(SLOT_FORMAT), "+51900000001")
+
+
+def test_fallback_is_flagged():
+    index = _index(None, work_hours="09:00-11:00", work_days="0,1,2,3,4,5,6")
+    slots = index.free_slots("Cardiología", limit=10)
+    assert slots and all(s["label"].endswith(("09:00 a 10:00", "10:00 a 11:00")) for s in slots)
+    assert index.fallback and index.stats()["fallback"] == 1
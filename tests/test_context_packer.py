@@ -0,0 +1,46 @@
+# tests/test_context_packer.py
+import pytest
+from app.core import context_packer
+from app.core.context_packer import count_tokens, pack_context, pack_history, truncate_tokens
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # Presupuestos deterministas: ~4 caracteres por token, sin depender de tiktoken
+    monkeypatch.setattr(context_packer, "_encoding", None)
+
+
+def _passage(source: str, content: str, score: float) -> dict:
+    return {"source": source, "content": content, "score": score}
+
+
+def test_context_fits_the_budget_and_prefers_higher_scores():
+    passages = [
+        _passage("baja", "La migraña se trata con reposo. " * 10, 0.2),
+        _passage("alta", "El dolor de cabeza tensional mejora con hidratación. " * 10, 0.9),
+    ]
+    context = pack_context("dolor de cabeza", passages, budget=60)
+    assert count_tokens(context) <= 60
+    assert context.startswith("--- Fuente: alta ---")
+
+
+def test_near_duplicate_passages_are_dropped():
+    text = "La hidratación ayuda con el dolor de cabeza y el cansancio."
+    passages = [_passage("a", text, 0.9), _passage("b", text + " ", 0.8), _passage("c", "Dormir bien ayuda al dolor.", 0.5)]
+    context = pack_context("dolor", passages, budget=500)
+    assert "Fuente: a" in context and "Fuente: b" not in context and "Fuente: c" in context
+
+
+def test_oversized_first_sentence_is_truncated_instead_of_dropped():
+    passages = [_passage("a", "dolor " * 400 + "final.", 0.9)]
+    context = pack_context("dolor", passages, budget=40)
+    assert context and context.rstrip().endswith("…")
+    assert count_tokens(context) <= 40
+
+
+def test_truncate_and_history_budget():
+    assert truncate_tokens("uno dos tres cuatro cinco", 2) == "uno dos"  # 8 caracteres
+    assert truncate_tokens("texto", 0) == ""
+    history = ["User: primera línea larga " * 3, "AI: respuesta", "User: última"]
+    packed = pack_history(history, budget=10)
+    assert packed.endswith("User: última") and "primera" not in packed
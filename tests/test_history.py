@@ -0,0 +1,34 @@
+# tests/test_history.py
+from app.core.history import append_turn, drop_summarized
+
+
+def _turns(state: dict, start: int, count: int, buffer_limit: int = 4) -> dict:
+    for i in range(start, start + count):
+        state = append_turn(state, f"u{i}", f"a{i}", max_lines=2, buffer_limit=buffer_limit)
+    return state
+
+
+def test_history_is_a_ring_buffer_feeding_the_summary_buffer():
+    state = _turns({}, 0, 3)
+    assert state["history"] == ["User: u2", "AI: a2"]
+    assert state["summary_buffer"] == ["User: u0", "AI: a0", "User: u1", "AI: a1"]
+    assert state["summary_seq"] == 4
+
+
+def test_drop_summarized_keeps_only_newer_lines():
+    snapshot = _turns({}, 0, 2)  # buffer: u0, a0
+    state = _turns(snapshot, 2, 1)  # + u1, a1
+    assert drop_summarized(state, snapshot["summary_seq"]) == ["User: u1", "AI: a1"]
+
+
+def test_drop_summarized_after_the_cap_evicted_summarized_lines():
+    snapshot = _turns({}, 0, 3)  # buffer lleno: u0, a0, u1, a1
+    # Mientras se resume llegan más turnos y el tope descarta u0..a0
+    state = _turns(snapshot, 3, 1)
+    assert state["summary_buffer"] == ["User: u1", "AI: a1", "User: u2", "AI: a2"]
+    assert drop_summarized(state, snapshot["summary_seq"]) == ["User: u2", "AI: a2"]
+
+
+def test_drop_summarized_without_new_lines_empties_the_buffer():
+    snapshot = _turns({}, 0, 3)
+    assert drop_summarized(snapshot, snapshot["summary_seq"]) == []
@@ -0,0 +1,62 @@
+# tests/test_idempotency.py
+import asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import webhook
+from app.core.concurrency import KeyedMailbox
+from app.core.idempotency import MemoryMessageDeduplicator, SQLiteMessageDeduplicator
+
+
+def _claims(dedup, sids: list[str]) -> list[bool]:
+    async def run():
+        return [await dedup.claim(sid) for sid in sids]
+
+    return asyncio.run(run())
+
+
+def test_memory_claim_release_and_ttl():
+    dedup = MemoryMessageDeduplicator(ttl=60)
+    assert _claims(dedup, ["SM1", "SM1", "SM2"]) == [True, False, True]
+    asyncio.run(dedup.release("SM1"))
+    assert _claims(dedup, ["SM1"]) == [True]
+    assert dedup.stats()["duplicates"] == 1
+
+    expired = MemoryMessageDeduplicator(ttl=0)
+    assert _claims(expired, ["SM1", "SM1"]) == [True, True]
+
+
+def test_sqlite_claim_release_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "dedup.db")
+    first, second = SQLiteMessageDeduplicator(path), SQLiteMessageDeduplicator(path)
+    assert _claims(first, ["SM1"]) == [True]
+    assert _claims(second, ["SM1"]) == [False]
+    asyncio.run(first.release("SM1"))
+    assert _claims(second, ["SM1"]) == [True]
+    asyncio.run(first.close())
+    asyncio.run(second.close())
+
+
+def test_webhook_releases_the_claim_when_it_fails(monkeypatch):
+    dispatched = []
+
+    async def flaky_dispatch(user_phone, body, sender):
+        dispatched.append(body)
+        if len(dispatched) == 1:
+            raise RuntimeError("sesión no disponible")
+
+    mailboxes = KeyedMailbox(5)
+    monkeypatch.setattr(webhook, "message_dedup", MemoryMessageDeduplicator())
+    monkeypatch.setattr(webhook, "mailboxes", mailboxes)
+    monkeypatch.setattr(webhook, "dispatch", flaky_dispatch)
+
+    app = FastAPI()
+    app.include_router(webhook.router, prefix="/api")
+    client = TestClient(app, raise_server_exceptions=False)
+    form = {"From": "whatsapp:+51900000001", "Body": "hola", "MessageSid": "SM1"}
+
+    assert client.post("/api/webhook", data=form).status_code == 500
+    assert mailboxes.stats()["active_keys"] == 0
+    # El reintento de Twilio se procesa; uno posterior ya es duplicado
+    assert client.post("/api/webhook", data=form).status_code == 200
+    assert client.post("/api/webhook", data=form).status_code == 200
+    assert dispatched == ["hola", "hola"]
@@ -0,0 +1,25 @@
+# tests/test_import_time.py
+import os
+from bench.import_time import measure, total_seconds
+
+# Presupuesto en segundos; en máquinas de CI lentas se puede subir por variable
+BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "1.5"))
+
+
+def test_import_app_within_budget():
+    total = total_seconds(measure("app.main"), "app.main")
+    assert total <= BUDGET, f"import app.main tardó {total:.3f}s (presupuesto {BUDGET:.3f}s)"
+
+
+def test_import_app_opens_no_files(tmp_path):
+    # Con los backends SQLite configurados, importar no debe crear ni abrir archivos
+    env = {
+        **os.environ,
+        "SESSION_BACKEND": "sqlite",
+        "WEBHOOK_DEDUP_BACKEND": "sqlite",
+        "SESSION_SQLITE_PATH": str(tmp_path / "sessions.db"),
+        "EMBEDDING_CACHE_PATH": str(tmp_path / "embeddings.db"),
+        "MODEL_STORE_PATH": str(tmp_path / "model_store.db"),
+    }
+    measure("app.main", env=env)
+    assert list(tmp_path.iterdir()) == []
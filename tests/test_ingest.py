@@ -0,0 +1,83 @@
+# tests/test_ingest.py
+import os
+import sys
+
+# Los scripts de ingesta se ejecutan desde docs/scripts (imports planos)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "docs", "scripts"))
+
+from dedup import ChunkDeduplicator  # noqa: E402
+from manifest import IngestManifest, chunk_ids  # noqa: E402
+
+
+def _write(path, content: bytes, mtime: float | None = None):
+    path.write_bytes(content)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_chunk_ids_are_stable_per_content_and_occurrence():
+    first = chunk_ids("a.pdf", ["uno", "dos", "uno"])
+    assert first == chunk_ids("a.pdf", ["uno", "dos", "uno"])
+    assert len(set(first)) == 3
+    # Editar otro fragmento no cambia el id de "uno"
+    assert chunk_ids("a.pdf", ["uno", "tres"])[0] == first[0]
+    assert chunk_ids("b.pdf", ["uno"])[0] != first[0]
+
+
+def test_changed_and_removed_files(tmp_path):
+    a = _write(tmp_path / "a.pdf", b"A", mtime=1000)
+    b = _write(tmp_path / "b.pdf", b"B", mtime=1000)
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    for info in manifest.changed_files([a, b]):
+        manifest.update(info, chunk_ids(info["path"], ["x"]))
+    manifest.save()
+
+    manifest = IngestManifest.load(str(tmp_path / "manifest.json"))
+    assert manifest.changed_files([a, b]) == []
+    # Solo cambió el mtime: mismo hash, no se reprocesa
+    _write(tmp_path / "a.pdf", b"A", mtime=2000)
+    assert manifest.changed_files([a, b]) == []
+    assert manifest.files[a]["mtime"] == 2000
+    # Cambió el contenido
+    _write(tmp_path / "b.pdf", b"B2", mtime=2000)
+    assert [info["path"] for info in manifest.changed_files([a, b])] == [b]
+    assert manifest.removed_files([a]) == [b]
+
+
+def test_dedup_reports_the_owner_of_duplicates():
+    dedup = ChunkDeduplicator(near_threshold=0.8)
+    assert dedup.check("Aviso legal: uso exclusivo clínico.", "a.pdf")[0] is None
+    kind, _, owner = dedup.check("  AVISO LEGAL, uso exclusivo clínico  ", "b.pdf")
+    assert (kind, owner) == ("exact", "a.pdf")
+
+    text = "el paciente con fiebre alta y dolor de cabeza debe hidratarse y descansar en casa"
+    assert dedup.check(text, "a.pdf")[0] is None
+    kind, _, owner = dedup.check(text + " hoy", "c.pdf")
+    assert (kind, owner) == ("near", "a.pdf")
+    assert dedup.summary()["b.pdf"]["duplicate_of"] == ["a.pdf"]
+
+
+def test_seeded_duplicates_point_to_the_indexed_owner():
+    first = ChunkDeduplicator()
+    _, digest, _ = first.check("Encabezado común", "a.pdf")
+
+    second = ChunkDeduplicator()
+    second.seed({digest: "a.pdf"})
+    assert second.check("encabezado común", "b.pdf")[::2] == ("exact", "a.pdf")
+
+
+def test_dependents_of_a_changed_owner_are_reprocessed(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    info = lambda path: {"path": path, "sha256": path, "mtime": 1, "size": 1}  # noqa: E731
+    manifest.update(info("a.pdf"), ["1"], ["h1"])
+    manifest.update(info("b.pdf"), ["2"], ["h2"], depends_on=["a.pdf"])  # omitió h1 (de a.pdf)
+    manifest.update(info("c.pdf"), ["3"], ["h3"], depends_on=["b.pdf"])  # omitió h2 (de b.pdf)
+    manifest.update(info("d.pdf"), ["4"], ["h4"])
+
+    assert manifest.content_owners(exclude=["a.pdf"]) == {"h2": "b.pdf", "h3": "c.pdf", "h4": "d.pdf"}
+    # Si a.pdf cambia o se elimina, b.pdf (y transitivamente c.pdf) deben reprocesarse
+    found = manifest.dependents(["a.pdf"], ["a.pdf", "b.pdf", "c.pdf", "d.pdf"])
+    assert [f["path"] for f in found] == ["b.pdf", "c.pdf"]
+    # Un archivo ya eliminado no se reprocesa
+    assert [f["path"] for f in manifest.dependents(["a.pdf"], ["b.pdf"])] == ["b.pdf"]
@@ -0,0 +1,65 @@
+# tests/test_knowledge.py
+import asyncio
+import threading
+from app.core import knowledge as knowledge_module
+from app.core.knowledge import KnowledgeBase
+
+
+class _FakeIndex:
+    def __init__(self):
+        self.threads = []
+
+    def search(self, query, vector, top=3):
+        self.threads.append(threading.get_ident())
+        return [{"source": "protocolo", "content": query, "score": 1.0}]
+
+
+def test_cold_searches_load_once_and_run_off_the_event_loop(monkeypatch):
+    kb = KnowledgeBase()
+    index = _FakeIndex()
+    loads = []
+
+    def fake_ensure_loaded():
+        loads.append(threading.get_ident())
+        kb.local_index = index
+        kb._loaded = True
+
+    async def fake_embed(query, fn):
+        return [0.0, 1.0]
+
+    monkeypatch.setattr(kb, "_ensure_loaded", fake_ensure_loaded)
+    monkeypatch.setattr(knowledge_module.embedding_cache, "aembed", fake_embed)
+    monkeypatch.setattr(knowledge_module.settings, "RETRIEVAL_BACKEND", "local")
+
+    async def run():
+        loop_thread = threading.get_ident()
+        results = await asyncio.gather(*(kb.search_passages(f"q{i}") for i in range(5)))
+        return loop_thread, results
+
+    loop_thread, results = asyncio.run(run())
+    assert len(loads) == 1 and loads[0] != loop_thread
+    assert len(index.threads) == 5 and loop_thread not in index.threads
+    assert [r[0]["content"] for r in results] == [f"q{i}" for i in range(5)]
+
+
+def test_failed_load_is_retried_on_next_search(monkeypatch):
+    kb = KnowledgeBase()
+    attempts = []
+
+    def flaky_ensure_loaded():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("índice no disponible")
+        kb.local_index = _FakeIndex()
+        kb._loaded = True
+
+    async def fake_embed(query, fn):
+        return [0.0, 1.0]
+
+    monkeypatch.setattr(kb, "_ensure_loaded", flaky_ensure_loaded)
+    monkeypatch.setattr(knowledge_module.embedding_cache, "aembed", fake_embed)
+    monkeypatch.setattr(knowledge_module.settings, "RETRIEVAL_BACKEND", "local")
+
+    assert asyncio.run(kb.search_passages("q")) is None
+    assert asyncio.run(kb.search_passages("q"))[0]["content"] == "q"
+    assert len(attempts) == 2
@@ -0,0 +1,42 @@
+# tests/test_metrics.py
+from app.core.metrics import MetricsRegistry
+
+
+def _families(text: str) -> list[str]:
+    """Nombre de métrica de cada muestra, en el orden en que aparece."""
+    return [line.split("{")[0].split(" ")[0] for line in text.splitlines() if not line.startswith("#")]
+
+
+def test_nested_stats_are_grouped_by_family():
+    registry = MetricsRegistry(prefix="t")
+    registry.register_collector("scheduler", lambda: {
+        "fast": {"depth": 1, "workers": 2},
+        "slow": {"depth": 3, "workers": 4},
+        "rejected": 5,
+    })
+    registry.register_collector("availability", lambda: {"fallback": 1, "holds": 0, "backend": "memory"})
+    text = registry.render()
+
+    names = _families(text)
+    # Cada familia aparece en un solo bloque contiguo
+    blocks = [n for i, n in enumerate(names) if i == 0 or names[i - 1] != n]
+    assert len(blocks) == len(set(blocks))
+    assert text.count("# TYPE t_scheduler_depth gauge") == 1
+    assert 't_scheduler_depth{key="fast"} 1\nt_scheduler_depth{key="slow"} 3' in text
+    assert "t_availability_fallback 1" in text
+    assert "backend" not in text
+
+
+def test_counters_and_histograms_render():
+    registry = MetricsRegistry(prefix="t")
+    counter = registry.counter("errors_total", "Errores", ("node",))
+    histogram = registry.histogram("seconds", "Duración", ("node",), buckets=(0.1, 1.0))
+    counter.inc(node="medical")
+    histogram.observe(0.5, node="medical")
+    text = registry.render()
+
+    assert 't_errors_total{node="medical"} 1' in text
+    assert 't_seconds_bucket{node="medical",le="0.1"} 0' in text
+    assert 't_seconds_bucket{node="medical",le="1.0"} 1' in text
+    assert 't_seconds_bucket{node="medical",le="+Inf"} 1' in text
+    assert 't_seconds_count{node="medical"} 1' in text
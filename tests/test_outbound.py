@@ -0,0 +1,84 @@
+# tests/test_outbound.py
+import asyncio
+import time
+import httpx
+import pytest
+from app.core import outbound as outbound_module
+from app.core.outbound import OutboundDispatcher, TokenBucket
+
+
+def test_token_bucket_allows_burst_then_paces():
+    async def run():
+        bucket = TokenBucket(rate=20, burst=2)
+        start = time.monotonic()
+        for _ in range(2):
+            await bucket.acquire()
+        burst = time.monotonic() - start
+        for _ in range(2):
+            await bucket.acquire()
+        return burst, time.monotonic() - start
+
+    burst, total = asyncio.run(run())
+    assert burst < 0.02
+    assert total >= 0.09  # 2 tokens más a 20/s
+
+
+def _deliver(monkeypatch, outcomes: list) -> tuple[OutboundDispatcher, int]:
+    """Envía un mensaje contra un Twilio falso que responde `outcomes` en orden."""
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(request)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, type) and issubclass(outcome, Exception):
+            raise outcome("falla simulada", request=request)
+        return httpx.Response(outcome, headers={"Retry-After": "0"} if outcome == 429 else {})
+
+    monkeypatch.setattr(outbound_module, "backoff_delay", lambda attempt: 0)
+    dispatcher = OutboundDispatcher("ACtest", "token", "whatsapp:+100", rate=1000, burst=1000, max_retries=3)
+    dispatcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://twilio")
+
+    async def run():
+        await dispatcher.send("whatsapp:+51900000001", "hola")
+        await dispatcher.close(timeout=1)
+
+    asyncio.run(run())
+    return dispatcher, len(calls)
+
+
+def test_429_is_retried(monkeypatch):
+    dispatcher, calls = _deliver(monkeypatch, [429, 429, 201])
+    assert calls == 3
+    assert dispatcher.sent == 1 and dispatcher.throttled == 2 and dispatcher.failed == 0
+
+
+def test_connect_errors_are_retried(monkeypatch):
+    dispatcher, calls = _deliver(monkeypatch, [httpx.ConnectError, httpx.ConnectTimeout, 201])
+    assert calls == 3 and dispatcher.sent == 1
+
+
+@pytest.mark.parametrize("outcome", [500, 503, httpx.ReadTimeout])
+def test_ambiguous_failures_are_not_resent(monkeypatch, outcome):
+    # Twilio pudo haber aceptado el mensaje: reenviarlo lo duplicaría
+    dispatcher, calls = _deliver(monkeypatch, [outcome, 201])
+    assert calls == 1
+    assert dispatcher.sent == 0 and dispatcher.failed == 1
+
+
+def test_messages_to_one_recipient_keep_their_order(monkeypatch):
+    bodies = []
+
+    def handler(request: httpx.Request):
+        bodies.append(dict(httpx.QueryParams(request.content.decode()))["Body"])
+        return httpx.Response(201)
+
+    dispatcher = OutboundDispatcher("ACtest", "token", "whatsapp:+100", workers=4, rate=1000, burst=1000)
+    dispatcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://twilio")
+
+    async def run():
+        for i in range(10):
+            await dispatcher.send("whatsapp:+51900000001", f"parte {i}")
+        await dispatcher.close(timeout=1)
+
+    asyncio.run(run())
+    assert bodies == [f"parte {i}" for i in range(10)]
@@ -0,0 +1,88 @@
+# tests/test_resilience.py
+import asyncio
+import httpx
+import pytest
+from app.core import business as business_module
+from app.core.business import BusinessClient
+from app.core.resilience import CircuitBreaker
+
+
+def test_breaker_opens_after_threshold_and_fails_fast():
+    breaker = CircuitBreaker("t", failure_threshold=2, reset_timeout=60)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_allows_one_probe_and_closes_on_success():
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()  # la prueba
+    assert breaker.state == "half_open"
+    assert not breaker.allow()  # solo una a la vez
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_breaker_half_open_failure_reopens():
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_abandoned_probe_is_released():
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.abandon()
+    assert breaker.state == "open"
+    assert breaker.allow()  # reset_timeout=0: hay una nueva prueba
+
+
+# --------------------------
+# Reintentos de BusinessClient
+# --------------------------
+
+def _client(monkeypatch, responses: list) -> tuple[BusinessClient, list]:
+    """BusinessClient sobre un transporte falso que consume `responses` en orden."""
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(request.method)
+        outcome = responses.pop(0)
+        if isinstance(outcome, type) and issubclass(outcome, Exception):
+            raise outcome("falla simulada", request=request)
+        return httpx.Response(outcome)
+
+    monkeypatch.setattr(business_module.settings, "BUSINESS_RETRY_BACKOFF", 0)
+    monkeypatch.setattr(business_module.settings, "BUSINESS_MAX_RETRIES", 2)
+    client = BusinessClient()
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://backend")
+    return client, calls
+
+
+@pytest.mark.parametrize("error", [httpx.ConnectError, httpx.ConnectTimeout])
+def test_connect_phase_errors_are_retried_for_post(monkeypatch, error):
+    client, calls = _client(monkeypatch, [error, 200])
+    res = asyncio.run(client._request("POST", "/cases/from-ia", json={}))
+    assert res.status_code == 200
+    assert calls == ["POST", "POST"]
+
+
+def test_read_timeout_is_not_retried_for_post(monkeypatch):
+    client, calls = _client(monkeypatch, [httpx.ReadTimeout, 200])
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(client._request("POST", "/cases/from-ia", json={}))
+    assert calls == ["POST"]
+
+
+def test_idempotent_get_retries_timeouts_and_5xx(monkeypatch):
+    client, calls = _client(monkeypatch, [httpx.ReadTimeout, 503, 200])
+    res = asyncio.run(client._request("GET", "/patients/by-dni/1", idempotent=True))
+    assert res.status_code == 200
+    assert len(calls) == 3
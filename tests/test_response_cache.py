@@ -0,0 +1,54 @@
+# tests/test_response_cache.py
+import asyncio
+from app.agents import nodes
+from app.core.response_cache import SemanticCache
+
+
+def _run_medical(monkeypatch, questions: list[str], history: list[str]) -> list[list]:
+    """Ejecuta medical_node por cada pregunta; devuelve los mensajes enviados al LLM."""
+    calls = []
+
+    async def fake_stream_reply(node, messages, limit):
+        calls.append(messages)
+        return f"respuesta {len(calls)}", False
+
+    async def no_passages(question, top):
+        return []
+
+    monkeypatch.setattr(nodes, "response_cache", SemanticCache(threshold=0.95))
+    monkeypatch.setattr(nodes, "stream_reply", fake_stream_reply)
+    monkeypatch.setattr(nodes.knowledge_base, "search_passages", no_passages)
+    monkeypatch.setattr(nodes.settings, "SEMANTIC_CACHE_MEDICAL", True)
+
+    async def run():
+        answers = []
+        for question in questions:
+            state = {"user_message": question, "history": history, "summary": "Paciente verificado."}
+            answers.append((await nodes.medical_node(state))["ai_response"])
+        return answers
+
+    return asyncio.run(run()), calls
+
+
+def test_paraphrased_question_is_served_from_cache(monkeypatch):
+    # El historial ya trae los turnos de verificación y menú, como en producción
+    history = ["Usuario: 45000001", "Bot: Código enviado", "Usuario: 2"]
+    answers, calls = _run_medical(
+        monkeypatch,
+        ["Tengo dolor de cabeza desde ayer", "¿Desde ayer tengo dolor de cabeza?"],
+        history,
+    )
+    assert len(calls) == 1
+    assert answers == ["respuesta 1", "respuesta 1"]
+    # La respuesta cacheada se generó sin datos de otro paciente
+    prompt = calls[0][-1].content
+    assert "45000001" not in prompt and "Paciente verificado" not in prompt
+
+
+def test_follow_up_uses_history_and_is_not_cached(monkeypatch):
+    history = ["Usuario: me duele la cabeza", "Bot: Lamento que te sientas así"]
+    answers, calls = _run_medical(
+        monkeypatch, ["¿y eso es grave?", "¿y eso es grave?"], history,
+    )
+    assert len(calls) == 2
+    assert "me duele la cabeza" in calls[0][-1].content
@@ -0,0 +1,107 @@
+# tests/test_scheduling.py
+import asyncio
+from app.api import webhook
+from app.core.concurrency import KeyedMailbox
+from app.core.scheduler import WorkScheduler
+
+
+def test_mailbox_keeps_one_in_flight_per_key_in_fifo_order():
+    box = KeyedMailbox(max_pending=2)
+    assert box.offer("a", 1) == KeyedMailbox.DISPATCH
+    assert box.offer("b", 1) == KeyedMailbox.DISPATCH
+    assert box.offer("a", 2) == KeyedMailbox.QUEUED
+    assert box.offer("a", 3) == KeyedMailbox.QUEUED
+    assert box.offer("a", 4) == KeyedMailbox.FULL
+    assert [box.next("a"), box.next("a"), box.next("a")] == [2, 3, None]
+    # Inactiva de nuevo: el siguiente mensaje se despacha directo
+    assert box.offer("a", 5) == KeyedMailbox.DISPATCH
+    assert box.stats()["overflow"] == 1
+
+
+def test_scheduler_sheds_when_the_lane_is_full():
+    async def run():
+        scheduler = WorkScheduler({"slow": (1, 1)})
+        gate = asyncio.Event()
+
+        async def job():
+            await gate.wait()
+
+        accepted = [scheduler.submit("slow", job)]
+        await asyncio.sleep(0)  # el worker toma el primero
+        accepted += [scheduler.submit("slow", job), scheduler.submit("slow", job)]
+        gate.set()
+        await scheduler.close(timeout=1)
+        return accepted, scheduler.stats()["slow"]
+
+    accepted, stats = asyncio.run(run())
+    assert accepted == [True, True, False]
+    assert stats["rejected"] == 1 and stats["completed"] == 2
+
+
+def test_messages_of_one_phone_run_in_order_across_lanes(monkeypatch):
+    """Un mensaje rápido (menú) no adelanta a uno lento (LLM) del mismo número."""
+    order = []
+
+    async def fake_run_turn(user_phone, body, sender):
+        # Los turnos lentos tardan más: sin el buzón el rápido terminaría antes
+        await asyncio.sleep(0.05 if body.startswith("slow") else 0)
+        order.append(body)
+
+    async def no_session(user_phone):
+        return None
+
+    async def run():
+        scheduler = WorkScheduler({"fast": (4, 10), "slow": (4, 10)})
+        monkeypatch.setattr(webhook, "work_scheduler", scheduler)
+        monkeypatch.setattr(webhook, "mailboxes", KeyedMailbox(10))
+        monkeypatch.setattr(webhook, "_run_turn", fake_run_turn)
+        monkeypatch.setattr(webhook.session_store, "get", no_session)
+        monkeypatch.setattr(webhook, "needs_llm", lambda state, body: body.startswith("slow"))
+
+        for body in ["slow 1", "fast 2", "slow 3", "fast 4"]:
+            if webhook.mailboxes.offer("+51900000001", (body, "whatsapp:+51900000001")) == KeyedMailbox.DISPATCH:
+                await webhook.dispatch("+51900000001", body, "whatsapp:+51900000001")
+        while webhook.mailboxes.stats()["active_keys"]:
+            await asyncio.sleep(0.01)
+        await scheduler.close(timeout=1)
+        return scheduler.stats()
+
+    stats = asyncio.run(run())
+    assert order == ["slow 1", "fast 2", "slow 3", "fast 4"]
+    assert stats["fast"]["completed"] == 2 and stats["slow"]["completed"] == 2
+
+
+def test_rejected_message_gets_busy_reply_and_the_next_one_is_dispatched(monkeypatch):
+    sent = []
+
+    async def fake_send_reply(sender, text):
+        sent.append(text)
+
+    async def no_session(user_phone):
+        return None
+
+    async def run():
+        scheduler = WorkScheduler({"fast": (1, 1), "slow": (1, 1)})
+        # Carril lento lleno: el primer mensaje se rechaza, el segundo (rápido) pasa
+        submitted = []
+
+        def submit(lane, fn, *args):
+            submitted.append((lane, args[1]))
+            return lane == "fast"
+
+        monkeypatch.setattr(scheduler, "submit", submit)
+        monkeypatch.setattr(webhook, "work_scheduler", scheduler)
+        mailboxes = KeyedMailbox(10)
+        monkeypatch.setattr(webhook, "mailboxes", mailboxes)
+        monkeypatch.setattr(webhook, "send_reply", fake_send_reply)
+        monkeypatch.setattr(webhook.session_store, "get", no_session)
+        monkeypatch.setattr(webhook, "needs_llm", lambda state, body: body.startswith("slow"))
+
+        assert mailboxes.offer("p", ("slow 1", "s")) == KeyedMailbox.DISPATCH
+        assert mailboxes.offer("p", ("fast 2", "s")) == KeyedMailbox.QUEUED
+        await webhook.dispatch("p", "slow 1", "s")
+        return submitted
+
+    submitted = asyncio.run(run())
+    assert submitted == [("slow", "slow 1"), ("fast", "fast 2")]
+    assert sent == [webhook.BUSY_TEXT]
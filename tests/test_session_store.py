@@ -0,0 +1,55 @@
+# tests/test_session_store.py
+import asyncio
+import pytest
+from app.core.session_store import (
+    MemorySessionStore, SessionStore, SQLiteSessionStore, deserialize_state, serialize_state,
+)
+
+STATE = {"whatsapp_number": "+51900000001", "history": ["User: hola", "AI: ¡Hola! 👋"], "is_verified": True}
+
+
+def test_serialization_round_trip():
+    assert deserialize_state(serialize_state(STATE)) == STATE
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+def test_memory_store_is_lru_with_ttl():
+    async def run():
+        store = MemorySessionStore(max_entries=2, ttl=60)
+        await store.set("a", STATE)
+        await store.set("b", STATE)
+        await store.get("a")  # "a" pasa a ser la más reciente
+        await store.set("c", STATE)
+        kept = [await store.get(k) is not None for k in ("a", "b", "c")]
+
+        expired = MemorySessionStore(ttl=0)
+        await expired.set("a", STATE)
+        return kept, await expired.get("a"), store.stats()
+
+    kept, expired, stats = asyncio.run(run())
+    assert kept == [True, False, True]
+    assert expired is None
+    assert stats["evicted"] == 1
+
+
+def test_sqlite_store_survives_reopening(tmp_path):
+    path = str(tmp_path / "sessions.db")
+
+    async def run():
+        store = SQLiteSessionStore(path)
+        await store.set("a", STATE)
+        await store.close()
+
+        reopened = SQLiteSessionStore(path)
+        loaded = await reopened.get("a")
+        await reopened.delete("a")
+        deleted = await reopened.get("a")
+        await reopened.close()
+        return loaded, deleted
+
+    loaded, deleted = asyncio.run(run())
+    assert loaded == STATE and deleted is None
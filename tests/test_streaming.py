@@ -0,0 +1,56 @@
+# tests/test_streaming.py
+import asyncio
+from langchain_core.messages import HumanMessage, SystemMessage
+from app.agents.prompts import MEDICAL_SYSTEM_PROMPT
+from app.core.streaming import reply_sink, split_message, stream_reply
+
+LIMIT = 1600
+
+
+def test_short_text_is_a_single_message():
+    assert split_message("  Hola, ¿cómo estás?  ", LIMIT) == ["Hola, ¿cómo estás?"]
+    assert split_message("   ", LIMIT) == []
+
+
+def test_long_text_is_cut_at_sentence_boundaries_under_the_limit():
+    sentences = [f"Oración número {i} con algo de texto para ocupar espacio." for i in range(80)]
+    text = " ".join(sentences)
+    messages = split_message(text, LIMIT)
+
+    assert len(messages) > 1
+    assert all(len(m) <= LIMIT for m in messages)
+    assert all(m.endswith(".") for m in messages)
+    assert " ".join(messages) == text
+
+
+def test_paragraphs_are_preserved_and_oversized_sentences_cut_by_words():
+    long_sentence = " ".join(["palabra"] * 400)  # ~3200 caracteres sin puntos
+    text = f"Primer párrafo.\n\n{long_sentence}"
+    messages = split_message(text, LIMIT)
+
+    assert all(len(m) <= LIMIT for m in messages)
+    assert messages[0] == "Primer párrafo."
+    assert " ".join(messages).split() == text.split()
+    assert not any(m.endswith("palabr") for m in messages)
+
+
+def test_stream_reply_sends_first_paragraph_then_the_rest():
+    sent = []
+
+    async def sink(text):
+        sent.append(text)
+
+    async def run():
+        token = reply_sink.set(sink)
+        try:
+            return await stream_reply(
+                "medical", [SystemMessage(content=MEDICAL_SYSTEM_PROMPT), HumanMessage(content="hola")], LIMIT,
+            )
+        finally:
+            reply_sink.reset(token)
+
+    answer, was_sent = asyncio.run(run())
+    paragraphs = answer.split("\n\n")
+    assert was_sent
+    assert sent[0] == paragraphs[0]
+    assert "\n\n".join(sent) == answer